@@ -0,0 +1,101 @@
+import os
+import time
+import argparse
+import cv2
+
+from detection.comptage import CompteurAmphi
+from detection.vote import HandDetector
+from detection.interface import ouvrir_webcam
+from detection.video import LecteurVideo, AnalyseVideo, analyseur_comptage, analyseur_vote
+from detection.suivi import SuiviTetes
+from detection.mouvement import DetecteurMouvement
+
+# Analyse d'une vidéo de cours (ou de la webcam) et export de la chronologie :
+#   python analyser_video.py cours.mp4 --mode vote --pas 10
+#   python analyser_video.py webcam --mode comptage --affichage
+
+HEAD_MODEL = "yolo_head_test.pt"
+POSE_MODEL = "yolov8x-pose-p6.pt"
+RES_DIR = os.path.join("evaluation", "resultats")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Chronologie présence / votes d'une vidéo.")
+    parser.add_argument("source", help="fichier vidéo, ou 'webcam'")
+    parser.add_argument("--mode", choices=["comptage", "sondage", "vote"], default="comptage")
+    parser.add_argument("--pas", type=int, default=5, help="analyse une image sur N")
+    parser.add_argument("--seuil-mouvement", type=float, default=0.001,
+                        help="part des pixels modifiés au-delà de laquelle l'image est ré-analysée (0 = toujours)")
+    parser.add_argument("--intervalle-max", type=float, default=30.0,
+                        help="secondes de vidéo max entre deux analyses complètes")
+    parser.add_argument("--vus-min", type=int, default=3, help="apparitions avant qu'une tête soit comptée")
+    parser.add_argument("--fenetre-vote", type=int, default=5, help="images pour le vote majoritaire")
+    parser.add_argument("--csv", default=None, help="fichier de sortie (défaut : evaluation/resultats/)")
+    parser.add_argument("--backend", default=os.environ.get("AMPHI_BACKEND", "auto"))
+    parser.add_argument("--affichage", action="store_true", help="affiche la vidéo annotée ('q' pour arrêter)")
+    args = parser.parse_args()
+
+    webcam = args.source == "webcam"
+    cap = ouvrir_webcam() if webcam else cv2.VideoCapture(args.source)
+    if cap is None or not cap.isOpened():
+        print(f"Impossible d'ouvrir la source : {args.source}")
+        return
+
+    if args.mode == "comptage":
+        analyser = analyseur_comptage(CompteurAmphi(model_path=HEAD_MODEL, backend=args.backend))
+    else:
+        analyser = analyseur_vote(HandDetector(head_model_path=HEAD_MODEL, pose_model_path=POSE_MODEL,
+                                               backend=args.backend))
+
+    mouvement = DetecteurMouvement(args.seuil_mouvement, intervalle_max=args.intervalle_max) \
+        if args.seuil_mouvement > 0 else None
+    analyse = AnalyseVideo(analyser, SuiviTetes(vus_min=args.vus_min, fenetre_vote=args.fenetre_vote), mouvement)
+    lecteur = LecteurVideo(cap, args.pas, temps_reel=webcam)
+    total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT)) if not webcam else 0
+
+    def rappel(ligne, frame):
+        if args.mode == "sondage":
+            ligne['POUR'] = ligne['G'] + ligne['D']
+            ligne['CONTRE'] = ligne['N']
+        if total and ligne['image'] % (args.pas * 50) == 0:
+            print(f"{ligne['t']:8.1f}s | image {ligne['image']}/{total} | présents {ligne['presents']}")
+        if args.affichage:
+            apercu = frame.copy()
+            for p in analyse.suivi.confirmees():
+                x1, y1, x2, y2 = p.box
+                couleur = {'G': (255, 0, 0), 'D': (0, 255, 0)}.get(p.vote_lisse(), (0, 0, 255))
+                cv2.rectangle(apercu, (x1, y1), (x2, y2), couleur, 2)
+            cv2.putText(apercu, f"t={ligne['t']:.1f}s presents={ligne['presents']}", (10, 30),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 255, 255), 2)
+            cv2.imshow("Analyse video", apercu)
+            if cv2.waitKey(1) & 0xFF == ord('q'):
+                return False
+
+    debut = time.perf_counter()
+    try:
+        analyse.executer(lecteur, rappel)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        # Le thread de lecture est terminé avant de libérer la capture
+        lecteur.arreter()
+        cap.release()
+        if args.affichage: cv2.destroyAllWindows()
+    duree = time.perf_counter() - debut
+
+    os.makedirs(RES_DIR, exist_ok=True)
+    nom = "webcam" if webcam else os.path.splitext(os.path.basename(args.source))[0]
+    chemin = args.csv or os.path.join(RES_DIR, f"chronologie_{nom}_{args.mode}.csv")
+    analyse.ecrire_csv(chemin)
+
+    duree_video = analyse.chronologie[-1]['t'] if analyse.chronologie else 0
+    print(f"\nImages examinées : {len(analyse.chronologie)} | analysées : {analyse.analyses} | "
+          f"réutilisées (sans mouvement) : {analyse.reutilisations} "
+          f"({100 * analyse.reutilisations / max(1, len(analyse.chronologie)):.0f}%)")
+    print(f"Durée vidéo {duree_video:.0f}s traitée en {duree:.0f}s "
+          f"(x{duree_video / max(duree, 1e-6):.1f} temps réel)")
+    print(f"Chronologie sauvegardée dans {chemin}")
+
+
+if __name__ == "__main__":
+    main()
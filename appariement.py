@@ -0,0 +1,265 @@
+import numpy as np
+
+# =============================================================================
+# APPARIEMENT VÉRITÉ TERRAIN / PRÉDICTIONS (scripts d'évaluation)
+# =============================================================================
+# Toutes les paires sont calculées d'un coup sous forme de matrice (NumPy), puis
+# appariées avec la règle gloutonne historique ou une affectation optimale
+# (algorithme hongrois, scipy). Les métriques (TP/FP/FN, mAP, erreur de comptage)
+# sont tirées de la même matrice, sans relire les fichiers exportés.
+
+SEUILS_IOU = np.round(np.arange(0.50, 0.96, 0.05), 2)   # mAP@0.5:0.95 (COCO)
+METHODES = ('glouton', 'optimal')
+
+
+def matrice_iou(gt, pred, inclusion=True):
+    # IoU de toutes les paires (G, 4) x (P, 4) en xyxy -> (G, P).
+    # inclusion : une prédiction entièrement contenue dans la boîte vérité vaut 1.0
+    # (règle historique de evaluer_tête.iou, tolérante aux têtes annotées large).
+    gt = np.asarray(gt, dtype=float).reshape(-1, 4)
+    pred = np.asarray(pred, dtype=float).reshape(-1, 4)
+    ga, pb = gt[:, None, :], pred[None, :, :]
+
+    inter = np.clip(np.minimum(ga[..., 2], pb[..., 2]) - np.maximum(ga[..., 0], pb[..., 0]), 0, None) * \
+            np.clip(np.minimum(ga[..., 3], pb[..., 3]) - np.maximum(ga[..., 1], pb[..., 1]), 0, None)
+    aire_gt = (gt[:, 2] - gt[:, 0]) * (gt[:, 3] - gt[:, 1])
+    aire_pred = (pred[:, 2] - pred[:, 0]) * (pred[:, 3] - pred[:, 1])
+    union = aire_gt[:, None] + aire_pred[None, :] - inter
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ious = np.where((inter > 0) & (union != 0), inter / union, 0.0)
+    if inclusion:
+        inclus = (pb[..., 0] >= ga[..., 0]) & (pb[..., 1] >= ga[..., 1]) & \
+                 (pb[..., 2] <= ga[..., 2]) & (pb[..., 3] <= ga[..., 3])
+        ious = np.where(inclus, 1.0, ious)
+    return ious
+
+
+def apparier(scores, seuil, methode='glouton'):
+    # scores : matrice (G, P) de similarité (IoU...), appariement si score >= seuil.
+    # 'glouton' : chaque vérité, dans l'ordre, prend la meilleure prédiction libre
+    #             (première en cas d'égalité), comme les boucles historiques ;
+    # 'optimal' : affectation maximisant le nombre de paires, puis la somme des scores.
+    # Retourne un tableau (G,) : indice de la prédiction associée, -1 sinon.
+    scores = np.asarray(scores, dtype=float)
+    G, P = scores.shape
+    associe = np.full(G, -1, dtype=int)
+    if G == 0 or P == 0: return associe
+
+    if methode == 'glouton':
+        libre = np.ones(P, dtype=bool)
+        for g in range(G):
+            ligne = np.where(libre, scores[g], -np.inf)
+            j = int(np.argmax(ligne))
+            if ligne[j] > 0 and ligne[j] >= seuil:
+                associe[g] = j
+                libre[j] = False
+        return associe
+
+    if methode != 'optimal':
+        raise ValueError(f"Méthode inconnue : {methode} ({', '.join(METHODES)})")
+    from scipy.optimize import linear_sum_assignment
+    valide = scores >= seuil
+    # Chaque paire valide rapporte 1 (+ un bonus < 1 au total selon le score) : le nombre
+    # de paires prime, le score départage
+    gain = np.where(valide, 1.0 + scores / (min(G, P) + 1), 0.0)
+    lignes, colonnes = linear_sum_assignment(gain, maximize=True)
+    ok = valide[lignes, colonnes]
+    associe[lignes[ok]] = colonnes[ok]
+    return associe
+
+
+def compter_tp_fp_fn(associe, nb_pred):
+    tp = int((associe >= 0).sum())
+    return tp, nb_pred - tp, len(associe) - tp
+
+
+def vrais_positifs_par_seuil(ious, conf, seuils=SEUILS_IOU):
+    # Appariement COCO pour le calcul de l'AP : prédictions par confiance décroissante,
+    # chacune prend la vérité libre de meilleur IoU >= seuil. Tous les seuils en une passe.
+    # Retourne (P, T) : la prédiction p est-elle un vrai positif au seuil t ?
+    G, P = ious.shape
+    tp = np.zeros((P, len(seuils)), dtype=bool)
+    if G == 0 or P == 0: return tp
+    prise = np.zeros((G, len(seuils)), dtype=bool)
+    for p in np.argsort(-np.asarray(conf), kind='mergesort'):
+        candidats = np.where((ious[:, p, None] >= seuils[None, :]) & ~prise, ious[:, p, None], -1.0)
+        g = np.argmax(candidats, axis=0)
+        ok = candidats[g, np.arange(len(seuils))] >= 0
+        prise[g[ok], np.nonzero(ok)[0]] = True
+        tp[p] = ok
+    return tp
+
+
+def precision_moyenne(tp, conf, nb_gt):
+    # AP par seuil (T,) à partir des vrais positifs (N, T) de tout le jeu de données,
+    # interpolation sur 101 points de rappel (COCO).
+    tp = np.asarray(tp, dtype=bool).reshape(len(conf), -1)
+    if nb_gt == 0 or len(conf) == 0: return np.zeros(tp.shape[1])
+    tp = tp[np.argsort(-np.asarray(conf), kind='mergesort')]
+    ctp = np.cumsum(tp, axis=0)
+    cfp = np.cumsum(~tp, axis=0)
+    rappel = ctp / nb_gt
+    precision = ctp / (ctp + cfp)
+    # Enveloppe décroissante de la courbe précision / rappel
+    precision = np.maximum.accumulate(precision[::-1], axis=0)[::-1]
+
+    points = np.linspace(0, 1, 101)
+    ap = np.zeros(tp.shape[1])
+    for t in range(tp.shape[1]):
+        idx = np.searchsorted(rappel[:, t], points, side='left')
+        ap[t] = np.where(idx < len(tp), precision[np.minimum(idx, len(tp) - 1), t], 0.0).mean()
+    return ap
+
+
+def courbe_seuils(tp, conf, nb_gt, seuils):
+    # Précision / rappel / F1 en ne gardant que les détections de confiance > seuil,
+    # pour tous les seuils à la fois (tp : (N,) booléen, détections de tout le jeu).
+    conf = np.asarray(conf, dtype=float)
+    tp = np.asarray(tp, dtype=bool)
+    ordre = np.argsort(conf, kind='mergesort')
+    # cumul_tp[k] : vrais positifs parmi les k détections les plus confiantes
+    cumul_tp = np.concatenate([[0], np.cumsum(tp[ordre][::-1])])
+    gardees = len(conf) - np.searchsorted(conf[ordre], seuils, side='right')
+    vp = cumul_tp[gardees]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        precision = np.where(gardees > 0, vp / gardees, 0.0)
+        rappel = vp / nb_gt if nb_gt else np.zeros(len(seuils))
+        f1 = np.where(precision + rappel > 0, 2 * precision * rappel / (precision + rappel), 0.0)
+    return precision, rappel, f1
+
+
+def erreurs_comptage_par_seuil(confs_par_image, nb_gt_par_image, seuils):
+    # (I, S) : nombre de têtes de confiance > seuil moins le nombre réel, par image
+    return np.array([len(c) - np.searchsorted(np.sort(np.asarray(c, dtype=float)), seuils, side='right') - g
+                     for c, g in zip(confs_par_image, nb_gt_par_image)], dtype=int).reshape(-1, len(seuils))
+
+
+class BilanDetection:
+    """
+    Cumul des métriques d'un jeu de données, image par image.
+    ajouter(gt, pred, conf) : boîtes xyxy de l'image (conf facultatif, pour la mAP).
+    """
+    def __init__(self, seuil_iou=0.5, methode='glouton', inclusion=True):
+        self.seuil_iou = seuil_iou
+        self.methode = methode
+        self.inclusion = inclusion
+        self.tp = self.fp = self.fn = 0
+        self.nb_gt = 0
+        self.erreurs_comptage = []     # nb prédit - nb réel, par image
+        self._tp_seuils = []
+        self._conf = []
+
+    def ajouter(self, gt, pred, conf=None):
+        ious = matrice_iou(gt, pred, self.inclusion)
+        tp, fp, fn = compter_tp_fp_fn(apparier(ious, self.seuil_iou, self.methode), ious.shape[1])
+        self.tp += tp
+        self.fp += fp
+        self.fn += fn
+        self.nb_gt += ious.shape[0]
+        self.erreurs_comptage.append(ious.shape[1] - ious.shape[0])
+        if conf is not None:
+            self._tp_seuils.append(vrais_positifs_par_seuil(ious, conf))
+            self._conf.append(np.asarray(conf, dtype=float))
+        return tp, fp, fn
+
+    def resume(self):
+        precision = self.tp / (self.tp + self.fp) if self.tp + self.fp > 0 else 0
+        rappel = self.tp / (self.tp + self.fn) if self.tp + self.fn > 0 else 0
+        f1 = 2 * precision * rappel / (precision + rappel) if precision + rappel > 0 else 0
+        erreurs = np.asarray(self.erreurs_comptage, dtype=float)
+        resultat = {
+            'TP': self.tp, 'FP': self.fp, 'FN': self.fn,
+            'precision': precision, 'rappel': rappel, 'f1': f1,
+            'erreur_comptage_moy': float(np.abs(erreurs).mean()) if len(erreurs) else 0.0,
+            'biais_comptage': float(erreurs.mean()) if len(erreurs) else 0.0,
+        }
+        if self._conf:
+            ap = precision_moyenne(np.concatenate(self._tp_seuils), np.concatenate(self._conf), self.nb_gt)
+            resultat['AP50'] = float(ap[0])
+            resultat['AP75'] = float(ap[SEUILS_IOU.tolist().index(0.75)])
+            resultat['mAP50_95'] = float(ap.mean())
+        return resultat
+
+
+# --- MAINS (points, rayon proportionnel à la tête) ---
+RATIOS_RAYON = np.round(np.arange(0.25, 2.01, 0.25), 2)
+
+
+def matrice_distances(gt_xy, pred_xy):
+    # Distances euclidiennes de toutes les paires (G, 2) x (P, 2) -> (G, P)
+    gt_xy = np.asarray(gt_xy, dtype=float).reshape(-1, 2)
+    pred_xy = np.asarray(pred_xy, dtype=float).reshape(-1, 2)
+    return np.hypot(gt_xy[:, None, 0] - pred_xy[None, :, 0], gt_xy[:, None, 1] - pred_xy[None, :, 1])
+
+
+def apparier_mains(dist, rayons, regle='par_verite', compatibles=None):
+    # dist : (G, P) ; rayons : (P,) rayon de tolérance de chaque prédiction (head_h * ratio) ;
+    # compatibles : (G, P) booléen (même classe...) ou None.
+    # 'par_verite'    : chaque vérité, dans l'ordre, prend la prédiction libre compatible la
+    #                   plus proche à distance < rayon (règle de evaluer_vote) ;
+    # 'par_prediction': chaque prédiction, dans l'ordre, prend la vérité libre compatible la
+    #                   plus proche, acceptée si distance <= rayon (règle de evaluer_sondage) ;
+    # 'optimal'       : affectation maximisant le nombre de paires (distance < rayon),
+    #                   puis leur proximité.
+    # Retourne un tableau (G,) : indice de la prédiction associée, -1 sinon.
+    dist = np.asarray(dist, dtype=float)
+    G, P = dist.shape
+    associe = np.full(G, -1, dtype=int)
+    if G == 0 or P == 0: return associe
+    rayons = np.broadcast_to(np.asarray(rayons, dtype=float), (P,))
+    compatibles = np.ones((G, P), dtype=bool) if compatibles is None else np.asarray(compatibles, dtype=bool)
+
+    if regle == 'par_verite':
+        valide = compatibles & (dist < rayons[None, :])
+        libre = np.ones(P, dtype=bool)
+        for g in range(G):
+            ligne = np.where(valide[g] & libre, dist[g], np.inf)
+            j = int(np.argmin(ligne))
+            if np.isfinite(ligne[j]):
+                associe[g] = j
+                libre[j] = False
+        return associe
+
+    if regle == 'par_prediction':
+        libre = np.ones(G, dtype=bool)
+        for p in range(P):
+            colonne = np.where(compatibles[:, p] & libre, dist[:, p], np.inf)
+            g = int(np.argmin(colonne))
+            if np.isfinite(colonne[g]) and colonne[g] <= rayons[p]:
+                associe[g] = p
+                libre[g] = False
+        return associe
+
+    if regle != 'optimal':
+        raise ValueError(f"Règle inconnue : {regle} (par_verite, par_prediction, optimal)")
+    from scipy.optimize import linear_sum_assignment
+    valide = compatibles & (dist < rayons[None, :])
+    with np.errstate(divide='ignore', invalid='ignore'):
+        proximite = np.where(valide, 1.0 - dist / rayons[None, :], 0.0)
+    gain = np.where(valide, 1.0 + proximite / (min(G, P) + 1), 0.0)
+    lignes, colonnes = linear_sum_assignment(gain, maximize=True)
+    ok = valide[lignes, colonnes]
+    associe[lignes[ok]] = colonnes[ok]
+    return associe
+
+
+def balayer_rayons(dist, head_h, ratios=RATIOS_RAYON, regle='par_verite', compatibles=None):
+    # TP / FP / FN de l'image pour chaque ratio de rayon, à partir de la même matrice.
+    # Retourne un tableau (R, 3) d'entiers.
+    head_h = np.asarray(head_h, dtype=float)
+    return np.array([compter_tp_fp_fn(apparier_mains(dist, head_h * r, regle, compatibles), dist.shape[1])
+                     for r in ratios], dtype=int).reshape(len(ratios), 3)
+
+
+def ecrire_courbe_rayons(chemin, ratios, cumuls):
+    # cumuls (R, 3) : TP, FP, FN cumulés sur le jeu de données pour chaque ratio
+    lignes = ["ratio;TP;FP;FN;precision;rappel;f1"]
+    for r, (tp, fp, fn) in zip(ratios, cumuls):
+        prec = tp / (tp + fp) if tp + fp else 0.0
+        rec = tp / (tp + fn) if tp + fn else 0.0
+        f1 = 2 * prec * rec / (prec + rec) if prec + rec else 0.0
+        lignes.append(f"{r:.2f};{tp};{fp};{fn};{prec:.4f};{rec:.4f};{f1:.4f}")
+    with open(chemin, "w", encoding="utf-8") as f:
+        f.write("\n".join(lignes) + "\n")
+    return lignes
@@ -0,0 +1,174 @@
+import os
+import sys
+import csv
+import random
+import argparse
+import itertools
+from concurrent.futures import ProcessPoolExecutor
+import cv2
+
+from detection.vote import DEFAULT_CONFIG, CLES_INFERENCE, HandDetector, post_traitement
+from detection.cache_inference import CacheInference
+from moteur_evaluation import lister_images
+import evaluer_vote as ev
+
+# =============================================================================
+# BALAYAGE HORS-LIGNE DES SEUILS DE DEFAULT_CONFIG
+# =============================================================================
+# 1. Les réseaux tournent une seule fois par image (ou pas du tout si le cache
+#    d'inférence de evaluer_vote est à jour).
+# 2. Pour chaque configuration candidate, seul le post-traitement (validation
+#    anatomique, déduplication, vote) est rejoué, en parallèle.
+# 3. Le classement précision / rappel / F1 (métriques de evaluer_vote) est écrit
+#    dans evaluation/resultats/.
+
+RESULT_FILE = os.path.join(ev.RES_DIR, "balayage_vote.txt")
+CSV_FILE = os.path.join(ev.RES_DIR, "balayage_vote.csv")
+
+# Espace de recherche : liste de valeurs (grille) ; en mode aléatoire on tire
+# uniformément entre le min et le max de chaque liste.
+ESPACE_RECHERCHE = {
+    'BASE_HAND_CONF_THRESH': [0.5, 0.6, 0.7],
+    'ELBOW_CONF_THRESH': [0.4, 0.5, 0.6],
+    'BASE_DEDUP_DIST': [45, 55, 65],
+    'SUPER_STRICT_DIST': [5, 10, 15],
+    'PAIR_WRIST_ELBOW_THRESH': [1.7, 1.8, 1.9],
+    'TOTAL_CONF_THRESH': [1.5, 1.7, 1.9],
+    'BASE_ANGLE_THRESH_DEG': [65, 75, 85],
+    'MIN_WRIST_ELBOW_RATIO': [0.5, 0.7, 0.9],
+}
+
+# Paramètres entiers (tirage aléatoire arrondi)
+PARAMS_ENTIERS = {'BASE_DEDUP_DIST', 'SHOULDER_DEDUP_DIST', 'SUPER_STRICT_DIST',
+                  'VERTICAL_ALIGN_TOL', 'BASE_ANGLE_THRESH_DEG'}
+
+
+def configs_grille(espace):
+    cles = sorted(espace)
+    for valeurs in itertools.product(*(espace[c] for c in cles)):
+        yield dict(zip(cles, valeurs))
+
+
+def configs_aleatoires(espace, n, graine=0):
+    rng = random.Random(graine)
+    for _ in range(n):
+        cfg = {}
+        for cle, valeurs in sorted(espace.items()):
+            v = rng.uniform(min(valeurs), max(valeurs))
+            cfg[cle] = int(round(v)) if cle in PARAMS_ENTIERS else round(v, 3)
+        yield cfg
+
+
+def charger_donnees():
+    # Sorties brutes (cache) + vérité terrain de chaque image
+    cache = CacheInference(ev.CACHE_DIR, [ev.HEAD_MODEL, ev.POSE_MODEL],
+                           {k: DEFAULT_CONFIG[k] for k in CLES_INFERENCE})
+    detecteur = None
+    donnees = []
+
+    for img_name in lister_images(ev.IMG_DIR):
+        img = cv2.imread(os.path.join(ev.IMG_DIR, img_name))
+        if img is None: continue
+        brut = cache.lire(img_name, img)
+        if brut is None:
+            # Les modèles ne sont chargés que si une image manque dans le cache
+            if detecteur is None:
+                detecteur = HandDetector(head_model_path=ev.HEAD_MODEL, pose_model_path=ev.POSE_MODEL)
+            brut = detecteur.inferer(img)
+            cache.ecrire(img_name, img, brut)
+        h_img, w_img = img.shape[:2]
+        lbl_path = os.path.join(ev.LBL_DIR, os.path.splitext(img_name)[0] + ".txt")
+        donnees.append((brut, ev.charger_labels_vote(lbl_path, w_img, h_img)))
+
+    print(f"{len(donnees)} images prêtes ({cache.succes} depuis le cache, {cache.echecs} recalculées)")
+    return donnees
+
+
+# --- Côté processus de travail ---
+_donnees = None
+
+
+def _init_worker(donnees):
+    global _donnees
+    _donnees = donnees
+
+
+def scorer_config(variation):
+    cfg = {**DEFAULT_CONFIG, **variation}
+    tp = fp = fn = 0
+    stats_g = {'TP': 0, 'FP': 0, 'FN': 0}
+    stats_d = {'TP': 0, 'FP': 0, 'FN': 0}
+    for brut, gt_hands in _donnees:
+        predictions = [m for tete in post_traitement(brut, cfg) for m in tete['hands']]
+        gt = [dict(g) for g in gt_hands]
+        i_tp, i_fp, i_fn = ev.comparer_mains_vote(gt, predictions, stats_g, stats_d)
+        tp += i_tp
+        fp += i_fp
+        fn += i_fn
+    prec, rec, f1 = ev.calculer_metriques(tp, fp, fn)
+    return {'config': variation, 'TP': tp, 'FP': fp, 'FN': fn,
+            'precision': prec, 'rappel': rec, 'f1': f1}
+
+
+def ecrire_classement(resultats, cles, top):
+    resultats = sorted(resultats, key=lambda r: (-r['f1'], -r['precision']))
+
+    with open(CSV_FILE, "w", newline="") as f:
+        w = csv.writer(f)
+        w.writerow(["rang", "f1", "precision", "rappel", "TP", "FP", "FN"] + cles)
+        for rang, r in enumerate(resultats, 1):
+            w.writerow([rang, f"{r['f1']:.4f}", f"{r['precision']:.4f}", f"{r['rappel']:.4f}",
+                        r['TP'], r['FP'], r['FN']] + [r['config'][c] for c in cles])
+
+    entete = f"{'Rang':>4} | {'F1':>6} | {'Prec':>6} | {'Rappel':>6} | " + " | ".join(cles)
+    lignes = ["=== BALAYAGE DEFAULT_CONFIG (métriques VOTE) ===", "",
+              f"Configurations évaluées : {len(resultats)}", "", entete, "-" * len(entete)]
+    for rang, r in enumerate(resultats[:top], 1):
+        valeurs = " | ".join(str(r['config'][c]) for c in cles)
+        lignes.append(f"{rang:>4} | {r['f1']:.4f} | {r['precision']:.4f} | {r['rappel']:.4f} | {valeurs}")
+    texte = "\n".join(lignes) + "\n"
+
+    print("\n" + texte)
+    with open(RESULT_FILE, "w") as f:
+        f.write(texte)
+    print(f"Classement sauvegardé dans {RESULT_FILE} (complet : {CSV_FILE})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Balayage hors-ligne des seuils de post-traitement.")
+    parser.add_argument("--mode", choices=["grille", "aleatoire"], default="grille")
+    parser.add_argument("--n", type=int, default=1000, help="nombre de configurations (mode aléatoire)")
+    parser.add_argument("--graine", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--top", type=int, default=30, help="lignes affichées dans le rapport texte")
+    args = parser.parse_args()
+
+    interdits = sorted(set(ESPACE_RECHERCHE) & set(CLES_INFERENCE))
+    if interdits:
+        print(f"Erreur : {interdits} modifient l'inférence et ne peuvent pas être rejoués depuis le cache.")
+        sys.exit(1)
+
+    if args.mode == "grille":
+        variations = list(configs_grille(ESPACE_RECHERCHE))
+    else:
+        variations = list(configs_aleatoires(ESPACE_RECHERCHE, args.n, args.graine))
+    # La config actuelle sert de référence dans le classement
+    variations.insert(0, {c: DEFAULT_CONFIG[c] for c in ESPACE_RECHERCHE})
+
+    donnees = charger_donnees()
+    print(f"Évaluation de {len(variations)} configurations sur {args.workers} processus...")
+
+    if args.workers <= 1:
+        _init_worker(donnees)
+        resultats = [scorer_config(v) for v in variations]
+    else:
+        with ProcessPoolExecutor(max_workers=args.workers, initializer=_init_worker,
+                                 initargs=(donnees,)) as pool:
+            taille_paquet = max(1, len(variations) // (args.workers * 8))
+            resultats = list(pool.map(scorer_config, variations, chunksize=taille_paquet))
+
+    ecrire_classement(resultats, sorted(ESPACE_RECHERCHE), args.top)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+import hashlib
+import json
+import os
+import numpy as np
+from detection.tetes import DetectionTetes, empreinte_image
+
+# =============================================================================
+# CACHE DES SORTIES BRUTES DES RÉSEAUX (évaluation)
+# =============================================================================
+# Un fichier .npz par image contient les boîtes de têtes et les keypoints de chaque
+# passage Pose, ainsi que la clé (image + fichiers modèles + config d'inférence)
+# qui les a produits. Tant que la clé ne change pas, l'évaluation rejoue seulement
+# le post-traitement.
+
+_empreintes_fichiers = {}
+
+
+def empreinte_fichier(chemin):
+    # Hash du contenu d'un fichier de poids (mémorisé par chemin / taille / date)
+    if not os.path.exists(chemin):
+        return "absent:" + os.path.basename(chemin)
+    st = os.stat(chemin)
+    cle = (os.path.abspath(chemin), st.st_size, st.st_mtime)
+    if cle not in _empreintes_fichiers:
+        h = hashlib.sha1()
+        with open(chemin, "rb") as f:
+            for bloc in iter(lambda: f.read(1 << 20), b""):
+                h.update(bloc)
+        _empreintes_fichiers[cle] = h.hexdigest()
+    return _empreintes_fichiers[cle]
+
+
+def brut_vers_tableaux(brut):
+    tetes = brut['tetes']
+    passes = brut.get('passes', [])
+    keypoints = brut.get('keypoints', [])
+
+    rects = np.array([rect for rect, _ in passes], dtype=np.int32).reshape(-1, 4)
+    membres = np.array([j for _, m in passes for j in m], dtype=np.int32)
+    bornes_membres = np.cumsum([0] + [len(m) for _, m in passes]).astype(np.int32)
+
+    kpts = [k if k is not None else np.zeros((0, 17, 3), np.float32) for k in keypoints]
+    bornes_kpts = np.cumsum([0] + [len(k) for k in kpts]).astype(np.int32)
+    kpts = np.concatenate(kpts).astype(np.float32) if kpts else np.zeros((0, 17, 3), np.float32)
+
+    return {
+        'shape': np.array(brut['shape'], dtype=np.int32),
+        'xyxy': tetes.xyxy.astype(np.float32), 'conf': tetes.conf.astype(np.float32),
+        'cls': tetes.cls.astype(np.int16),
+        'rects': rects, 'membres': membres, 'bornes_membres': bornes_membres,
+        'kpts': kpts, 'bornes_kpts': bornes_kpts,
+        'escalade': np.array(brut.get('escalade', [True] * len(passes)), dtype=bool),
+    }
+
+
+def tableaux_vers_brut(t):
+    shape = tuple(int(v) for v in t['shape'])
+    tetes = DetectionTetes(t['xyxy'], t['conf'], t['cls'].astype(int), shape)
+    bm, bk = t['bornes_membres'], t['bornes_kpts']
+    passes, keypoints = [], []
+    for p in range(len(t['rects'])):
+        passes.append((tuple(int(v) for v in t['rects'][p]),
+                       [int(j) for j in t['membres'][bm[p]:bm[p + 1]]]))
+        keypoints.append(t['kpts'][bk[p]:bk[p + 1]])
+    escalade = [bool(e) for e in t['escalade']] if 'escalade' in t else [True] * len(passes)
+    return {'shape': shape, 'tetes': tetes, 'passes': passes, 'keypoints': keypoints, 'escalade': escalade}
+
+
+class CacheInference:
+    """
+    dossier : où ranger les .npz (un par image), dans un sous-dossier par signature :
+              deux configurations (x seul / cascade, seuil de confiance...) ne
+              s'écrasent pas mutuellement
+    fichiers_modeles : poids dont dépend la sortie brute
+    config : sous-ensemble de la config qui influe sur l'inférence
+    """
+    def __init__(self, dossier, fichiers_modeles, config):
+        signature = {
+            'modeles': [empreinte_fichier(f) for f in fichiers_modeles],
+            'config': config,
+        }
+        self.signature = hashlib.sha1(json.dumps(signature, sort_keys=True, default=str).encode()).hexdigest()
+        self.dossier = os.path.join(dossier, self.signature[:12])
+        os.makedirs(self.dossier, exist_ok=True)
+        self.succes = 0
+        self.echecs = 0
+
+    def _chemin(self, nom):
+        return os.path.join(self.dossier, os.path.splitext(nom)[0] + ".npz")
+
+    def cle(self, img):
+        return f"{self.signature}:{empreinte_image(img)}"
+
+    def lire(self, nom, img):
+        chemin = self._chemin(nom)
+        if os.path.exists(chemin):
+            try:
+                with np.load(chemin) as donnees:
+                    if str(donnees['cle']) == self.cle(img):
+                        self.succes += 1
+                        return tableaux_vers_brut({k: donnees[k] for k in donnees.files})
+            except Exception as e:
+                print(f"[WARN] Cache illisible {chemin}: {e}")
+        self.echecs += 1
+        return None
+
+    def ecrire(self, nom, img, brut):
+        np.savez_compressed(self._chemin(nom), cle=np.array(self.cle(img)), **brut_vers_tableaux(brut))
+
+    def obtenir(self, nom, img, calculer):
+        # calculer(img) -> brut, appelé uniquement si le cache est absent ou périmé
+        brut = self.lire(nom, img)
+        if brut is None:
+            brut = calculer(img)
+            self.ecrire(nom, img, brut)
+        return brut
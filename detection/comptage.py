@@ -1,14 +1,18 @@
 import cv2
-from ultralytics import YOLO
-import os
-from datetime import datetime
+from detection.modeles import charger_modele
+from detection.tetes import detecter_tetes, detecter_tetes_lot, params_tuiles, empreinte_image
+from detection.historique import historique_application
 
 
 class CompteurAmphi:
 
-    def __init__(self, model_path='yolo_head_test.pt', class_id_head=0):
-        self.model = YOLO(model_path)
+    def __init__(self, model_path='yolo_head_test.pt', class_id_head=0, taille_tuile=0, recouvrement_tuile=0.2,
+                 backend='pt'):
+        # backend : 'pt', 'onnx', 'openvino' ou 'auto' (voir detection/modeles.py)
+        self.model = charger_modele(model_path, backend=backend)
         self.CLASS_ID_HEAD = class_id_head
+        # Détection par tuiles pour les grandes images (0 = image entière)
+        self.params_tetes = params_tuiles(taille_tuile, recouvrement_tuile)
         self.image = None
         self.resultats = None
         self.count = 0
@@ -17,70 +21,98 @@ class CompteurAmphi:
     def charger_image(self, img):
         self.image = img
 
-    def sauvegarder_nombre_etudiants(self, fichier="historique.txt"):
-        # Créer le fichier si besoin
-        if not os.path.exists(fichier):
-            with open(fichier, "w", encoding="utf-8") as f:
-                f.write("")
-
-        # Format date & heure
-        date_heure = datetime.now().strftime("%d/%m/%y à %Hh%M")
-
-        # Ligne à écrire
-        ligne = f"[C]: {date_heure}, Il y a {self.count} étudiants\n"
-
-        # Écriture
-        with open(fichier, "a", encoding="utf-8") as f:
-            f.write(ligne)
+    def sauvegarder_nombre_etudiants(self, fichier=None, nombre=None, empreinte=None):
+        # Relevé ajouté à la base historique.db de l'application (l'ancien .txt y est importé une fois).
+        # nombre / empreinte : valeurs déjà relevées ; à défaut, l'état courant du compteur
+        if nombre is None:
+            nombre = self.count
+            empreinte = empreinte_image(self.image) if self.image is not None else None
+        historique_application(fichier).ajouter_comptage(nombre, empreinte)
 
     def compter(self, seuil=0.3):
         if self.image is None: return 0
         
-        results = self.model(self.image)
-        self.resultats = results
+        # Passage du modèle de têtes partagé (cache) avec le Sondage et le Vote
+        detection = detecter_tetes(self.model, self.image, **self.params_tetes)
+        self.resultats = detection
         self.count = 0
         self.image_annotee = self.image.copy()
 
-        for r in results:
-            for box in r.boxes:
-                cls_id = int(box.cls[0])
-                confidence = float(box.conf[0])
-
-                if cls_id == self.CLASS_ID_HEAD and confidence > seuil:
-                    self.count += 1
-                    x1, y1, x2, y2 = map(int, box.xyxy[0])
-                    cv2.rectangle(self.image_annotee, (x1, y1), (x2, y2), (0, 255, 0), 2)
+        for i in detection.indices_classe(self.CLASS_ID_HEAD, seuil):
+            self.count += 1
+            x1, y1, x2, y2 = map(int, detection.xyxy[i])
+            cv2.rectangle(self.image_annotee, (x1, y1), (x2, y2), (0, 255, 0), 2)
 
         return self.count
 
-    def exporter_predictions(self, output_path): 
+    def compter_batch(self, images, seuil=0.3, taille_lot=8):
+        # Comptage de nombreuses images (liste ou itérateur), le modèle de têtes
+        # tournant par lots de `taille_lot`. Ne modifie aucun attribut de l'instance :
+        # peut être appelé depuis plusieurs threads (les appels au modèle sont sérialisés).
+        # Retourne, pour chaque image, {'count', 'boxes', 'conf', 'yolo'}.
+        sorties = []
+        lot = []
+        for img in images:
+            lot.append(img)
+            if len(lot) == taille_lot:
+                sorties.extend(self._compter_lot(lot, seuil, taille_lot))
+                lot = []
+        if lot:
+            sorties.extend(self._compter_lot(lot, seuil, taille_lot))
+        return sorties
+
+    def _compter_lot(self, images, seuil, taille_lot):
+        # Pas de cache mémoire : les archives sont lues une seule fois
+        detections = detecter_tetes_lot(self.model, images, cache=None, taille_lot=taille_lot, **self.params_tetes)
+        sorties = []
+        for img, det in zip(images, detections):
+            idx = det.indices_classe(self.CLASS_ID_HEAD, seuil)
+            sorties.append({
+                'count': int(len(idx)),
+                'boxes': [tuple(map(int, det.xyxy[i])) for i in idx],
+                'conf': [float(det.conf[i]) for i in idx],
+                'yolo': self.vers_yolo(det, img.shape[:2], self.CLASS_ID_HEAD)
+            })
+        return sorties
+
+    def predictions_yolo(self):
+        # Boîtes de têtes au format YOLO normalisé : liste de (cls, xc, yc, w, h, conf)
         if self.resultats is None:
-            raise ValueError("Appeler compter() avant exporter_predictions().")
-        
-        h, w = self.image.shape[:2]
+            raise ValueError("Appeler compter() avant predictions_yolo().")
+        return self.vers_yolo(self.resultats, self.image.shape[:2], self.CLASS_ID_HEAD)
+
+    @staticmethod
+    def vers_yolo(detection, shape, class_id):
+        h, w = shape
         preds = []
 
         # Récupération des boîtes
-        for r in self.resultats:
-            for box in r.boxes:
-                cls = int(box.cls[0])
-                # On ne garde que la classe qui nous intéresse
-                if cls != self.CLASS_ID_HEAD: continue
-                    
-                x1, y1, x2, y2 = box.xyxy[0].tolist()
-                
-                # Conversion en format YOLO normalisé (xc, yc, w, h)
-                xc = ((x1 + x2) / 2) / w
-                yc = ((y1 + y2) / 2) / h
-                bw = (x2 - x1) / w
-                bh = (y2 - y1) / h
-                
-                preds.append((cls, xc, yc, bw, bh))
-
-        # Écriture directe dans le fichier de sortie
+        for i in detection.indices_classe(class_id):
+            cls = class_id
+            x1, y1, x2, y2 = detection.xyxy[i].tolist()
+            
+            # Conversion en format YOLO normalisé (xc, yc, w, h)
+            xc = ((x1 + x2) / 2) / w
+            yc = ((y1 + y2) / 2) / h
+            bw = (x2 - x1) / w
+            bh = (y2 - y1) / h
+            
+            preds.append((cls, xc, yc, bw, bh, float(detection.conf[i])))
+
+        return preds
+
+    @staticmethod
+    def ecrire_predictions(preds, output_path):
+        # Écriture directe dans le fichier de sortie (6e colonne : confiance, si connue)
         with open(output_path, "w") as f:
             for p in preds:
-                f.write(f"{p[0]} {p[1]:.6f} {p[2]:.6f} {p[3]:.6f} {p[4]:.6f}\n")
+                conf = f" {p[5]:.4f}" if len(p) > 5 else ""
+                f.write(f"{p[0]} {p[1]:.6f} {p[2]:.6f} {p[3]:.6f} {p[4]:.6f}{conf}\n")
+
+    def exporter_predictions(self, output_path): 
+        if self.resultats is None:
+            raise ValueError("Appeler compter() avant exporter_predictions().")
+        self.ecrire_predictions(self.predictions_yolo(), output_path)
 
     def annoter(self):
         if self.image_annotee is None: return
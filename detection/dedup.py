@@ -0,0 +1,62 @@
+from collections import defaultdict
+import numpy as np
+
+
+class GrilleDedup:
+    """
+    Index spatial (grille) des mains déjà acceptées, indexées par la position du poignet.
+    Applique exactement les règles de HandDetector._is_anatomical_duplicate_strict
+    (super-strict, filtre épaules, distance, alignement vertical) mais uniquement
+    sur les cellules voisines du candidat.
+    """
+    def __init__(self, cfg, dedup_dist_max):
+        self.cfg = cfg
+        # Toute paire doublon a |dx| et |dy| < taille de cellule :
+        # il suffit donc d'examiner les 3x3 cellules autour du candidat.
+        self.taille_cellule = max(1.0,
+                                  cfg['SUPER_STRICT_DIST'],
+                                  cfg['VERTICAL_ALIGN_TOL'],
+                                  dedup_dist_max * max(1.0, cfg['VERTICAL_SEARCH_FACTOR']))
+        self.cellules = defaultdict(list)
+
+    def _cellule(self, x, y):
+        return int(x // self.taille_cellule), int(y // self.taille_cellule)
+
+    def est_doublon(self, candidate):
+        cx, cy = candidate['x'], candidate['y']
+        sx, sy = candidate['sx'], candidate['sy']
+        c_dist_base = candidate['dedup_dist']
+        super_strict_limit = self.cfg['SUPER_STRICT_DIST']
+        shoulder_limit = self.cfg['SHOULDER_DEDUP_DIST']
+        v_align_tol = self.cfg['VERTICAL_ALIGN_TOL']
+        v_search_factor = self.cfg['VERTICAL_SEARCH_FACTOR']
+
+        gx, gy = self._cellule(cx, cy)
+        for ix in (gx - 1, gx, gx + 1):
+            for iy in (gy - 1, gy, gy + 1):
+                for hand in self.cellules.get((ix, iy), ()):
+                    dx = abs(cx - hand['x'])
+                    dy = abs(cy - hand['y'])
+                    dist_wrist = np.hypot(dx, dy)
+
+                    if dist_wrist < super_strict_limit: return True
+                    if np.hypot(sx - hand['sx'], sy - hand['sy']) > shoulder_limit: continue
+                    limite = max(c_dist_base, hand['dedup_dist'])
+                    if dist_wrist < limite: return True
+                    if dx < v_align_tol and dy < (limite * v_search_factor): return True
+
+        return False
+
+    def ajouter(self, hand):
+        self.cellules[self._cellule(hand['x'], hand['y'])].append(hand)
+
+
+def dedupliquer(candidats, cfg):
+    # candidats déjà triés par confiance décroissante
+    grille = GrilleDedup(cfg, max((c['dedup_dist'] for c in candidats), default=0))
+    acceptes = []
+    for cand in candidats:
+        if not grille.est_doublon(cand):
+            grille.ajouter(cand)
+            acceptes.append(cand)
+    return acceptes
@@ -0,0 +1,140 @@
+import threading
+import time
+import cv2
+
+
+class FluxAnalyse:
+    """
+    Analyse continue d'un flux vidéo :
+    - un thread de capture lit les images en continu et ne garde que la plus récente ;
+    - un thread d'inférence analyse toujours la dernière image disponible
+      (les images arrivées pendant une analyse sont ignorées).
+    analyser(frame) -> résultat quelconque, réutilisé ensuite pour la surimpression.
+    mouvement : DetecteurMouvement optionnel ; sans mouvement dans l'amphi, le dernier
+    résultat est conservé et le modèle n'est pas relancé.
+    """
+    def __init__(self, cap, analyser, miroir=True, mouvement=None):
+        self.cap = cap
+        self.analyser = analyser
+        self.miroir = miroir
+        self.mouvement = mouvement
+
+        self._verrou = threading.Lock()
+        self._nouvelle_image = threading.Condition(self._verrou)
+        self._actif = False
+        self._threads = []
+
+        self._image = None          # dernière image capturée
+        self._t_image = 0.0
+        self._num_image = 0
+        self._num_analysee = 0
+
+        self.resultat = None        # dernier résultat d'inférence
+        self.image_resultat = None  # image sur laquelle porte ce résultat
+        self.erreur = None
+
+        self._fps_capture = 0.0
+        self._fps_inference = 0.0
+        self._latence = 0.0
+        self.images_ignorees = 0
+
+    # --- CYCLE DE VIE ---
+    def demarrer(self):
+        self._actif = True
+        self._threads = [
+            threading.Thread(target=self._boucle_capture, name="flux-capture", daemon=True),
+            threading.Thread(target=self._boucle_inference, name="flux-inference", daemon=True),
+        ]
+        for t in self._threads:
+            t.start()
+
+    def arreter(self):
+        with self._verrou:
+            self._actif = False
+            self._nouvelle_image.notify_all()
+        for t in self._threads:
+            t.join(timeout=2.0)
+
+    @property
+    def actif(self):
+        return self._actif
+
+    # --- THREADS ---
+    def _boucle_capture(self):
+        t_prec = time.perf_counter()
+        while self._actif:
+            success, frame = self.cap.read()
+            if not success:
+                print("Erreur de lecture du flux vidéo.")
+                with self._verrou:
+                    self._actif = False
+                    self._nouvelle_image.notify_all()
+                break
+            if self.miroir:
+                frame = cv2.flip(frame, 1)
+
+            maintenant = time.perf_counter()
+            with self._verrou:
+                self._image = frame
+                self._t_image = maintenant
+                self._num_image += 1
+                self._fps_capture = _lisser(self._fps_capture, 1.0 / max(maintenant - t_prec, 1e-6))
+                self._nouvelle_image.notify_all()
+            t_prec = maintenant
+
+    def _boucle_inference(self):
+        t_prec = time.perf_counter()
+        while True:
+            with self._verrou:
+                while self._actif and self._num_image == self._num_analysee:
+                    self._nouvelle_image.wait()
+                if not self._actif:
+                    return
+                # Seule l'image la plus récente est analysée
+                self.images_ignorees += max(0, self._num_image - self._num_analysee - 1)
+                frame, t_capture = self._image, self._t_image
+                self._num_analysee = self._num_image
+
+            # Amphi immobile : le résultat précédent reste valable
+            if self.mouvement is not None and not self.mouvement.doit_analyser(frame, t_capture) \
+                    and self.resultat is not None:
+                continue
+
+            try:
+                resultat = self.analyser(frame)
+            except Exception as e:
+                self.erreur = e
+                print(f"Erreur d'analyse : {e}")
+                continue
+
+            maintenant = time.perf_counter()
+            with self._verrou:
+                self.resultat = resultat
+                self.image_resultat = frame
+                self._latence = maintenant - t_capture
+                self._fps_inference = _lisser(self._fps_inference, 1.0 / max(maintenant - t_prec, 1e-6))
+            t_prec = maintenant
+
+    # --- ACCÈS ---
+    def derniere_image(self):
+        with self._verrou:
+            return self._image
+
+    def dernier_resultat(self):
+        with self._verrou:
+            return self.resultat, self.image_resultat
+
+    def metriques(self):
+        with self._verrou:
+            return {
+                'fps_capture': self._fps_capture,
+                'fps_inference': self._fps_inference,
+                'latence_ms': self._latence * 1000.0,
+                'images_ignorees': self.images_ignorees,
+                'taux_saut': self.mouvement.taux_saut if self.mouvement is not None else 0.0,
+            }
+
+
+def _lisser(valeur, mesure, alpha=0.1):
+    # Moyenne glissante exponentielle pour des FPS lisibles
+    return mesure if valeur == 0 else (1 - alpha) * valeur + alpha * mesure
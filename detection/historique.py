@@ -0,0 +1,236 @@
+import os
+import re
+import sqlite3
+import sys
+import threading
+from datetime import datetime
+
+# =============================================================================
+# HISTORIQUE DES RELEVÉS (SQLite)
+# =============================================================================
+# Une ligne par relevé, colonnes typées et indexées (date, mode) : la fenêtre
+# Historique ne lit plus que les derniers relevés au lieu de tout le fichier.
+# Modes : 'C' comptage, 'S' sondage, 'V' vote.
+# Sondage : option_a = pour, option_b = contre. Vote : option_a / option_b = options A / B.
+# L'ancien historique.txt est importé à la création de la base, puis n'est plus
+# modifié : le format texte reste disponible par exporter_txt().
+# obtenir_historique() partage une instance par base (schéma créé une seule fois) ;
+# historique_application() est la base de l'application, en lecture comme en écriture.
+
+FICHIER_HISTORIQUE = "historique.db"
+FICHIER_TXT = "historique.txt"
+FORMAT_DATE = "%Y-%m-%d %H:%M:%S"
+MODES = {'C': "Comptage", 'S': "Sondage", 'V': "Vote"}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS releves (
+    id INTEGER PRIMARY KEY,
+    horodatage TEXT NOT NULL,
+    mode TEXT NOT NULL CHECK (mode IN ('C', 'S', 'V')),
+    total INTEGER NOT NULL,
+    option_a INTEGER,
+    option_b INTEGER,
+    abstention INTEGER,
+    pct_a REAL,
+    pct_b REAL,
+    pct_abstention REAL,
+    empreinte_image TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_releves_horodatage ON releves (horodatage);
+CREATE INDEX IF NOT EXISTS idx_releves_mode ON releves (mode, horodatage);
+"""
+
+COLONNES = ('horodatage', 'mode', 'total', 'option_a', 'option_b', 'abstention',
+            'pct_a', 'pct_b', 'pct_abstention', 'empreinte_image')
+INSERTION = f"INSERT INTO releves ({', '.join(COLONNES)}) VALUES ({', '.join('?' * len(COLONNES))})"
+
+# Lignes de l'ancien historique.txt
+_DATE_TXT = r"(\d\d/\d\d/\d\d) à (\d\d)h(\d\d)"
+MOTIFS_TXT = {
+    'C': re.compile(r"\[C\]: " + _DATE_TXT + r", Il y a (\d+) étudiants"),
+    'S': re.compile(r"\[S\]: " + _DATE_TXT + r", [\d.]+% des étudiants sont pour \((\d+) pour et (\d+) contre\)"),
+    'V': re.compile(r"\[V\]: " + _DATE_TXT + r", ([\d.]+)% option A, ([\d.]+)% option B et ([\d.]+)% abstention "
+                    r"\((\d+) votes au total\)"),
+}
+
+
+def chemin_base(fichier):
+    # "historique.txt" -> "historique.db" (même dossier)
+    return os.path.splitext(fichier)[0] + ".db"
+
+
+def _pourcentages(total, *nombres):
+    # None (colonne sans objet pour ce mode) reste None
+    return [None if n is None else (n / total) * 100 if total > 0 else 0.0 for n in nombres]
+
+
+class Historique:
+
+    def __init__(self, chemin=FICHIER_HISTORIQUE, fichier_txt=None):
+        # fichier_txt : ancien historique texte, importé si la base est créée
+        self.chemin = chemin
+        nouvelle = not os.path.exists(chemin)
+        cx = self._connexion()
+        try:
+            cx.executescript(SCHEMA)
+        finally:
+            cx.close()
+        if nouvelle and fichier_txt and os.path.exists(fichier_txt):
+            self.importer_txt(fichier_txt)
+
+    def _connexion(self):
+        # Une connexion par opération : utilisable depuis n'importe quel thread
+        cx = sqlite3.connect(self.chemin, timeout=10.0)
+        cx.row_factory = sqlite3.Row
+        return cx
+
+    def _executer(self, requete, valeurs=()):
+        cx = self._connexion()
+        try:
+            with cx:
+                return cx.execute(requete, valeurs).fetchall()
+        finally:
+            cx.close()
+
+    # --- ÉCRITURE ---
+    def ajouter(self, mode, total, option_a=None, option_b=None, abstention=None,
+                empreinte_image=None, horodatage=None):
+        if mode not in MODES: raise ValueError(f"Mode inconnu : {mode}")
+        horodatage = horodatage or datetime.now()
+        pct = _pourcentages(total, option_a, option_b, abstention)
+        self._executer(INSERTION, (horodatage.strftime(FORMAT_DATE), mode, int(total),
+                                   option_a, option_b, abstention, *pct, empreinte_image))
+
+    def ajouter_comptage(self, nombre, empreinte_image=None, horodatage=None):
+        self.ajouter('C', nombre, empreinte_image=empreinte_image, horodatage=horodatage)
+
+    def ajouter_sondage(self, pour, contre, empreinte_image=None, horodatage=None):
+        self.ajouter('S', pour + contre, pour, contre, empreinte_image=empreinte_image, horodatage=horodatage)
+
+    def ajouter_vote(self, gauche, droite, abstention, empreinte_image=None, horodatage=None):
+        self.ajouter('V', gauche + droite + abstention, gauche, droite, abstention,
+                     empreinte_image=empreinte_image, horodatage=horodatage)
+
+    # --- LECTURE ---
+    def derniers(self, limite=500, mode=None, depuis=None):
+        # Relevés du plus récent au plus ancien (index sur la date, et sur mode + date)
+        conditions, valeurs = [], []
+        if mode is not None:
+            conditions.append("mode = ?")
+            valeurs.append(mode)
+        if depuis is not None:
+            conditions.append("horodatage >= ?")
+            valeurs.append(depuis.strftime(FORMAT_DATE))
+        where = f"WHERE {' AND '.join(conditions)} " if conditions else ""
+        return self._executer(f"SELECT * FROM releves {where}ORDER BY horodatage DESC, id DESC LIMIT ?",
+                              (*valeurs, limite))
+
+    def nombre(self, mode=None):
+        if mode is None: return self._executer("SELECT COUNT(*) FROM releves")[0][0]
+        return self._executer("SELECT COUNT(*) FROM releves WHERE mode = ?", (mode,))[0][0]
+
+    # --- FORMAT TEXTE (compatibilité) ---
+    @staticmethod
+    def ligne_texte(releve):
+        # Même phrase que l'ancien historique.txt
+        date_heure = datetime.strptime(releve['horodatage'], FORMAT_DATE).strftime("%d/%m/%y à %Hh%M")
+        if releve['mode'] == 'C':
+            return f"[C]: {date_heure}, Il y a {releve['total']} étudiants"
+        if releve['mode'] == 'S':
+            return (f"[S]: {date_heure}, {releve['pct_a']:.1f}% des étudiants sont pour "
+                    f"({releve['option_a']} pour et {releve['option_b']} contre)")
+        return (f"[V]: {date_heure}, {releve['pct_a']:.1f}% option A, {releve['pct_b']:.1f}% option B et "
+                f"{releve['pct_abstention']:.1f}% abstention ({releve['total']} votes au total)")
+
+    def exporter_txt(self, fichier):
+        # Export chronologique au format de l'ancien historique.txt
+        releves = self._executer("SELECT * FROM releves ORDER BY horodatage, id")
+        with open(fichier, "w", encoding="utf-8") as f:
+            for r in releves:
+                f.write(self.ligne_texte(r) + "\n")
+        return len(releves)
+
+    def importer_txt(self, fichier):
+        # Retourne (lignes importées, lignes non reconnues)
+        lignes, ignorees = [], 0
+        with open(fichier, "r", encoding="utf-8") as f:
+            for texte in f:
+                if not texte.strip(): continue
+                releve = _lire_ligne_txt(texte)
+                if releve is None: ignorees += 1
+                else: lignes.append(releve)
+
+        cx = self._connexion()
+        try:
+            with cx:
+                cx.executemany(INSERTION, lignes)
+        finally:
+            cx.close()
+        return len(lignes), ignorees
+
+
+_historiques = {}
+_verrou_historiques = threading.Lock()
+
+
+def obtenir_historique(chemin=FICHIER_HISTORIQUE, fichier_txt=None):
+    # Une instance par base pour tout le processus : le schéma et l'import de
+    # l'ancien fichier texte ne sont faits qu'au premier appel
+    cle = os.path.abspath(chemin)
+    with _verrou_historiques:
+        if cle not in _historiques:
+            _historiques[cle] = Historique(chemin, fichier_txt)
+        return _historiques[cle]
+
+
+def dossier_application():
+    # Dossier de l'exécutable (PyInstaller) ou racine du projet : indépendant du
+    # dossier courant (lancement depuis un raccourci ou un autre dossier)
+    if getattr(sys, 'frozen', False): return os.path.dirname(sys.executable)
+    return os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def historique_application(fichier=None):
+    # fichier : ancien historique texte (None = historique.txt de l'application) ;
+    # la base est le .db voisin
+    fichier = fichier or os.path.join(dossier_application(), FICHIER_TXT)
+    return obtenir_historique(chemin_base(fichier), fichier)
+
+
+def _lire_ligne_txt(texte):
+    for mode, motif in MOTIFS_TXT.items():
+        m = motif.search(texte)
+        if m is None: continue
+        date, hh, mm, *valeurs = m.groups()
+        horodatage = datetime.strptime(f"{date} {hh}:{mm}", "%d/%m/%y %H:%M").strftime(FORMAT_DATE)
+        if mode == 'C':
+            return (horodatage, 'C', int(valeurs[0]), None, None, None, None, None, None, None)
+        if mode == 'S':
+            pour, contre = int(valeurs[0]), int(valeurs[1])
+            return (horodatage, 'S', pour + contre, pour, contre, None,
+                    *_pourcentages(pour + contre, pour, contre, None), None)
+        # Vote : seuls les pourcentages et le total sont dans le texte
+        total = int(valeurs[3])
+        pct = [float(v) for v in valeurs[:3]]
+        a, b, abst = (round(p * total / 100) for p in pct)
+        return (horodatage, 'V', total, a, b, abst, *pct, None)
+    return None
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Historique des relevés (base SQLite)")
+    parser.add_argument("--base", default=None, help="base SQLite (défaut : celle de l'application)")
+    parser.add_argument("--exporter", metavar="TXT", help="écrit l'historique au format historique.txt")
+    parser.add_argument("--importer", metavar="TXT", help="ajoute les lignes d'un ancien historique.txt")
+    args = parser.parse_args()
+
+    historique = Historique(args.base) if args.base else historique_application()
+    if args.importer:
+        importees, ignorees = historique.importer_txt(args.importer)
+        print(f"{importees} relevés importés, {ignorees} lignes non reconnues")
+    if args.exporter:
+        print(f"{historique.exporter_txt(args.exporter)} relevés exportés dans {args.exporter}")
+    if not (args.importer or args.exporter):
+        for r in historique.derniers(limite=20):
+            print(Historique.ligne_texte(r))
@@ -2,8 +2,9 @@ import cv2
 import tkinter as tk
 from tkinter import filedialog
 import sys
+from detection.flux import FluxAnalyse
 
-def choisir_source(parent_root):
+def choisir_source(parent_root, flux=False):
     user_choice = None
 
     def select_webcam():
@@ -16,6 +17,11 @@ def choisir_source(parent_root):
         user_choice = 'import'
         window.destroy()
 
+    def select_live():
+        nonlocal user_choice
+        user_choice = 'live'
+        window.destroy()
+
     def on_close():
         # Si l'utilisateur ferme la croix, on ne fait rien (user_choice reste None)
         window.destroy()
@@ -37,6 +43,12 @@ def choisir_source(parent_root):
                               font=("Arial", 12), width=30, height=2, 
                               command=select_import)
     import_button.pack(pady=10)
+
+    if flux:
+        live_button = tk.Button(window, text="Analyse en continu (webcam)", 
+                                font=("Arial", 12), width=30, height=2, 
+                                command=select_live)
+        live_button.pack(pady=10)
     
     # Important : on attend que cette fenêtre soit fermée avant de continuer le code
     window.wait_window()
@@ -44,21 +56,76 @@ def choisir_source(parent_root):
     return user_choice
 
 
+def ouvrir_webcam():
+    # 1. Tentative sur l'index 1 (caméra externe)
+    print("Tentative d'ouverture de la webcam (Index 1)...")
+    cap = cv2.VideoCapture(1) 
+
+    # 2. Si l'index 1 ne s'ouvre pas, on tente l'index 0 (caméra intégrée)
+    if not cap.isOpened():
+        print("Echec index 1. Tentative sur l'index 0...")
+        cap = cv2.VideoCapture(0)
+
+    # 3. Si aucun des deux ne fonctionne
+    if not cap.isOpened():
+        print("Erreur critique : Impossible d'ouvrir une webcam (ni index 1, ni index 0).")
+        return None
+
+    return cap
+
+
+def analyser_flux(analyser, dessiner, titre="Analyse en direct", mouvement=None):
+    # Mode continu : la capture et l'inférence tournent dans deux threads,
+    # l'affichage (ici) superpose le dernier résultat sur l'image la plus récente.
+    # dessiner(image, resultat) annote l'image en place.
+    # mouvement : DetecteurMouvement optionnel (pas de nouvelle analyse si rien ne bouge).
+    # Retourne (image, resultat) du dernier résultat affiché, ou (None, None).
+    cap = ouvrir_webcam()
+    if cap is None:
+        return None, None
+
+    flux = FluxAnalyse(cap, analyser, mouvement=mouvement)
+    flux.demarrer()
+
+    try:
+        while flux.actif:
+            frame = flux.derniere_image()
+            if frame is None:
+                cv2.waitKey(10)
+                continue
+
+            preview = frame.copy()
+            resultat, _ = flux.dernier_resultat()
+            if resultat is not None:
+                dessiner(preview, resultat)
+
+            m = flux.metriques()
+            h = preview.shape[0]
+            texte = f"Capture {m['fps_capture']:.1f} img/s | Analyse {m['fps_inference']:.1f} img/s | Latence {m['latence_ms']:.0f} ms"
+            if mouvement is not None:
+                texte += f" | Sautees {100 * m['taux_saut']:.0f}%"
+            cv2.putText(preview, texte,
+                        (10, h - 40), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 255), 2)
+            cv2.putText(preview, "Appuyez sur 'q' pour terminer.",
+                        (10, h - 15), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 0, 255), 2)
+            cv2.imshow(titre, preview)
+
+            if cv2.waitKey(1) & 0xFF == ord('q'):
+                break
+    finally:
+        flux.arreter()
+        cap.release()
+        cv2.destroyAllWindows()
+
+    resultat, image = flux.dernier_resultat()
+    return image, resultat
+
+
 def obtenir_image(source, parent_root):
 
     if source == 'webcam':
-        # 1. Tentative sur l'index 1 (caméra externe)
-        print("Tentative d'ouverture de la webcam (Index 1)...")
-        cap = cv2.VideoCapture(1) 
-
-        # 2. Si l'index 1 ne s'ouvre pas, on tente l'index 0 (caméra intégrée)
-        if not cap.isOpened():
-            print("Echec index 1. Tentative sur l'index 0...")
-            cap = cv2.VideoCapture(0)
-
-        # 3. Si aucun des deux ne fonctionne
-        if not cap.isOpened():
-            print("Erreur critique : Impossible d'ouvrir une webcam (ni index 1, ni index 0).")
+        cap = ouvrir_webcam()
+        if cap is None:
             return None
 
         # --- BOUCLE DE CAPTURE ---
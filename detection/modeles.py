@@ -0,0 +1,126 @@
+import os
+import json
+import threading
+import numpy as np
+from ultralytics import YOLO
+
+# --- REGISTRE DES MODÈLES ---
+# Chaque fichier de poids n'est chargé qu'une fois par processus, puis partagé
+# entre CompteurAmphi, SondageDetector et VoteDetector.
+_modeles = {}
+_verrous = {}
+_verrou_registre = threading.Lock()
+
+
+# --- BACKENDS D'INFÉRENCE ---
+# 'pt' : PyTorch (fichier .pt d'origine)
+# 'onnx' / 'openvino' : graphes exportés par exporter_modeles.py, à forme fixe
+# 'int8' : graphe OpenVINO quantifié INT8 (jamais choisi par 'auto')
+# 'auto' : OpenVINO si exporté, sinon ONNX, sinon PyTorch
+BACKENDS = ('pt', 'onnx', 'openvino', 'int8')
+
+
+def chemin_exporte(chemin, backend):
+    base = os.path.splitext(chemin)[0]
+    if backend == 'onnx': return base + '.onnx'
+    if backend == 'openvino': return base + '_openvino_model'
+    if backend == 'int8': return base + '_int8_openvino_model'
+    return chemin
+
+
+def fichier_meta(chemin, backend):
+    # Forme d'entrée figée à l'export (imgsz, batch, tâche), écrite à côté du graphe
+    return os.path.splitext(chemin)[0] + f'_{backend}.json'
+
+
+def resoudre_backend(chemin, backend='pt'):
+    if backend == 'auto':
+        for b in ('openvino', 'onnx'):
+            if os.path.exists(chemin_exporte(chemin, b)) and os.path.exists(fichier_meta(chemin, b)):
+                return b
+        return 'pt'
+    if backend not in BACKENDS:
+        raise ValueError(f"Backend inconnu : {backend} (choix : {', '.join(BACKENDS)}, auto)")
+    return backend
+
+
+class ModeleFige:
+    # Graphe exporté à entrée fixe : chaque appel est découpé en lots de `batch`
+    # images, le dernier lot étant complété par des images noires dont les
+    # résultats sont ignorés. L'imgsz demandé par l'appelant est remplacé par
+    # celui de l'export.
+    def __init__(self, modele, imgsz, batch, chemin):
+        self.modele = modele
+        self.imgsz = imgsz
+        self.batch = batch
+        self.ckpt_path = chemin
+
+    def __call__(self, images, verbose=False, imgsz=None, **params):
+        images = list(images) if isinstance(images, (list, tuple)) else [images]
+        n = len(images)
+        images += [np.zeros_like(images[0])] * (-n % self.batch)
+        sorties = []
+        for debut in range(0, len(images), self.batch):
+            sorties.extend(self.modele(images[debut:debut + self.batch], imgsz=self.imgsz, verbose=verbose, **params))
+        return sorties[:n]
+
+
+def _charger(chemin, backend):
+    if backend == 'pt':
+        return YOLO(chemin)
+    exporte, meta = chemin_exporte(chemin, backend), fichier_meta(chemin, backend)
+    if not os.path.exists(exporte) or not os.path.exists(meta):
+        raise FileNotFoundError(f"Modèle {backend} introuvable pour {chemin} : lancer exporter_modeles.py --format {backend}")
+    with open(meta, "r", encoding="utf-8") as f:
+        infos = json.load(f)
+    return ModeleFige(YOLO(exporte, task=infos['task']), infos['imgsz'], infos['batch'], exporte)
+
+
+def _cle(chemin, backend='pt'):
+    return (os.path.abspath(chemin), backend)
+
+
+def _verrou(cle):
+    with _verrou_registre:
+        return _verrous.setdefault(cle, threading.Lock())
+
+
+def charger_modele(chemin, prechauffage=False, backend='pt'):
+    # Retourne le modèle YOLO associé à `chemin`, en le chargeant au premier appel.
+    # Si prechauffage=True, une inférence à vide est faite sous le verrou pour
+    # initialiser le prédicteur avant que le modèle ne soit rendu disponible.
+    backend = resoudre_backend(chemin, backend)
+    cle = _cle(chemin, backend)
+    with _verrou(cle):
+        if cle not in _modeles:
+            modele = _charger(chemin, backend)
+            if prechauffage:
+                modele(np.zeros((64, 64, 3), dtype=np.uint8), verbose=False)
+            _modeles[cle] = modele
+        return _modeles[cle]
+
+
+def est_charge(chemin, backend='pt'):
+    return _cle(chemin, resoudre_backend(chemin, backend)) in _modeles
+
+
+def prechauffer(chemins, backend='pt'):
+    # Charge (et initialise) les modèles dans un thread d'arrière-plan.
+    # Un appel concurrent à charger_modele() attend simplement la fin du chargement.
+    def _travail():
+        for chemin in chemins:
+            try:
+                charger_modele(chemin, prechauffage=True, backend=backend)
+                print(f"Modèle prêt : {chemin}")
+            except Exception as e:
+                print(f"Erreur de préchargement ({chemin}) : {e}")
+
+    thread = threading.Thread(target=_travail, name="prechargement-modeles", daemon=True)
+    thread.start()
+    return thread
+
+
+def vider_registre():
+    with _verrou_registre:
+        _modeles.clear()
+        _verrous.clear()
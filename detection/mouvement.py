@@ -0,0 +1,58 @@
+import time
+import cv2
+import numpy as np
+
+
+class DetecteurMouvement:
+    """
+    Décide si une image mérite une nouvelle analyse (flux webcam, vidéo).
+    - chaque image est réduite à `largeur` pixels de large, en niveaux de gris et floutée ;
+    - elle est comparée à la dernière image analysée (pas à la précédente : un mouvement
+      lent finit aussi par déclencher) ;
+    - mouvement = part des pixels dont l'écart dépasse `seuil_pixel` (0-255) ;
+    - analyse si mouvement >= seuil_mouvement, ou si `intervalle_max` secondes se sont
+      écoulées depuis la dernière analyse (recomptage de sécurité).
+    """
+    def __init__(self, seuil_mouvement=0.001, seuil_pixel=20, largeur=320, intervalle_max=30.0):
+        self.seuil_mouvement = seuil_mouvement
+        self.seuil_pixel = seuil_pixel
+        self.largeur = largeur
+        self.intervalle_max = intervalle_max
+
+        self._reference = None
+        self._t_reference = None
+        self.dernier_mouvement = 0.0
+        self.images = 0
+        self.ignorees = 0
+
+    def miniature(self, frame):
+        gris = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+        h, w = gris.shape[:2]
+        if w > self.largeur:
+            gris = cv2.resize(gris, (self.largeur, max(1, round(h * self.largeur / w))), interpolation=cv2.INTER_AREA)
+        return cv2.GaussianBlur(gris, (5, 5), 0)
+
+    def mesurer(self, mini):
+        # Part des pixels qui ont changé depuis la dernière image analysée
+        if self._reference is None or self._reference.shape != mini.shape: return 1.0
+        return float(np.count_nonzero(cv2.absdiff(mini, self._reference) > self.seuil_pixel)) / mini.size
+
+    def doit_analyser(self, frame, t=None):
+        # t : horodatage en secondes (position dans la vidéo), sinon horloge du système.
+        # Si la réponse est oui, l'image devient la nouvelle référence.
+        t = time.monotonic() if t is None else t
+        mini = self.miniature(frame)
+        self.dernier_mouvement = self.mesurer(mini)
+        self.images += 1
+
+        echu = self._t_reference is None or t - self._t_reference >= self.intervalle_max
+        if self.dernier_mouvement >= self.seuil_mouvement or echu:
+            self._reference, self._t_reference = mini, t
+            return True
+        self.ignorees += 1
+        return False
+
+    @property
+    def taux_saut(self):
+        # Part des images pour lesquelles l'inférence a été évitée
+        return self.ignorees / self.images if self.images else 0.0
@@ -0,0 +1,240 @@
+from collections.abc import MutableMapping
+import numpy as np
+
+# =============================================================================
+# RÉSULTATS SONDAGE / VOTE EN COLONNES
+# =============================================================================
+# Une image = deux tableaux structurés NumPy : une ligne par tête, une ligne par main
+# (mains rangées tête par tête, contiguës). Les colonnes sont des vues sans copie
+# (boites, votes, poignets...) pour le dessin, l'export et l'évaluation.
+# Pour le code existant, resultats[i] reste un « dict » de tête (head_id, head_box,
+# vote, hands...) et tete['hands'] une liste de « dicts » de mains : ce sont des vues
+# sur les mêmes tableaux, pas des copies.
+
+COLOR_LEFT = (255, 0, 0)    # BLEU
+COLOR_RIGHT = (0, 255, 0)   # VERT
+
+# Étiquettes admises : les colonnes texte sont de largeur fixe, NumPy tronquerait le reste
+VOTES = ('G', 'D', 'N')
+SONDAGES = ('', 'POUR', 'CONTRE')
+
+
+class _Absent:
+    # Case d'une colonne supplémentaire jamais affectée. Singleton conservé par pickle
+    # (résultats renvoyés par les processus de moteur_evaluation) : le test « is » reste valable
+    __slots__ = ()
+
+    def __reduce__(self):
+        return '_ABSENT'
+
+    def __repr__(self):
+        return '<absent>'
+
+
+_ABSENT = _Absent()
+
+DTYPE_TETE = np.dtype([
+    ('head_id', np.int32),
+    ('box', np.int32, 4),
+    ('h', np.int32),
+    ('dedup_dist', np.int32),
+    ('vote', 'U1'),
+    ('sondage', 'U6'),
+])
+
+DTYPE_MAIN = np.dtype([
+    ('tete', np.int32),          # ligne de la tête dans le tableau des têtes
+    ('poignet', np.int32, 2),
+    ('coude', np.int32, 2),
+    ('epaule', np.int32, 2),
+    ('nez', np.int32, 2),
+    ('conf', np.float32),
+    ('reason', 'U4'),
+    ('side', 'U1'),
+])
+
+# Clé historique -> (colonne, indice éventuel dans la colonne)
+CLES_MAIN = {
+    'x': ('poignet', 0), 'y': ('poignet', 1),
+    'ex': ('coude', 0), 'ey': ('coude', 1),
+    'sx': ('epaule', 0), 'sy': ('epaule', 1),
+    'nx': ('nez', 0), 'ny': ('nez', 1),
+    'conf': ('conf', None), 'reason': ('reason', None), 'side': ('side', None),
+}
+CLES_MAIN_TETE = {'head_id': 'head_id', 'head_h': 'h', 'dedup_dist': 'dedup_dist'}
+CLES_TETE = {'head_id': 'head_id', 'vote': 'vote', 'sondage': 'sondage'}
+
+
+class ResultatsVote:
+    """
+    Résultat de HandDetector.detect() pour une image.
+    - tetes : tableau structuré DTYPE_TETE ; mains : tableau structuré DTYPE_MAIN ;
+    - debuts : (N + 1,) mains de la tête i = mains[debuts[i]:debuts[i + 1]] ;
+    - len(), itération et resultats[i] : vues « dict » compatibles avec l'ancien format.
+    Les clés inconnues affectées sur une tête (ex. 'piste') sont rangées dans une
+    colonne supplémentaire créée à la demande.
+    """
+    __slots__ = ('tetes', 'mains', 'debuts', 'extras')
+
+    def __init__(self, tetes, mains, debuts):
+        self.tetes = tetes
+        self.mains = mains
+        self.debuts = debuts
+        self.extras = {}
+
+    @classmethod
+    def vide(cls):
+        return cls(np.zeros(0, DTYPE_TETE), np.zeros(0, DTYPE_MAIN), np.zeros(1, np.int64))
+
+    @classmethod
+    def depuis_listes(cls, tetes, mains_par_tete):
+        # tetes : liste de (head_id, box, h, dedup_dist, vote) ;
+        # mains_par_tete : liste alignée de listes de mains (dicts du post-traitement)
+        t = np.zeros(len(tetes), DTYPE_TETE)
+        for i, (head_id, box, h, dedup_dist, vote) in enumerate(tetes):
+            _verifier('vote', vote)
+            t[i] = (head_id, box, h, dedup_dist, vote, '')
+
+        nb = [len(m) for m in mains_par_tete]
+        debuts = np.zeros(len(tetes) + 1, np.int64)
+        np.cumsum(nb, out=debuts[1:])
+        m = np.zeros(int(debuts[-1]), DTYPE_MAIN)
+        k = 0
+        for i, mains in enumerate(mains_par_tete):
+            for main in mains:
+                m[k] = (i, (main['x'], main['y']), (main['ex'], main['ey']), (main['sx'], main['sy']),
+                        (main['nx'], main['ny']), main['conf'], main['reason'], main['side'])
+                k += 1
+        return cls(t, m, debuts)
+
+    # --- Colonnes (vues sans copie) ---
+    @property
+    def boites(self):
+        return self.tetes['box']
+
+    @property
+    def votes(self):
+        return self.tetes['vote']
+
+    @property
+    def poignets(self):
+        return self.mains['poignet']
+
+    def mains_de(self, i):
+        return self.mains[self.debuts[i]:self.debuts[i + 1]]
+
+    def decompte(self, colonne='vote'):
+        valeurs, nombres = np.unique(self.tetes[colonne], return_counts=True)
+        return {str(v): int(n) for v, n in zip(valeurs, nombres)}
+
+    # --- Accès historique (liste de dicts) ---
+    def __len__(self):
+        return len(self.tetes)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [VueTete(self, k) for k in range(*i.indices(len(self)))]
+        if i < 0: i += len(self)
+        if not 0 <= i < len(self): raise IndexError(i)
+        return VueTete(self, i)
+
+    def __iter__(self):
+        return (VueTete(self, i) for i in range(len(self)))
+
+    def __bool__(self):
+        return len(self) > 0
+
+    def __repr__(self):
+        return f"ResultatsVote({len(self)} têtes, {len(self.mains)} mains)"
+
+
+def _verifier(cle, valeur):
+    admises = VOTES if cle == 'vote' else SONDAGES if cle == 'sondage' else None
+    if admises is not None and valeur not in admises:
+        raise ValueError(f"{cle} inconnu : {valeur!r} (attendu : {admises})")
+
+
+class VueTete(MutableMapping):
+    __slots__ = ('res', 'i')
+
+    def __init__(self, res, i):
+        self.res = res
+        self.i = i
+
+    def __getitem__(self, cle):
+        ligne = self.res.tetes[self.i]
+        if cle in CLES_TETE:
+            return ligne[CLES_TETE[cle]].item()
+        if cle == 'head_box':
+            return tuple(int(v) for v in ligne['box'])
+        if cle == 'hands':
+            return [VueMain(self.res, k) for k in range(self.res.debuts[self.i], self.res.debuts[self.i + 1])]
+        if cle in self.res.extras and self.res.extras[cle][self.i] is not _ABSENT:
+            return self.res.extras[cle][self.i]
+        raise KeyError(cle)
+
+    def __setitem__(self, cle, valeur):
+        if cle in CLES_TETE:
+            _verifier(cle, valeur)
+            self.res.tetes[CLES_TETE[cle]][self.i] = valeur
+        elif cle in ('head_box', 'hands'):
+            raise KeyError(f"{cle} est en lecture seule")
+        else:
+            if cle not in self.res.extras:
+                self.res.extras[cle] = np.full(len(self.res), _ABSENT, dtype=object)
+            self.res.extras[cle][self.i] = valeur
+
+    def __delitem__(self, cle):
+        raise KeyError(f"{cle} ne peut pas être supprimée")
+
+    def _cles(self):
+        cles = ['head_id', 'head_box', 'vote', 'hands']
+        if self.res.tetes['sondage'][self.i]: cles.append('sondage')
+        return cles + [c for c, col in self.res.extras.items() if col[self.i] is not _ABSENT]
+
+    def __iter__(self):
+        return iter(self._cles())
+
+    def __len__(self):
+        return len(self._cles())
+
+    def __repr__(self):
+        return repr(dict(self))
+
+
+class VueMain(MutableMapping):
+    __slots__ = ('res', 'k')
+
+    def __init__(self, res, k):
+        self.res = res
+        self.k = k
+
+    def __getitem__(self, cle):
+        ligne = self.res.mains[self.k]
+        if cle in CLES_MAIN:
+            colonne, j = CLES_MAIN[cle]
+            return (ligne[colonne] if j is None else ligne[colonne][j]).item()
+        if cle in CLES_MAIN_TETE:
+            return self.res.tetes[CLES_MAIN_TETE[cle]][ligne['tete']].item()
+        if cle == 'color':
+            return COLOR_LEFT if ligne['side'] == 'G' else COLOR_RIGHT
+        raise KeyError(cle)
+
+    def __setitem__(self, cle, valeur):
+        if cle not in CLES_MAIN:
+            raise KeyError(cle)
+        colonne, j = CLES_MAIN[cle]
+        if j is None: self.res.mains[colonne][self.k] = valeur
+        else: self.res.mains[colonne][self.k, j] = valeur
+
+    def __delitem__(self, cle):
+        raise KeyError(f"{cle} ne peut pas être supprimée")
+
+    def __iter__(self):
+        return iter(list(CLES_MAIN) + ['dedup_dist', 'head_h', 'color', 'head_id'])
+
+    def __len__(self):
+        return len(CLES_MAIN) + 4
+
+    def __repr__(self):
+        return repr(dict(self))
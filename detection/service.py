@@ -0,0 +1,147 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+
+class AnalyseAnnulee(Exception):
+    pass
+
+
+class Tache:
+    """
+    Une demande d'analyse soumise au service.
+    - future : concurrent.futures.Future (résultat ou exception)
+    - progression : dernier message publié par le calcul ("Pose 37/120"...)
+    - annuler() : demande d'arrêt, prise en compte au prochain signaler()
+    """
+    def __init__(self, nom):
+        self.nom = nom
+        self.future = Future()
+        self.progression = "En attente..."
+        self.fraction = None
+        self._annulee = threading.Event()
+
+    def signaler(self, texte, fait=None, total=None):
+        # Appelé depuis le thread de calcul ; lève AnalyseAnnulee si l'utilisateur a annulé
+        self.progression = texte
+        if fait is not None and total:
+            self.fraction = fait / total
+        if self._annulee.is_set():
+            raise AnalyseAnnulee(self.nom)
+
+    def annuler(self):
+        self._annulee.set()
+        # Pas encore démarrée : elle ne le sera jamais
+        self.future.cancel()
+
+    @property
+    def annulee(self):
+        return self._annulee.is_set()
+
+    def terminee(self):
+        return self.future.done()
+
+
+class ServiceInference:
+    """
+    Service d'inférence dans le processus : un thread de travail traite les tâches
+    une par une depuis une file bornée. Les détecteurs créés par les tâches sont
+    conservés (modèles chauds d'une demande à l'autre).
+    L'interface soumet une tâche puis interroge tache.terminee() / tache.progression
+    depuis sa boucle d'événements (root.after), sans jamais bloquer.
+    """
+    def __init__(self, taille_file=4):
+        self._file = queue.Queue(maxsize=taille_file)
+        self._detecteurs = {}
+        self._verrou = threading.Lock()
+        self._thread = threading.Thread(target=self._boucle, name="service-inference", daemon=True)
+        self._thread.start()
+
+    def soumettre(self, nom, calcul, *args, **kwargs):
+        # calcul(tache, *args, **kwargs) est exécuté dans le thread de travail.
+        # Lève queue.Full si trop d'analyses sont déjà en attente.
+        tache = Tache(nom)
+        self._file.put_nowait((tache, calcul, args, kwargs))
+        return tache
+
+    def detecteur(self, cle, fabrique):
+        # Détecteur partagé entre les tâches (créé au premier usage)
+        with self._verrou:
+            if cle not in self._detecteurs:
+                self._detecteurs[cle] = fabrique()
+            return self._detecteurs[cle]
+
+    def arreter(self):
+        self._file.put((None, None, None, None))
+        self._thread.join(timeout=2.0)
+
+    def _boucle(self):
+        while True:
+            tache, calcul, args, kwargs = self._file.get()
+            if tache is None: return
+            if not tache.future.set_running_or_notify_cancel():
+                continue
+            try:
+                tache.signaler("Démarrage...")
+                tache.future.set_result(calcul(tache, *args, **kwargs))
+            except BaseException as e:
+                tache.future.set_exception(e)
+
+
+class MicroLot:
+    """
+    Regroupe les demandes arrivées dans une courte fenêtre pour les traiter en un lot.
+    traiter_lot(liste d'éléments) -> liste de résultats (même ordre), exécuté dans
+    un thread unique : les modèles ne sont jamais appelés en parallèle.
+    soumettre(element) -> Future, utilisable depuis plusieurs threads.
+    """
+    def __init__(self, traiter_lot, fenetre_ms=20, taille_max=8):
+        self.traiter_lot = traiter_lot
+        self.fenetre = fenetre_ms / 1000
+        self.taille_max = taille_max
+        self._file = queue.Queue()
+        self.lots_traites = 0
+        self.elements_traites = 0
+        self._thread = threading.Thread(target=self._boucle, name="micro-lot", daemon=True)
+        self._thread.start()
+
+    def soumettre(self, element):
+        future = Future()
+        self._file.put((element, future))
+        return future
+
+    def arreter(self):
+        self._file.put(None)
+        self._thread.join(timeout=2.0)
+
+    def _boucle(self):
+        while True:
+            premier = self._file.get()
+            if premier is None: return
+            lot = [premier]
+            # On attend au plus `fenetre` secondes d'autres demandes
+            limite = time.monotonic() + self.fenetre
+            while len(lot) < self.taille_max:
+                reste = limite - time.monotonic()
+                if reste <= 0: break
+                try:
+                    suivant = self._file.get(timeout=reste)
+                except queue.Empty:
+                    break
+                if suivant is None:
+                    self._file.put(None)
+                    break
+                lot.append(suivant)
+
+            lot = [(e, f) for e, f in lot if f.set_running_or_notify_cancel()]
+            if not lot: continue
+            try:
+                resultats = self.traiter_lot([e for e, _ in lot])
+                for (_, f), r in zip(lot, resultats):
+                    f.set_result(r)
+            except Exception as e:
+                for _, f in lot:
+                    f.set_exception(e)
+            self.lots_traites += 1
+            self.elements_traites += len(lot)
@@ -1,6 +1,7 @@
+import numpy as np
 from detection.vote import HandDetector
-from datetime import datetime
-import os
+from detection.resultats import ResultatsVote
+from detection.historique import historique_application
 
 class SondageDetector(HandDetector):
     """
@@ -10,8 +11,15 @@ class SondageDetector(HandDetector):
     - 'None' = CONTRE (aucune main levée)
     """
     def detect_sondage(self, img):
-        raw = super().detect(img)
-        
+        return self.etiqueter_sondage(super().detect(img))
+
+    @staticmethod
+    def etiqueter_sondage(raw):
+        if isinstance(raw, ResultatsVote):
+            # Colonne 'sondage' remplie d'un coup
+            raw.tetes['sondage'] = np.where(np.isin(raw.tetes['vote'], ['G', 'D']), 'POUR', 'CONTRE')
+            return raw
+
         results = []
         for r in raw:
             vote = r['vote']
@@ -28,23 +36,8 @@ class SondageDetector(HandDetector):
         return results
 
     @staticmethod
-    def sauvegarder_resultats_sondage(pour, contre, fichier="historique.txt"):
-        #Enregistre les résultats du SONDAGE.
-        if not os.path.exists(fichier):
-            with open(fichier, "w", encoding="utf-8") as f:
-                f.write("")
-
-        total = pour + contre
-        if total > 0:
-            p_p = (pour / total) * 100
-            p_c = (contre / total) * 100
-        else:
-            p_p = p_c = 0
-
-        date_heure = datetime.now().strftime("%d/%m/%y à %Hh%M")
-        ligne = f"[S]: {date_heure}, {p_p:.1f}% des étudiants sont pour ({pour} pour et {contre} contre)\n"
-
-        with open(fichier, "a", encoding="utf-8") as f:
-            f.write(ligne)
-        
-        print(f"Sauvegarde effectuée dans {fichier}")
\ No newline at end of file
+    def sauvegarder_resultats_sondage(pour, contre, fichier=None, empreinte=None):
+        #Enregistre les résultats du SONDAGE (empreinte : hash de l'image analysée).
+        historique = historique_application(fichier)
+        historique.ajouter_sondage(pour, contre, empreinte)
+        print(f"Sauvegarde effectuée dans {historique.chemin}")
\ No newline at end of file
@@ -0,0 +1,96 @@
+from collections import Counter, deque
+import numpy as np
+
+
+def matrice_iou(a, b):
+    # IoU de toutes les paires de boîtes (N, 4) x (M, 4)
+    a = np.asarray(a, dtype=float).reshape(-1, 4)
+    b = np.asarray(b, dtype=float).reshape(-1, 4)
+    ix1 = np.maximum(a[:, None, 0], b[None, :, 0])
+    iy1 = np.maximum(a[:, None, 1], b[None, :, 1])
+    ix2 = np.minimum(a[:, None, 2], b[None, :, 2])
+    iy2 = np.minimum(a[:, None, 3], b[None, :, 3])
+    inter = np.clip(ix2 - ix1, 0, None) * np.clip(iy2 - iy1, 0, None)
+    aa = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    ab = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    return inter / (aa[:, None] + ab[None, :] - inter + 1e-9)
+
+
+class Piste:
+    def __init__(self, id_piste, box, fenetre_vote):
+        self.id = id_piste
+        self.box = tuple(int(v) for v in box)
+        self.vus = 1          # nombre d'images où la tête a été vue
+        self.absences = 0     # images consécutives sans correspondance
+        self.votes = deque(maxlen=fenetre_vote)
+
+    def vote_lisse(self):
+        # Vote majoritaire sur la fenêtre ('N' si aucun vote)
+        if not self.votes: return 'N'
+        return Counter(self.votes).most_common(1)[0][0]
+
+
+class SuiviTetes:
+    """
+    Suivi multi-têtes par IoU (appariement glouton, meilleures paires d'abord).
+    - une piste n'est confirmée qu'après `vus_min` apparitions : les détections
+      éphémères ne sont jamais comptées ;
+    - une piste disparaît après `absences_max` images sans correspondance ;
+    - chaque piste garde ses `fenetre_vote` derniers votes (vote lissé = majorité).
+    """
+    def __init__(self, iou_min=0.3, vus_min=3, absences_max=5, fenetre_vote=5):
+        self.iou_min = iou_min
+        self.vus_min = vus_min
+        self.absences_max = absences_max
+        self.fenetre_vote = fenetre_vote
+        self.pistes = []
+        self._prochain_id = 0
+        # Données rattachées à un groupe de pistes (clé = tuple d'ids), oubliées quand
+        # une des pistes disparaît (ex. poses mémorisées par HandDetector.detect_suivi,
+        # qui retire aussi les groupes absents de son plan de passages)
+        self.memoire = {}
+
+    def mettre_a_jour(self, boxes, votes=None):
+        # boxes : liste de (x1, y1, x2, y2) ; votes : liste alignée ('G'/'D'/'N') ou None.
+        # Retourne, pour chaque boîte, la piste associée.
+        associees = [None] * len(boxes)
+        libres = set(range(len(self.pistes)))
+
+        if len(boxes) and self.pistes:
+            ious = matrice_iou([p.box for p in self.pistes], boxes)
+            for i, j in zip(*np.unravel_index(np.argsort(-ious, axis=None), ious.shape)):
+                if ious[i, j] < self.iou_min: break
+                if i not in libres or associees[j] is not None: continue
+                libres.discard(i)
+                piste = self.pistes[i]
+                piste.box = tuple(int(v) for v in boxes[j])
+                piste.vus += 1
+                piste.absences = 0
+                associees[j] = piste
+
+        for i in libres:
+            self.pistes[i].absences += 1
+
+        for j, box in enumerate(boxes):
+            if associees[j] is None:
+                associees[j] = Piste(self._prochain_id, box, self.fenetre_vote)
+                self._prochain_id += 1
+                self.pistes.append(associees[j])
+
+        if votes is not None:
+            for piste, vote in zip(associees, votes):
+                piste.votes.append(vote)
+
+        self.pistes = [p for p in self.pistes if p.absences <= self.absences_max]
+        vivantes = {p.id for p in self.pistes}
+        self.memoire = {cle: v for cle, v in self.memoire.items() if vivantes.issuperset(cle)}
+        return associees
+
+    def confirmees(self):
+        return [p for p in self.pistes if p.vus >= self.vus_min]
+
+    def decompte_votes(self):
+        decompte = {'G': 0, 'D': 0, 'N': 0}
+        for p in self.confirmees():
+            decompte[p.vote_lisse()] += 1
+        return decompte
@@ -0,0 +1,257 @@
+import hashlib
+import threading
+from collections import OrderedDict
+import numpy as np
+
+
+class DetectionTetes:
+    # Résultat brut d'un passage du modèle de têtes, partagé par Comptage, Sondage et Vote.
+    # xyxy : (N, 4) float32 en pixels, conf : (N,), cls : (N,) int
+    def __init__(self, xyxy, conf, cls, shape):
+        self.xyxy = xyxy
+        self.conf = conf
+        self.cls = cls
+        self.shape = shape
+
+    def __len__(self):
+        return len(self.xyxy)
+
+    @classmethod
+    def depuis_resultat(cls, resultat, shape):
+        boxes = resultat.boxes
+        if boxes is None or len(boxes) == 0:
+            return cls(np.zeros((0, 4), np.float32), np.zeros(0, np.float32), np.zeros(0, int), shape)
+        return cls(boxes.xyxy.cpu().numpy(),
+                   boxes.conf.cpu().numpy(),
+                   boxes.cls.cpu().numpy().astype(int),
+                   shape)
+
+    def indices_classe(self, class_id, seuil=None):
+        masque = self.cls == class_id
+        if seuil is not None:
+            # Comparaison en float64 comme float(box.conf) > seuil
+            masque &= self.conf.astype(np.float64) > seuil
+        return np.flatnonzero(masque)
+
+
+def empreinte_image(img):
+    # Hash du contenu : deux captures identiques (ou la même image relue) partagent le cache
+    h = hashlib.blake2b(digest_size=16)
+    h.update(str((img.shape, img.dtype.str)).encode())
+    h.update(np.ascontiguousarray(img).data)
+    return h.hexdigest()
+
+
+def _cle_modele(modele):
+    return getattr(modele, 'ckpt_path', None) or id(modele)
+
+
+# Un verrou par modèle : le prédicteur YOLO n'accepte pas deux appels simultanés,
+# les appelants de plusieurs threads sont donc sérialisés sur chaque modèle.
+_verrous_modeles = {}
+_verrou_verrous = threading.Lock()
+
+
+def verrou_modele(modele):
+    with _verrou_verrous:
+        return _verrous_modeles.setdefault(_cle_modele(modele), threading.Lock())
+
+
+class CacheTetes:
+    # Cache LRU borné des passages du modèle de têtes.
+    def __init__(self, taille_max=8):
+        self.taille_max = taille_max
+        self._entrees = OrderedDict()
+        self._verrou = threading.Lock()
+
+    @staticmethod
+    def _cle(modele, img, params):
+        return (_cle_modele(modele), empreinte_image(img), tuple(sorted(params.items())))
+
+    def obtenir(self, modele, img, **params):
+        cle = self._cle(modele, img, params)
+        with self._verrou:
+            if cle in self._entrees:
+                self._entrees.move_to_end(cle)
+                return self._entrees[cle]
+
+        detection = _inferer(modele, img, **params)
+
+        with self._verrou:
+            self._entrees[cle] = detection
+            self._entrees.move_to_end(cle)
+            while len(self._entrees) > self.taille_max:
+                self._entrees.popitem(last=False)
+        return detection
+
+    def obtenir_plusieurs(self, modele, images, **params):
+        # Consultation sans inférence : détection en cache ou None pour chaque image
+        cles = [self._cle(modele, img, params) for img in images]
+        with self._verrou:
+            for cle in cles:
+                if cle in self._entrees: self._entrees.move_to_end(cle)
+            return [self._entrees.get(cle) for cle in cles]
+
+    def inserer(self, modele, img, detection, **params):
+        # Injecte une détection déjà connue (ex. relue depuis le cache disque)
+        cle = self._cle(modele, img, params)
+        with self._verrou:
+            self._entrees[cle] = detection
+            self._entrees.move_to_end(cle)
+            while len(self._entrees) > self.taille_max:
+                self._entrees.popitem(last=False)
+
+    def invalider(self, img=None):
+        # Sans argument : vide tout le cache. Sinon : retire les entrées de cette image.
+        with self._verrou:
+            if img is None:
+                self._entrees.clear()
+                return
+            empreinte = empreinte_image(img)
+            for cle in [c for c in self._entrees if c[1] == empreinte]:
+                del self._entrees[cle]
+
+    def __len__(self):
+        return len(self._entrees)
+
+
+# Cache commun au processus
+CACHE_TETES = CacheTetes()
+
+
+# =============================================================================
+# DÉTECTION PAR TUILES (grandes images d'amphi)
+# =============================================================================
+# Sur une photo 4K réduite à la taille d'entrée du modèle, les têtes du fond ne
+# font plus que quelques pixels. En mode tuiles, l'image est découpée en carrés
+# de `tuile` pixels qui se recouvrent, passés au modèle par lots de `lot_tuiles`
+# (mémoire bornée), puis les boîtes sont ramenées dans l'image et fusionnées
+# par NMS. Un passage global sur l'image entière garde les grosses têtes du
+# premier rang qui dépassent le recouvrement.
+
+def decouper_tuiles(h, w, tuile, recouvrement=0.2):
+    # Liste de (x1, y1, x2, y2) couvrant toute l'image, la dernière tuile collée au bord
+    pas = max(1, int(tuile * (1 - recouvrement)))
+
+    def debuts(n):
+        if n <= tuile: return [0]
+        d = list(range(0, n - tuile, pas))
+        return d + [n - tuile]
+
+    return [(x, y, min(x + tuile, w), min(y + tuile, h)) for y in debuts(h) for x in debuts(w)]
+
+
+def nms(xyxy, conf, cls, seuil_iou=0.5):
+    # NMS glouton par classe, indices conservés triés par confiance décroissante
+    if len(xyxy) == 0: return np.zeros(0, int)
+    # Décalage par classe : deux classes différentes ne se recouvrent jamais
+    boites = xyxy.astype(np.float64) + (cls.astype(np.float64) * (xyxy.max() + 1))[:, None]
+    aires = (boites[:, 2] - boites[:, 0]) * (boites[:, 3] - boites[:, 1])
+    ordre = np.argsort(-conf, kind='stable')
+    gardes = []
+    while len(ordre):
+        i, reste = ordre[0], ordre[1:]
+        gardes.append(i)
+        ix1 = np.maximum(boites[i, 0], boites[reste, 0])
+        iy1 = np.maximum(boites[i, 1], boites[reste, 1])
+        ix2 = np.minimum(boites[i, 2], boites[reste, 2])
+        iy2 = np.minimum(boites[i, 3], boites[reste, 3])
+        inter = np.clip(ix2 - ix1, 0, None) * np.clip(iy2 - iy1, 0, None)
+        iou = inter / (aires[i] + aires[reste] - inter + 1e-9)
+        ordre = reste[iou <= seuil_iou]
+    return np.array(gardes, dtype=int)
+
+
+def _boites_coupees(xyxy, rect, shape, marge=2):
+    # Boîte qui touche un bord de tuile intérieur à l'image : tête tronquée,
+    # retrouvée entière dans la tuile voisine ou dans le passage global.
+    x1, y1, x2, y2 = rect
+    h, w = shape
+    return (((xyxy[:, 0] <= marge) & (x1 > 0)) |
+            ((xyxy[:, 1] <= marge) & (y1 > 0)) |
+            ((xyxy[:, 2] >= x2 - x1 - marge) & (x2 < w)) |
+            ((xyxy[:, 3] >= y2 - y1 - marge) & (y2 < h)))
+
+
+def detecter_par_tuiles(modele, img, tuile, recouvrement=0.2, lot_tuiles=8, iou_tuiles=0.5,
+                        passage_global=True, **params):
+    shape = img.shape[:2]
+    rects = decouper_tuiles(shape[0], shape[1], tuile, recouvrement)
+    xyxy, conf, cls = [], [], []
+
+    if passage_global:
+        d = DetectionTetes.depuis_resultat(modele(img, verbose=False, **params)[0], shape)
+        xyxy.append(d.xyxy); conf.append(d.conf); cls.append(d.cls)
+
+    for debut in range(0, len(rects), lot_tuiles):
+        lot = rects[debut:debut + lot_tuiles]
+        morceaux = [img[y1:y2, x1:x2] for x1, y1, x2, y2 in lot]
+        resultats = modele(morceaux, imgsz=tuile, verbose=False, **params)
+        for rect, morceau, res in zip(lot, morceaux, resultats):
+            d = DetectionTetes.depuis_resultat(res, morceau.shape[:2])
+            if len(d) == 0: continue
+            garde = ~_boites_coupees(d.xyxy, rect, shape)
+            xyxy.append(d.xyxy[garde] + np.array([rect[0], rect[1], rect[0], rect[1]], np.float32))
+            conf.append(d.conf[garde]); cls.append(d.cls[garde])
+
+    if not xyxy:
+        return DetectionTetes(np.zeros((0, 4), np.float32), np.zeros(0, np.float32), np.zeros(0, int), shape)
+    xyxy, conf, cls = np.concatenate(xyxy), np.concatenate(conf), np.concatenate(cls)
+    gardes = nms(xyxy, conf, cls, iou_tuiles)
+    return DetectionTetes(xyxy[gardes], conf[gardes], cls[gardes], shape)
+
+
+def params_tuiles(tuile, recouvrement=0.2, iou_tuiles=0.5, lot_tuiles=8):
+    # Mode tuiles désactivé : aucun paramètre, pour partager la clé de cache
+    # avec les appels sur l'image entière
+    if not tuile: return {}
+    return {'tuile': int(tuile), 'recouvrement': float(recouvrement),
+            'iou_tuiles': float(iou_tuiles), 'lot_tuiles': int(lot_tuiles)}
+
+
+def _inferer(modele, img, tuile=0, **params):
+    with verrou_modele(modele):
+        if tuile and max(img.shape[:2]) > tuile:
+            return detecter_par_tuiles(modele, img, tuile, **params)
+        for cle in ('recouvrement', 'lot_tuiles', 'iou_tuiles', 'passage_global'):
+            params.pop(cle, None)
+        return DetectionTetes.depuis_resultat(modele(img, verbose=False, **params)[0], img.shape[:2])
+
+
+def detecter_tetes(modele, img, cache=CACHE_TETES, **params):
+    # params : arguments du modèle, plus tuile / recouvrement / lot_tuiles / iou_tuiles
+    # pour le mode tuiles (tuile=0 : image entière)
+    if cache is None:
+        return _inferer(modele, img, **params)
+    return cache.obtenir(modele, img, **params)
+
+
+def detecter_tetes_lot(modele, images, cache=CACHE_TETES, taille_lot=8, **params):
+    # Version multi-images : les images absentes du cache passent dans le modèle par
+    # lots de `taille_lot` (le mode tuiles reste image par image, ses tuiles étant déjà groupées).
+    # Un lot ne mélange pas les tailles d'image : Ultralytics letterboxerait alors en carré
+    # au lieu du rectangle minimal d'un appel seul, et les boîtes différeraient de
+    # detecter_tetes pour une même clé de cache.
+    images = list(images)
+    if params.get('tuile'):
+        return [detecter_tetes(modele, img, cache=cache, **params) for img in images]
+
+    detections = cache.obtenir_plusieurs(modele, images, **params) if cache is not None else [None] * len(images)
+
+    par_taille = {}
+    for k, d in enumerate(detections):
+        if d is None: par_taille.setdefault(images[k].shape, []).append(k)
+    lots = [ks[debut:debut + max(1, taille_lot)] for ks in par_taille.values()
+            for debut in range(0, len(ks), max(1, taille_lot))]
+    for lot in lots:
+        with verrou_modele(modele):
+            resultats = modele([images[k] for k in lot], verbose=False, **params)
+        for k, res in zip(lot, resultats):
+            detections[k] = DetectionTetes.depuis_resultat(res, images[k].shape[:2])
+            if cache is not None:
+                cache.inserer(modele, images[k], detections[k], **params)
+    return detections
+
+
+def invalider_cache_tetes(img=None):
+    CACHE_TETES.invalider(img)
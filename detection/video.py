@@ -0,0 +1,159 @@
+import csv
+import queue
+import threading
+import time
+import cv2
+from detection.suivi import SuiviTetes
+from detection.mouvement import DetecteurMouvement
+
+# =============================================================================
+# ANALYSE DE VIDÉOS (fichier ou webcam) -> CHRONOLOGIE PRÉSENCE / VOTES
+# =============================================================================
+# - un thread lit la vidéo et ne décode qu'une image sur `pas` (grab() pour les autres) ;
+# - sans mouvement depuis la dernière image analysée, son résultat est réutilisé
+#   (DetecteurMouvement, avec un recomptage forcé à intervalle régulier) ;
+# - les têtes sont suivies d'une image à l'autre (SuiviTetes) : effectif et votes
+#   lissés, détections éphémères ignorées.
+
+
+class LecteurVideo:
+    # Itère sur (numero_image, t_secondes, image) pour une image sur `pas`.
+    def __init__(self, cap, pas=1, taille_file=8, temps_reel=False):
+        self.cap = cap
+        self.pas = max(1, pas)
+        # Webcam : horloge murale ; fichier : position dans la vidéo
+        self.temps_reel = temps_reel
+        fps = cap.get(cv2.CAP_PROP_FPS)
+        self.fps = fps if fps and fps > 0 else 25.0
+        self._file = queue.Queue(maxsize=taille_file)
+        self.images_ignorees = 0
+        self._actif = True
+        self._thread = threading.Thread(target=self._lire, name="video-lecture", daemon=True)
+        self._thread.start()
+
+    def _lire(self):
+        numero, debut = 0, time.perf_counter()
+        while self._actif:
+            if numero % self.pas:
+                ok = self.cap.grab()
+                frame = None
+            else:
+                ok, frame = self.cap.read()
+            if not ok: break
+            if frame is not None:
+                t = time.perf_counter() - debut if self.temps_reel else numero / self.fps
+                self._deposer((numero, t, frame))
+            numero += 1
+        self._deposer(None)
+
+    def _deposer(self, element):
+        # Fichier : on attend l'analyse (aucune image perdue).
+        # Webcam : comme FluxAnalyse, la plus récente prime ; la plus ancienne en file est jetée
+        if not self.temps_reel:
+            self._file.put(element)
+            return
+        while True:
+            try:
+                self._file.put_nowait(element)
+                return
+            except queue.Full:
+                try:
+                    self._file.get_nowait()
+                    self.images_ignorees += 1
+                except queue.Empty:
+                    pass
+
+    def arreter(self, delai=2.0):
+        # Arrête la lecture et attend la fin du thread : la capture ne doit pas être
+        # libérée (cap.release()) pendant un read()/grab() en cours
+        self._actif = False
+        fin = time.perf_counter() + delai
+        while self._thread.is_alive() and time.perf_counter() < fin:
+            # Débloque le thread de lecture s'il attend une place dans la file
+            try:
+                while True: self._file.get_nowait()
+            except queue.Empty:
+                pass
+            self._thread.join(timeout=0.05)
+
+    def __iter__(self):
+        while True:
+            element = self._file.get()
+            if element is None: return
+            yield element
+
+
+class AnalyseVideo:
+    """
+    analyser(frame) -> (boxes, votes) : têtes (x1, y1, x2, y2) et votes alignés
+    ('G'/'D'/'N'), votes = None pour le simple comptage.
+    mouvement : DetecteurMouvement ; une image sans mouvement depuis la dernière
+    analyse réutilise le résultat précédent (None = toutes les images sont analysées).
+    """
+    def __init__(self, analyser, suivi=None, mouvement=None):
+        self.analyser = analyser
+        self.suivi = suivi or SuiviTetes()
+        self.mouvement = mouvement
+        self.chronologie = []
+        self.analyses = 0
+        self.reutilisations = 0
+        self._dernier = None
+
+    def traiter(self, numero, t, frame):
+        # Horloge de la vidéo : l'intervalle max du détecteur est en secondes de vidéo
+        statique = self.mouvement is not None and not self.mouvement.doit_analyser(frame, t) \
+            and self._dernier is not None
+        if statique:
+            self.reutilisations += 1
+            boxes, votes = self._dernier
+        else:
+            boxes, votes = self.analyser(frame)
+            self._dernier = (boxes, votes)
+            self.analyses += 1
+
+        self.suivi.mettre_a_jour(boxes, votes)
+        ligne = {
+            'image': numero, 't': round(t, 2),
+            'tetes_brutes': len(boxes),
+            'presents': len(self.suivi.confirmees()),
+            'reutilise': int(statique),
+        }
+        if votes is not None:
+            ligne.update(self.suivi.decompte_votes())
+        self.chronologie.append(ligne)
+        return ligne
+
+    def executer(self, lecteur, rappel=None):
+        # rappel(ligne, frame) après chaque image (affichage, progression...)
+        for numero, t, frame in lecteur:
+            ligne = self.traiter(numero, t, frame)
+            if rappel is not None and rappel(ligne, frame) is False:
+                lecteur.arreter()
+                break
+        return self.chronologie
+
+    def ecrire_csv(self, chemin):
+        if not self.chronologie: return
+        with open(chemin, "w", newline="", encoding="utf-8") as f:
+            w = csv.DictWriter(f, fieldnames=list(self.chronologie[-1].keys()))
+            w.writeheader()
+            w.writerows(self.chronologie)
+
+
+# --- Fonctions d'analyse prêtes à l'emploi ---
+def analyseur_comptage(compteur, seuil=0.3):
+    def analyser(frame):
+        compteur.charger_image(frame)
+        compteur.compter(seuil)
+        det = compteur.resultats
+        return [tuple(map(int, det.xyxy[i])) for i in det.indices_classe(compteur.CLASS_ID_HEAD, seuil)], None
+    return analyser
+
+
+def analyseur_vote(detecteur, suivi_poses=True):
+    # suivi_poses : la pose n'est recalculée que pour les têtes qui ont bougé (detect_suivi)
+    suivi = SuiviTetes(vus_min=1) if suivi_poses else None
+    def analyser(frame):
+        resultats = detecteur.detect_suivi(frame, suivi) if suivi else detecteur.detect(frame)
+        return [r['head_box'] for r in resultats], [r['vote'] for r in resultats]
+    return analyser
@@ -1,8 +1,12 @@
 import cv2
 import numpy as np
-from ultralytics import YOLO
-from datetime import datetime
-import os
+import time
+from detection.modeles import charger_modele, resoudre_backend
+from detection.tetes import detecter_tetes_lot, params_tuiles, verrou_modele
+from detection.dedup import dedupliquer
+from detection.cache_inference import CacheInference
+from detection.resultats import ResultatsVote, COLOR_LEFT, COLOR_RIGHT
+from detection.historique import historique_application
 
 # --- PARAMÈTRES ---
 DEFAULT_CONFIG = {
@@ -22,9 +26,35 @@ DEFAULT_CONFIG = {
     'BASE_ANGLE_THRESH_DEG': 75,
     'MIN_WRIST_ELBOW_RATIO': 0.7,
     'HEAD_HEIGHT_MULTIPLIER': 6.0,
-    'HEAD_CLASS_ID': 0
+    'HEAD_CLASS_ID': 0,
+    'POSE_IMGSZ': 448,
+    'POSE_BATCH_SIZE': 16,
+    'POSE_MERGE_CROPS': False,
+    'MERGE_MIN_OVERLAP': 0.5,
+    'MERGE_MAX_SIDE_RATIO': 1.5,
+    'HEAD_TILE_SIZE': 0,         # 0 = image entière ; ex. 640 pour les photos 4K
+    'HEAD_TILE_OVERLAP': 0.2,
+    'HEAD_TILE_NMS_IOU': 0.5,
+    'HEAD_TILE_BATCH': 8,
+    'CASCADE_CONF_MARGIN': 0.15,  # FAIL à moins de cette marge d'un seuil de confiance -> modèle lourd
+    'CASCADE_MIN_KPT_CONF': 0.30, # confiance moyenne bras trop faible -> modèle lourd
+    'POSE_REUSE_DIFF': 6.0,       # detect_suivi : écart moyen (0-255) du crop sous lequel la pose est réutilisée
+    'POSE_REUSE_MAX_AGE': 30      # detect_suivi : pose recalculée au moins toutes les N images
 }
 
+# Paramètres qui modifient la sortie brute des réseaux (têtes + keypoints) :
+# tous les autres ne jouent que sur le post-traitement et peuvent être rejoués depuis le cache.
+CLES_INFERENCE = ['HEAD_CLASS_ID', 'HEAD_HEIGHT_MULTIPLIER', 'POSE_MODEL_CONF', 'POSE_IMGSZ',
+                  'POSE_MERGE_CROPS', 'MERGE_MIN_OVERLAP', 'MERGE_MAX_SIDE_RATIO',
+                  'HEAD_TILE_SIZE', 'HEAD_TILE_OVERLAP', 'HEAD_TILE_NMS_IOU',
+                  'CASCADE_CONF_MARGIN', 'CASCADE_MIN_KPT_CONF']
+
+# Avec une cascade, le choix des passages refaits par le modèle lourd (a_escalader)
+# dépend aussi des seuils de validation des mains : ils entrent alors dans la clé du cache
+CLES_CASCADE = ['BASE_HAND_CONF_THRESH', 'ELBOW_CONF_THRESH', 'SHOULDER_CONF_THRESH',
+                'PAIR_WRIST_ELBOW_THRESH', 'PAIR_WRIST_SHOULDER_THRESH', 'PAIR_ELBOW_SHOULDER_THRESH',
+                'TOTAL_CONF_THRESH', 'BASE_ANGLE_THRESH_DEG', 'MIN_WRIST_ELBOW_RATIO']
+
 KEYPOINT_IDX = {
     'NOSE': 0,
     'LEFT_SHOULDER': 5, 'RIGHT_SHOULDER': 6,
@@ -32,10 +62,6 @@ KEYPOINT_IDX = {
     'LEFT_WRIST': 9, 'RIGHT_WRIST': 10
 }
 
-# --- COULEURS SQUELETTE ---
-COLOR_LEFT = (255, 0, 0)    # BLEU
-COLOR_RIGHT = (0, 255, 0)   # VERT
-
 def clamp(v, a, b): return max(a, min(v, b))
 
 def angle_between(a, b):
@@ -48,40 +74,185 @@ def get_keypoint_coords(kpt, index, crop_x_offset, crop_y_offset):
     p = kpt[index]
     return (int(p[0]) + crop_x_offset, int(p[1]) + crop_y_offset, float(p[2]))
 
+# Indices (GAUCHE, DROITE) utilisés par la validation vectorisée
+IDX_WRIST = [KEYPOINT_IDX['LEFT_WRIST'], KEYPOINT_IDX['RIGHT_WRIST']]
+IDX_ELBOW = [KEYPOINT_IDX['LEFT_ELBOW'], KEYPOINT_IDX['RIGHT_ELBOW']]
+IDX_SHOULDER = [KEYPOINT_IDX['LEFT_SHOULDER'], KEYPOINT_IDX['RIGHT_SHOULDER']]
+
+def coordonnees_keypoints(kpts, crop_x_offset, crop_y_offset):
+    # Version tableau de get_keypoint_coords pour tous les squelettes d'un crop :
+    # xy (N, 17, 2) entiers dans l'image complète, conf (N, 17) en float64.
+    xy = np.trunc(kpts[..., :2]).astype(np.int64) + np.array([crop_x_offset, crop_y_offset], dtype=np.int64)
+    return xy, kpts[..., 2].astype(np.float64)
+
+def valider_mains(xy, conf, angle_thresh_deg, min_dist, cfg):
+    # Équivalent vectorisé de HandDetector.check_hand_smart pour tous les squelettes
+    # et les deux côtés (colonne 0 = GAUCHE, 1 = DROITE).
+    # angle_thresh_deg / min_dist : scalaires -> sorties (N, 2),
+    # ou tableaux (M,) (un seuil par tête) -> sorties (N, M, 2).
+    # Retourne (valide, raison) avec les mêmes codes : POS, LEN, ANG, OK, RATT, FAIL.
+    wx, wy = xy[:, IDX_WRIST, 0], xy[:, IDX_WRIST, 1]
+    ex, ey = xy[:, IDX_ELBOW, 0], xy[:, IDX_ELBOW, 1]
+    sy = xy[:, IDX_SHOULDER, 1]
+    wc, ec, sc = conf[:, IDX_WRIST], conf[:, IDX_ELBOW], conf[:, IDX_SHOULDER]
+
+    angle_thresh_deg = np.asarray(angle_thresh_deg, dtype=float)
+    min_dist = np.asarray(min_dist, dtype=float)
+    if angle_thresh_deg.ndim == 1:
+        wx, wy, ex, ey, sy, wc, ec, sc = (a[:, None, :] for a in (wx, wy, ex, ey, sy, wc, ec, sc))
+        angle_thresh_deg = angle_thresh_deg[:, None]
+        min_dist = min_dist[:, None]
+
+    pos_ko = wy > sy - 10
+    len_ko = np.abs(wy - ey) < min_dist
+
+    vx, vy = (wx - ex).astype(float), (wy - ey).astype(float)
+    norme = np.sqrt(vx * vx + vy * vy)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        angle = np.degrees(np.arccos(np.clip(-vy / norme, -1.0, 1.0)))
+    angle = np.where(norme == 0, 180.0, angle)
+    ang_ko = angle > angle_thresh_deg
+
+    strict_ok = (wc >= cfg['BASE_HAND_CONF_THRESH']) & \
+                (ec >= cfg['ELBOW_CONF_THRESH']) & \
+                (sc >= cfg['SHOULDER_CONF_THRESH'])
+
+    rescued = ((wc + ec) >= cfg['PAIR_WRIST_ELBOW_THRESH']) | \
+              ((wc + sc) >= cfg['PAIR_WRIST_SHOULDER_THRESH']) | \
+              ((ec + sc) >= cfg['PAIR_ELBOW_SHOULDER_THRESH'])
+    rescued &= ~((wc + ec + sc) < cfg['TOTAL_CONF_THRESH'])
+
+    geo_ok = ~pos_ko & ~len_ko & ~ang_ko
+    valide = geo_ok & (strict_ok | rescued)
+    raison = np.select([pos_ko, len_ko, ang_ko, strict_ok, rescued],
+                       ["POS", "LEN", "ANG", "OK", "RATT"], default="FAIL")
+    return valide, raison
+
+def seuils_tete(h, cfg):
+    # Seuils adaptés à la taille de la tête (en pixels)
+    return {
+        'dedup_dist': max(20, int(cfg['BASE_DEDUP_DIST'] * (h / 100))),
+        'angle_thresh_deg': min(90, max(50, cfg['BASE_ANGLE_THRESH_DEG'] * (h / 150))),
+        'min_dist': max(5, h * cfg['MIN_WRIST_ELBOW_RATIO'])
+    }
+
+def a_escalader(kpts, rect, boites, cfg):
+    # Cascade : décide si la sortie du modèle Pose léger sur un passage est assez sûre.
+    # boites : (M, 4) boîtes entières des têtes du passage.
+    # À refaire avec le modèle lourd si une tête n'a aucun squelette, si un bras est
+    # RATT, FAIL près d'un seuil de confiance, ou si ses keypoints sont peu confiants.
+    if kpts is None or len(kpts) == 0: return True
+    xy, conf = coordonnees_keypoints(kpts, rect[0], rect[1])
+    nx, ny = xy[:, KEYPOINT_IDX['NOSE'], 0], xy[:, KEYPOINT_IDX['NOSE'], 1]
+    nez_dans_tete = (boites[:, 0] <= nx[:, None]) & (nx[:, None] <= boites[:, 2]) & \
+                    (boites[:, 1] <= ny[:, None]) & (ny[:, None] <= boites[:, 3])
+    if not nez_dans_tete.any(axis=0).all(): return True
+
+    seuils = [seuils_tete(b[3] - b[1], cfg) for b in boites]
+    angles = np.array([t['angle_thresh_deg'] for t in seuils], dtype=float)
+    min_dists = np.array([t['min_dist'] for t in seuils], dtype=float)
+    _, raison = valider_mains(xy, conf, angles, min_dists, cfg)
+
+    marge = cfg['CASCADE_CONF_MARGIN']
+    wc, ec, sc = conf[:, IDX_WRIST], conf[:, IDX_ELBOW], conf[:, IDX_SHOULDER]
+    proche = ((wc >= cfg['BASE_HAND_CONF_THRESH'] - marge) & (ec >= cfg['ELBOW_CONF_THRESH'] - marge)) | \
+             ((wc + ec) >= cfg['PAIR_WRIST_ELBOW_THRESH'] - marge) | \
+             ((wc + sc) >= cfg['PAIR_WRIST_SHOULDER_THRESH'] - marge) | \
+             ((ec + sc) >= cfg['PAIR_ELBOW_SHOULDER_THRESH'] - marge)
+    faible = (wc + ec + sc) / 3 < cfg['CASCADE_MIN_KPT_CONF']
+
+    douteux = (raison == 'RATT') | ((raison == 'FAIL') & proche[:, None, :]) | faible[:, None, :]
+    return bool((douteux & nez_dans_tete[:, :, None]).any())
+
+def signature_crop(img, rect, taille=32):
+    # Miniature en niveaux de gris d'un crop, pour mesurer s'il a changé d'une image à l'autre
+    X1, Y1, X2, Y2 = rect
+    crop = img[Y1:Y2, X1:X2]
+    gris = cv2.cvtColor(crop, cv2.COLOR_BGR2GRAY) if crop.ndim == 3 else crop
+    return cv2.resize(gris, (taille, taille), interpolation=cv2.INTER_AREA).astype(np.int16)
+
+def letterbox(img, taille, couleur=(114, 114, 114)):
+    # Redimensionne en gardant le ratio puis complète en carré taille x taille.
+    # Retourne aussi (ratio, pad_x, pad_y) pour revenir aux coordonnées du crop.
+    h, w = img.shape[:2]
+    r = min(taille / h, taille / w)
+    nw, nh = int(round(w * r)), int(round(h * r))
+    if (nw, nh) != (w, h):
+        img = cv2.resize(img, (nw, nh), interpolation=cv2.INTER_LINEAR)
+    px, py = (taille - nw) // 2, (taille - nh) // 2
+    img = cv2.copyMakeBorder(img, py, taille - nh - py, px, taille - nw - px,
+                             cv2.BORDER_CONSTANT, value=couleur)
+    return img, r, px, py
+
+def planifier_passes(crops, recouvrement_min, ratio_max):
+    # Regroupe les crops qui se recouvrent en tuiles communes (un passage Pose par tuile).
+    # Un crop rejoint la tuile qu'il recouvre le plus (part de sa propre surface),
+    # tant que le côté de la tuile reste <= ratio_max * le plus grand crop membre :
+    # on borne ainsi la perte de résolution après letterbox.
+    # Retourne une liste de (rect, [indices des crops membres]).
+    tuiles = []
+    ordre = sorted(range(len(crops)), key=lambda i: (crops[i][1], crops[i][0]))
+
+    for i in ordre:
+        X1, Y1, X2, Y2 = crops[i]
+        aire = max(1, (X2 - X1) * (Y2 - Y1))
+        cote = max(X2 - X1, Y2 - Y1)
+
+        meilleure, meilleur_rec = None, 0.0
+        for t in tuiles:
+            tx1, ty1, tx2, ty2 = t['rect']
+            inter = max(0, min(X2, tx2) - max(X1, tx1)) * max(0, min(Y2, ty2) - max(Y1, ty1))
+            rec = inter / aire
+            if rec < recouvrement_min or rec <= meilleur_rec: continue
+            cote_union = max(max(X2, tx2) - min(X1, tx1), max(Y2, ty2) - min(Y1, ty1))
+            if cote_union > ratio_max * max(cote, t['cote_max']): continue
+            meilleure, meilleur_rec = t, rec
+
+        if meilleure is None:
+            tuiles.append({'rect': (X1, Y1, X2, Y2), 'membres': [i], 'cote_max': cote})
+        else:
+            tx1, ty1, tx2, ty2 = meilleure['rect']
+            meilleure['rect'] = (min(X1, tx1), min(Y1, ty1), max(X2, tx2), max(Y2, ty2))
+            meilleure['membres'].append(i)
+            meilleure['cote_max'] = max(cote, meilleure['cote_max'])
+
+    return [(t['rect'], t['membres']) for t in tuiles]
+
 class HandDetector:
-    def __init__(self, head_model_path="yolo_head_test.pt", pose_model_path="yolov8x-pose-p6.pt", config=None):
-        self.cfg = config if config else DEFAULT_CONFIG
+    def __init__(self, head_model_path="yolo_head_test.pt", pose_model_path="yolov8x-pose-p6.pt", config=None, backend='pt',
+                 pose_backend=None, cascade_model_path=None):
+        self.cfg = {**DEFAULT_CONFIG, **(config or {})}
         print(f"Config chargée. Superposition stricte à {self.cfg['SUPER_STRICT_DIST']}px")
-        self.head_model = YOLO(head_model_path)
-        self.pose_model = YOLO(pose_model_path)
+        self.head_model_path = head_model_path
+        self.pose_model_path = pose_model_path
+        # backend : 'pt', 'onnx', 'openvino' ou 'auto' (voir detection/modeles.py)
+        # pose_backend : backend propre au modèle Pose (ex. 'int8'), sinon le même
+        self.backend = backend
+        self.pose_backend = pose_backend or backend
+        self.head_model = charger_modele(head_model_path, backend=backend)
+        self.pose_model = charger_modele(pose_model_path, backend=self.pose_backend)
+        # Cascade optionnelle : un modèle Pose léger (ex. yolov8n-pose.pt) passe sur tous
+        # les crops, le modèle lourd ne reprend que les cas douteux (voir a_escalader)
+        self.cascade_model_path = cascade_model_path
+        self.cascade_model = charger_modele(cascade_model_path, backend=self.pose_backend) if cascade_model_path else None
+        # Statistiques du dernier appel à detect() (passages Pose économisés, etc.)
+        self.stats = {}
+        # Callback optionnel progression(texte, fait, total), appelé pendant inferer() ;
+        # il peut lever une exception pour interrompre l'analyse (annulation)
+        self.progression = None
 
     @staticmethod
-    def sauvegarder_vote_txt(results, fichier="historique.txt"):
-        #Enregistre les résultats du VOTE.
-        if not os.path.exists(fichier):
-            with open(fichier, "w", encoding="utf-8") as f:
-                f.write("")
-
+    def sauvegarder_vote_txt(results, fichier=None, empreinte=None):
+        #Enregistre les résultats du VOTE (empreinte : hash de l'image analysée).
         total_heads = len(results)
         nb_gauche = sum(1 for r in results if r['vote'] == 'G')
         nb_droite = sum(1 for r in results if r['vote'] == 'D')
         # On compte comme Abstention tout ce qui n'est pas G ou D (donc 'N', '2M', etc.)
         nb_abst = sum(1 for r in results if r['vote'] not in ['G', 'D'])
 
-        if total_heads > 0:
-            p_g = (nb_gauche / total_heads) * 100
-            p_d = (nb_droite / total_heads) * 100
-            p_a = (nb_abst / total_heads) * 100
-        else:
-            p_g = p_d = p_a = 0
-
-        date_heure = datetime.now().strftime("%d/%m/%y à %Hh%M")
-        ligne = f" [V]: {date_heure}, {p_g:.1f}% option A, {p_d:.1f}% option B et {p_a:.1f}% abstention ({nb_gauche + nb_abst + nb_droite} votes au total)\n"
-
-        with open(fichier, "a", encoding="utf-8") as f:
-            f.write(ligne)
-        
-        print(f"Sauvegarde effectuée dans {fichier}")
+        historique = historique_application(fichier)
+        historique.ajouter_vote(nb_gauche, nb_droite, nb_abst, empreinte)
+        print(f"Sauvegarde effectuée dans {historique.chemin}")
 
     def check_hand_smart(self, wrist, elbow, shoulder, angle_thresh_deg, min_dist):
         wx, wy, wc = wrist
@@ -130,26 +301,57 @@ class HandDetector:
 
         return False
 
-    def detect(self, img):
-        if img is None: return []
-        
-        head_results = self.head_model(img, verbose=False)[0]
-        
-        heads_list = [] 
-        all_candidates = [] 
+    def _signaler(self, texte, fait=None, total=None):
+        if self.progression is not None:
+            self.progression(texte, fait, total)
 
-        h_img, w_img = img.shape[:2]
+    def _inferer_poses(self, img, crops, modele=None):
+        # crops : liste de rectangles (X1, Y1, X2, Y2) dans l'image complète.
+        # Retourne, pour chaque crop, un tableau (N, 17, 3) de keypoints exprimés
+        # dans le repère du crop (ou None si le modèle ne renvoie rien).
+        return self._inferer_poses_lot([(img, rect) for rect in crops], modele)
 
-        for i, box in enumerate(head_results.boxes):
-            if int(box.cls[0]) != self.cfg['HEAD_CLASS_ID']: continue
-            x1, y1, x2, y2 = box.xyxy[0].cpu().numpy().astype(int)
-            h = y2 - y1
-            
-            heads_list.append({'id': i, 'box': (x1, y1, x2, y2), 'h': h})
+    def _inferer_poses_lot(self, morceaux, modele=None):
+        # morceaux : liste de (image, rectangle), éventuellement issus d'images différentes
+        modele = modele or self.pose_model
+        taille = self.cfg['POSE_IMGSZ']
+        taille_lot = max(1, int(self.cfg['POSE_BATCH_SIZE']))
+        sorties = []
+
+        for debut in range(0, len(morceaux), taille_lot):
+            self._signaler(f"Tête {min(debut + taille_lot, len(morceaux))}/{len(morceaux)} : pose", debut, len(morceaux))
+            images, transfos = [], []
+            for img, (X1, Y1, X2, Y2) in morceaux[debut:debut + taille_lot]:
+                lb, r, px, py = letterbox(img[Y1:Y2, X1:X2], taille)
+                images.append(lb)
+                transfos.append((r, px, py))
+
+            # Modèle partagé (registre) : appels sérialisés comme pour les têtes
+            with verrou_modele(modele):
+                resultats = modele(images, imgsz=taille, conf=self.cfg['POSE_MODEL_CONF'], verbose=False)
+
+            for res, (r, px, py) in zip(resultats, transfos):
+                if not hasattr(res.keypoints, "data") or res.keypoints.data is None:
+                    sorties.append(None)
+                    continue
+                data = res.keypoints.data.cpu().numpy().astype(np.float32)
+                # Annulation du letterbox : retour aux pixels du crop. Les points invisibles
+                # sont renvoyés en (0, 0) par le modèle : ils restent à l'origine du crop
+                vis = (data[..., 0] != 0) | (data[..., 1] != 0)
+                data[..., 0] = np.where(vis, (data[..., 0] - px) / r, 0)
+                data[..., 1] = np.where(vis, (data[..., 1] - py) / r, 0)
+                sorties.append(data)
+
+        return sorties
 
-            dedup_dist = max(20, int(self.cfg['BASE_DEDUP_DIST'] * (h / 100)))
-            angle_thresh_deg = min(90, max(50, self.cfg['BASE_ANGLE_THRESH_DEG'] * (h / 150)))
-            min_dist = max(5, h * self.cfg['MIN_WRIST_ELBOW_RATIO'])
+    def _planifier(self, shape, head_results):
+        # Crops Pose de chaque tête puis regroupement éventuel en passages
+        h_img, w_img = shape
+        head_ids, crops = [], []
+        for i in head_results.indices_classe(self.cfg['HEAD_CLASS_ID']):
+            i = int(i)
+            x1, y1, x2, y2 = head_results.xyxy[i].astype(int)
+            h = y2 - y1
             
             crop_size = int(h * self.cfg['HEAD_HEIGHT_MULTIPLIER'])
             cx, cy = (x1 + x2) // 2, (y1 + y2) // 2 - int(h * 1.2)
@@ -158,67 +360,254 @@ class HandDetector:
             X1, Y1 = clamp(cx - half, 0, w_img), clamp(cy - half, 0, h_img)
             X2, Y2 = clamp(cx + half, 0, w_img), clamp(cy + half, 0, h_img)
             if (X2-X1) < 10: continue
-            
-            pose_results = self.pose_model(img[Y1:Y2, X1:X2], imgsz=448, conf=self.cfg['POSE_MODEL_CONF'], verbose=False)[0]
-            if not hasattr(pose_results.keypoints, "data") or pose_results.keypoints.data is None: continue
-            
-            for k in pose_results.keypoints.data:
-                nose = get_keypoint_coords(k, KEYPOINT_IDX['NOSE'], X1, Y1)
-                nx, ny = nose[0], nose[1]
 
-                if not (x1 <= nx <= x2 and y1 <= ny <= y2):
-                    continue
+            head_ids.append(i)
+            crops.append((X1, Y1, X2, Y2))
+
+        # Fusion optionnelle des crops qui se chevauchent (rangées denses)
+        if self.cfg['POSE_MERGE_CROPS']:
+            passes = planifier_passes(crops, self.cfg['MERGE_MIN_OVERLAP'], self.cfg['MERGE_MAX_SIDE_RATIO'])
+        else:
+            passes = [(c, [j]) for j, c in enumerate(crops)]
+        return len(crops), [(tuple(int(v) for v in rect), [head_ids[j] for j in membres]) for rect, membres in passes]
+
+    def _calculer_poses(self, images, tetes, passages):
+        # Keypoints de chaque passage (indice image, rectangle, têtes membres).
+        # Retourne (poses, escalade) ; escalade = passages traités par le modèle lourd.
+        morceaux = [(images[k], rect) for k, rect, _ in passages]
+        if self.cascade_model is None:
+            return self._inferer_poses_lot(morceaux), [True] * len(passages)
+
+        # Cascade : modèle léger partout, modèle lourd sur les passages douteux
+        poses = self._inferer_poses_lot(morceaux, self.cascade_model)
+        escalade = [a_escalader(poses[p], rect, tetes[k].xyxy[membres].astype(int), self.cfg)
+                    for p, (k, rect, membres) in enumerate(passages)]
+        a_refaire = [p for p, e in enumerate(escalade) if e]
+        for p, kpts in zip(a_refaire, self._inferer_poses_lot([morceaux[p] for p in a_refaire])):
+            poses[p] = kpts
+        self.stats['escalades'] = len(a_refaire)
+        self.stats['taux_escalade'] = len(a_refaire) / max(1, len(passages))
+        return poses, escalade
+
+    def inferer(self, img):
+        # Partie "réseaux" de detect() : têtes + keypoints bruts de chaque passage Pose.
+        # Le résultat ne dépend que des CLES_INFERENCE de la config (plus CLES_CASCADE
+        # avec une cascade) et peut être mis en cache puis rejoué par post_traitement()
+        # avec d'autres seuils.
+        return self.inferer_lot([img])[0]
+
+    def inferer_lot(self, images, tetes=None):
+        # inferer() sur plusieurs images : un passage du modèle de têtes pour le lot,
+        # puis les crops de toutes les images partagent les mêmes lots Pose.
+        # tetes : détections de têtes déjà calculées (une par image), facultatif.
+        images = list(images)
+
+        # Passage du modèle de têtes partagé (cache) avec le Comptage
+        if tetes is None:
+            self._signaler("Détection des têtes")
+            tetes = detecter_tetes_lot(self.head_model, images, taille_lot=self.cfg['HEAD_TILE_BATCH'], **params_tuiles(
+                self.cfg['HEAD_TILE_SIZE'], self.cfg['HEAD_TILE_OVERLAP'],
+                self.cfg['HEAD_TILE_NMS_IOU'], self.cfg['HEAD_TILE_BATCH']))
+
+        plans = [self._planifier(img.shape[:2], t) for img, t in zip(images, tetes)]
+        nb_crops = sum(n for n, _ in plans)
+        # (indice image, rectangle, têtes membres) de tous les passages du lot
+        passages = [(k, rect, membres) for k, (_, passes) in enumerate(plans) for rect, membres in passes]
+
+        self.stats = {
+            'crops': nb_crops,
+            'passes_pose': len(passages),
+            'passes_economisees': nb_crops - len(passages)
+        }
+        if self.cfg['POSE_MERGE_CROPS']:
+            print(f"Pose : {nb_crops} crops -> {len(passages)} passes ({nb_crops - len(passages)} économisées)")
+
+        # Un seul passage du modèle Pose par lot de tuiles (au lieu d'un par tête)
+        debut = time.perf_counter()
+        poses, escalade = self._calculer_poses(images, tetes, passages)
+        self.stats['temps_pose_ms'] = 1000 * (time.perf_counter() - debut)
+
+        bruts = []
+        for k, img in enumerate(images):
+            idx = [p for p, passage in enumerate(passages) if passage[0] == k]
+            bruts.append({
+                'shape': img.shape[:2],
+                'tetes': tetes[k],
+                'passes': [(passages[p][1], passages[p][2]) for p in idx],
+                'keypoints': [poses[p] for p in idx],
+                # Passages traités par le modèle lourd (tous sans cascade)
+                'escalade': [escalade[p] for p in idx]
+            })
+        return bruts
+
+    def creer_cache(self, dossier):
+        # Cache disque des sorties de inferer(), invalidé si les poids ou CLES_INFERENCE changent
+        # (et CLES_CASCADE avec une cascade : les escalades en dépendent).
+        # Les graphes exportés ne donnent pas exactement les mêmes sorties : le backend fait partie de la clé
+        cles = CLES_INFERENCE + CLES_CASCADE if self.cascade_model_path else CLES_INFERENCE
+        config = {k: self.cfg[k] for k in cles}
+        backends = [resoudre_backend(self.head_model_path, self.backend),
+                    resoudre_backend(self.pose_model_path, self.pose_backend)]
+        if backends != ['pt', 'pt']:
+            config['BACKEND'] = backends
+        fichiers = [self.head_model_path, self.pose_model_path]
+        if self.cascade_model_path: fichiers.append(self.cascade_model_path)
+        return CacheInference(dossier, fichiers, config)
+
+    def post_traiter(self, brut):
+        return post_traitement(brut, self.cfg)
+
+    def detect(self, img):
+        # Retourne un ResultatsVote (colonnes NumPy, accès historique par dicts)
+        if img is None: return ResultatsVote.vide()
+        return self.post_traiter(self.inferer(img))
+
+    def detect_lot(self, images, tetes=None):
+        # detect() sur plusieurs images avec des lots têtes / Pose communs
+        return [self.post_traiter(brut) for brut in self.inferer_lot(images, tetes)]
+
+    def detect_suivi(self, img, suivi):
+        # detect() sur les images successives d'une vidéo ou d'un flux webcam.
+        # suivi : SuiviTetes propre au flux. Les têtes sont suivies d'une image à l'autre et
+        # la pose d'un passage n'est recalculée que si son crop a changé depuis le dernier
+        # calcul (écart moyen > POSE_REUSE_DIFF) ou après POSE_REUSE_MAX_AGE réutilisations.
+        # Chaque résultat reçoit en plus 'piste' (id de suivi) et 'vote_lisse' (vote majoritaire).
+        if img is None: return ResultatsVote.vide()
+        self._signaler("Détection des têtes")
+        tetes = detecter_tetes_lot(self.head_model, [img], taille_lot=self.cfg['HEAD_TILE_BATCH'], **params_tuiles(
+            self.cfg['HEAD_TILE_SIZE'], self.cfg['HEAD_TILE_OVERLAP'],
+            self.cfg['HEAD_TILE_NMS_IOU'], self.cfg['HEAD_TILE_BATCH']))[0]
+
+        idx = [int(i) for i in tetes.indices_classe(self.cfg['HEAD_CLASS_ID'])]
+        piste_de = dict(zip(idx, suivi.mettre_a_jour([tetes.xyxy[i].astype(int) for i in idx])))
+        nb_crops, passes = self._planifier(img.shape[:2], tetes)
+
+        keypoints, escalade = [None] * len(passes), [False] * len(passes)
+        a_calculer, signatures = [], []
+        for p, (rect, membres) in enumerate(passes):
+            cle = tuple(piste_de[j].id for j in membres)
+            sig = signature_crop(img, rect)
+            signatures.append((cle, sig))
+            ancien = suivi.memoire.get(cle)
+            if ancien is None or ancien['age'] >= self.cfg['POSE_REUSE_MAX_AGE'] or \
+                    np.abs(sig - ancien['sig']).mean() > self.cfg['POSE_REUSE_DIFF']:
+                a_calculer.append(p)
+                continue
+            # Crop inchangé : keypoints mémorisés, recalés sur le rectangle courant
+            kpts = ancien['kpts']
+            if kpts is not None and ancien['origine'] != rect[:2]:
+                kpts = kpts.copy()
+                kpts[..., 0] += ancien['origine'][0] - rect[0]
+                kpts[..., 1] += ancien['origine'][1] - rect[1]
+            keypoints[p] = kpts
+            ancien['age'] += 1
 
-                for side_name in ['LEFT', 'RIGHT']:
-                    w = get_keypoint_coords(k, KEYPOINT_IDX[f'{side_name}_WRIST'], X1, Y1)
-                    e = get_keypoint_coords(k, KEYPOINT_IDX[f'{side_name}_ELBOW'], X1, Y1)
-                    s = get_keypoint_coords(k, KEYPOINT_IDX[f'{side_name}_SHOULDER'], X1, Y1)
-
-                    is_valid, reason = self.check_hand_smart(w, e, s, angle_thresh_deg, min_dist)
-                    if is_valid:
-                        all_candidates.append({
-                            'x': w[0], 'y': w[1],
-                            'ex': e[0], 'ey': e[1],
-                            'sx': s[0], 'sy': s[1],
-                            'nx': nx,   'ny': ny,
-                            'conf': w[2], 
-                            'reason': reason, 
-                            'dedup_dist': dedup_dist,
-                            'head_h': h,
-                            'side': 'G' if side_name == 'LEFT' else 'D',
-                            'color': COLOR_LEFT if side_name == 'LEFT' else COLOR_RIGHT,
-                            'head_id': i
-                        })
-
-        all_candidates.sort(key=lambda x: x['conf'], reverse=True)
-        valid_hands_flat = []
-        for cand in all_candidates:
-            if not self._is_anatomical_duplicate_strict(cand, valid_hands_flat):
-                valid_hands_flat.append(cand)
+        # Seuls les groupes du plan courant sont gardés : quand la composition d'un
+        # passage change, l'ancienne clé serait sinon conservée indéfiniment
+        cles = {cle for cle, _ in signatures}
+        suivi.memoire = {cle: v for cle, v in suivi.memoire.items() if cle in cles}
+
+        self.stats = {'crops': nb_crops, 'passes_pose': len(a_calculer),
+                      'passes_reutilisees': len(passes) - len(a_calculer)}
+        debut = time.perf_counter()
+        if a_calculer:
+            poses, esc = self._calculer_poses([img], [tetes], [(0, *passes[p]) for p in a_calculer])
+            for p, kpts, e in zip(a_calculer, poses, esc):
+                keypoints[p], escalade[p] = kpts, e
+                cle, sig = signatures[p]
+                suivi.memoire[cle] = {'sig': sig, 'kpts': kpts, 'origine': passes[p][0][:2], 'age': 0}
+        self.stats['temps_pose_ms'] = 1000 * (time.perf_counter() - debut)
+
+        resultats = self.post_traiter({'shape': img.shape[:2], 'tetes': tetes, 'passes': passes,
+                                       'keypoints': keypoints, 'escalade': escalade})
+        for r in resultats:
+            piste = piste_de[r['head_id']]
+            piste.votes.append(r['vote'])
+            r['piste'] = piste.id
+            r['vote_lisse'] = piste.vote_lisse()
+        return resultats
+
+
+def post_traitement(brut, cfg):
+    # Partie "règles" de detect() : validation anatomique, déduplication et vote.
+    # Ne fait appel à aucun modèle : rejouable sur des résultats bruts en cache.
+    tetes = brut['tetes']
+    cfg = {**DEFAULT_CONFIG, **cfg}
+
+    heads_list = []
+    params = {}
+    for i in tetes.indices_classe(cfg['HEAD_CLASS_ID']):
+        i = int(i)
+        x1, y1, x2, y2 = tetes.xyxy[i].astype(int)
+        h = y2 - y1
+        heads_list.append({'id': i, 'box': (x1, y1, x2, y2), 'h': h})
+        params[i] = {'box': (x1, y1, x2, y2), 'h': h, **seuils_tete(h, cfg)}
+
+    all_candidates = []
+
+    for (rect, membres), kpts in zip(brut['passes'], brut['keypoints']):
+        if kpts is None or len(kpts) == 0: continue
+        X1, Y1 = rect[:2]
+        xy, conf = coordonnees_keypoints(kpts, X1, Y1)
+        nx, ny = xy[:, KEYPOINT_IDX['NOSE'], 0], xy[:, KEYPOINT_IDX['NOSE'], 1]
+
+        boites = np.array([params[j]['box'] for j in membres])
+        angles = np.array([params[j]['angle_thresh_deg'] for j in membres], dtype=float)
+        min_dists = np.array([params[j]['min_dist'] for j in membres], dtype=float)
+
+        # Association stricte : le squelette appartient à la tête dont la boîte contient le nez
+        nez_dans_tete = (boites[:, 0] <= nx[:, None]) & (nx[:, None] <= boites[:, 2]) & \
+                        (boites[:, 1] <= ny[:, None]) & (ny[:, None] <= boites[:, 3])
+
+        # Validation anatomique de tous les squelettes x têtes x côtés en une passe : (N, M, 2)
+        valide, raison = valider_mains(xy, conf, angles, min_dists, cfg)
+        valide &= nez_dans_tete[:, :, None]
+
+        for k, m, cote in np.argwhere(valide):
+            head_id = membres[m]
+            tete = params[head_id]
+            wi, ei, si = IDX_WRIST[cote], IDX_ELBOW[cote], IDX_SHOULDER[cote]
+            all_candidates.append({
+                'x': int(xy[k, wi, 0]), 'y': int(xy[k, wi, 1]),
+                'ex': int(xy[k, ei, 0]), 'ey': int(xy[k, ei, 1]),
+                'sx': int(xy[k, si, 0]), 'sy': int(xy[k, si, 1]),
+                'nx': int(nx[k]),   'ny': int(ny[k]),
+                'conf': float(conf[k, wi]), 
+                'reason': str(raison[k, m, cote]), 
+                'dedup_dist': tete['dedup_dist'],
+                'head_h': tete['h'],
+                'side': 'G' if cote == 0 else 'D',
+                'head_id': head_id
+            })
+
+    all_candidates.sort(key=lambda x: x['conf'], reverse=True)
+    # Déduplication via index spatial (même résultat que _is_anatomical_duplicate_strict)
+    valid_hands_flat = dedupliquer(all_candidates, cfg)
+
+    mains_par_tete = {}
+    for hand in valid_hands_flat:
+        mains_par_tete.setdefault(hand['head_id'], []).append(hand)
+    
+    tetes_finales, mains_finales = [], []
+    
+    for head in heads_list:
+        h_id = head['id']
+        my_hands = mains_par_tete.get(h_id, [])
         
-        final_results = []
+        has_left = any(h['side'] == 'G' for h in my_hands)
+        has_right = any(h['side'] == 'D' for h in my_hands)
         
-        for head in heads_list:
-            h_id = head['id']
-            my_hands = [h for h in valid_hands_flat if h['head_id'] == h_id]
-            
-            has_left = any(h['side'] == 'G' for h in my_hands)
-            has_right = any(h['side'] == 'D' for h in my_hands)
-            
+        vote_status = 'N' 
+        
+        if has_left and has_right:
             vote_status = 'N' 
-            
-            if has_left and has_right:
-                vote_status = 'N' 
-            elif has_left:
-                vote_status = 'G'
-            elif has_right:
-                vote_status = 'D'
-            
-            final_results.append({
-                'head_id': h_id,
-                'head_box': head['box'],
-                'vote': vote_status,
-                'hands': my_hands
-            })
+        elif has_left:
+            vote_status = 'G'
+        elif has_right:
+            vote_status = 'D'
+        
+        tetes_finales.append((h_id, head['box'], head['h'], params[h_id]['dedup_dist'], vote_status))
+        mains_finales.append(my_hands)
 
-        return final_results
\ No newline at end of file
+    # Stockage en colonnes : têtes et mains contiguës, vues « dict » pour l'ancien code
+    return ResultatsVote.depuis_listes(tetes_finales, mains_finales)
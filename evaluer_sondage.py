@@ -2,6 +2,10 @@ import os
 import cv2
 import numpy as np
 import sys
+import argparse
+from functools import partial
+from moteur_evaluation import executer, lister_images, nb_workers_par_defaut
+from appariement import matrice_distances, apparier_mains, compter_tp_fp_fn, balayer_rayons, ecrire_courbe_rayons, RATIOS_RAYON
 
 # Ajout du chemin pour trouver les modules si lancé depuis la racine
 sys.path.append(os.path.abspath("detection"))
@@ -29,15 +33,26 @@ RES_DIR = os.path.join(EVAL_ROOT, "resultats")
 os.makedirs(OUT_DIR, exist_ok=True)
 os.makedirs(RES_DIR, exist_ok=True)
 
+# Cache des sorties brutes des réseaux (partagé avec evaluer_vote)
+CACHE_DIR = os.path.join(EVAL_ROOT, "cache_inference", "pose")
+# EVAL_CACHE=0 pour forcer le recalcul complet
+UTILISER_CACHE = os.environ.get("EVAL_CACHE", "1") != "0"
+
 # Fichier de résultat final pour le sondage
 RESULT_FILE = os.path.join(RES_DIR, "resultats_sondage.txt")
 
 # Fichiers modèles
 HEAD_MODEL = "yolo_head_test.pt"
 POSE_MODEL = "yolov8x-pose-p6.pt"
+# Modèle Pose léger de la cascade (option --cascade)
+CASCADE_MODEL = "yolov8n-pose.pt"
 
 # --- PARAMÈTRES D'ÉVALUATION ---
 MATCHING_RADIUS_RATIO = 1.0
+# EVAL_APPARIEMENT=optimal : affectation optimale au lieu de la règle gloutonne historique
+REGLE = 'optimal' if os.environ.get("EVAL_APPARIEMENT") == 'optimal' else 'par_prediction'
+# Courbe précision / rappel en fonction du ratio de rayon (même passage)
+COURBE_FILE = os.path.join(RES_DIR, "courbe_rayon_sondage.csv")
 
 def charger_labels_gt(label_path, w_img, h_img):
     #Charge les classes 0 et 1 (MAINS) et retourne les pixels (x, y).
@@ -58,17 +73,59 @@ def charger_labels_gt(label_path, w_img, h_img):
                 
     return gt_hands
 
-def main():
+def tableaux_sondage(gt_hands, predictions):
+    pred_xy = [(p['x'], p['y']) for p in predictions]
+    head_h = np.array([p['head_h'] for p in predictions], dtype=float)
+    return matrice_distances(gt_hands, pred_xy), head_h
+
+def comparer_mains_sondage(gt_hands, predictions, ratio=MATCHING_RADIUS_RATIO, regle=REGLE):
+    # Chaque prédiction prend la GT libre la plus proche, acceptée si distance <= head_h * ratio.
+    # Retourne (TP, FP, FN) de l'image.
+    dist, head_h = tableaux_sondage(gt_hands, predictions)
+    return compter_tp_fp_fn(apparier_mains(dist, head_h * ratio, regle), len(predictions))
+
+def creer_detecteur(cascade=None):
+    return SondageDetector(head_model_path=HEAD_MODEL, pose_model_path=POSE_MODEL, cascade_model_path=cascade)
+
+# Un cache par détecteur ; sur disque, chaque signature (x seul / cascade) a son sous-dossier
+_caches = {}
+
+def predire(detector, img_name, img):
+    # Exécuté dans le processus de travail : seule l'inférence y est faite
+    h_img, w_img = img.shape[:2]
+
+    # --- A. DÉTECTION ---
+    # Sorties brutes des réseaux relues du cache si l'image, les poids et la config
+    # d'inférence n'ont pas changé ; seul le post-traitement est alors rejoué.
+    if UTILISER_CACHE:
+        if id(detector) not in _caches: _caches[id(detector)] = detector.creer_cache(CACHE_DIR)
+        brut = _caches[id(detector)].obtenir(img_name, img, detector.inferer)
+    else:
+        brut = detector.inferer(img)
+
+    heads_results = detector.etiqueter_sondage(detector.post_traiter(brut))
+    
+    # On doit "aplatir" la structure pour récupérer la liste de toutes les mains détectées
+    # pour la comparaison spatiale avec le Ground Truth.
+    predictions = []
+    for head in heads_results:
+        # Chaque 'head' contient une liste 'hands' avec les infos (x, y, conf, head_h...)
+        predictions.extend(head['hands'])
+
+    escalade = brut.get('escalade', [])
+    return h_img, w_img, predictions, (sum(escalade), len(escalade))
+
+def main(nb_workers=None, cascade=None):
     if not os.path.exists(HEAD_MODEL) or not os.path.exists(POSE_MODEL):
         print(f"ATTENTION : Modèles introuvables ({HEAD_MODEL} ou {POSE_MODEL})")
     
-    detector = SondageDetector(head_model_path=HEAD_MODEL, pose_model_path=POSE_MODEL)
-    
     if not os.path.exists(IMG_DIR):
         print(f"Erreur : Dossier images introuvable : {IMG_DIR}")
         return
 
-    image_files = [f for f in os.listdir(IMG_DIR) if f.lower().endswith(('.jpg', '.jpeg', '.png'))]
+    if nb_workers is None: nb_workers = nb_workers_par_defaut()
+
+    image_files = lister_images(IMG_DIR)
     
     total_TP = 0
     total_FP = 0
@@ -77,27 +134,25 @@ def main():
     print(f"Début de l'évaluation SONDAGE sur {len(image_files)} images...")
     print(f"Critère de succès : Distance < {MATCHING_RADIUS_RATIO} * Hauteur_Tête")
 
-    for img_name in image_files:
-        img_path = os.path.join(IMG_DIR, img_name)
-        lbl_path = os.path.join(LBL_DIR, os.path.splitext(img_name)[0] + ".txt")
-        
-        img = cv2.imread(img_path)
-        if img is None: continue
-        h_img, w_img = img.shape[:2]
+    nb_escalades, nb_passes = 0, 0
+    courbe = np.zeros((len(RATIOS_RAYON), 3), dtype=int)
+    result_file = RESULT_FILE.replace(".txt", "_cascade.txt") if cascade else RESULT_FILE
+    fabrique = partial(creer_detecteur, cascade) if cascade else creer_detecteur
+    # Exports séparés : la cascade n'écrase pas les prédictions du modèle x seul
+    out_dir = OUT_DIR + "_cascade" if cascade else OUT_DIR
+    os.makedirs(out_dir, exist_ok=True)
 
-        # --- A. DÉTECTION ---
-        heads_results = detector.detect_sondage(img)
+    for img_name, sortie in executer(IMG_DIR, image_files, fabrique, predire, nb_workers):
+        lbl_path = os.path.join(LBL_DIR, os.path.splitext(img_name)[0] + ".txt")
         
-        # On doit "aplatir" la structure pour récupérer la liste de toutes les mains détectées
-        # pour la comparaison spatiale avec le Ground Truth.
-        predictions = []
-        for head in heads_results:
-            # Chaque 'head' contient une liste 'hands' avec les infos (x, y, conf, head_h...)
-            predictions.extend(head['hands'])
+        if sortie is None: continue
+        h_img, w_img, predictions, (esc, passes) = sortie
+        nb_escalades += esc
+        nb_passes += passes
         
         # --- B. EXPORTATION (Format YOLO) ---
         txt_name = os.path.splitext(img_name)[0] + ".txt"
-        with open(os.path.join(OUT_DIR, txt_name), "w") as f:
+        with open(os.path.join(out_dir, txt_name), "w") as f:
             for p in predictions:
                 xn = p['x'] / w_img
                 yn = p['y'] / h_img
@@ -110,31 +165,9 @@ def main():
         # --- C. COMPARAISON ---
         gt_hands = charger_labels_gt(lbl_path, w_img, h_img)
         
-        img_TP = 0
-        matched_gt_indices = set()
-        
-        for pred in predictions:
-            px, py = pred['x'], pred['y']
-            # head_h est stocké dans chaque main par le détecteur vote.py
-            dynamic_threshold = pred['head_h'] * MATCHING_RADIUS_RATIO
-            
-            best_dist = float('inf')
-            best_gt_idx = -1
-            
-            for idx_gt, (gx, gy) in enumerate(gt_hands):
-                if idx_gt in matched_gt_indices: continue
-                
-                dist = np.hypot(px - gx, py - gy)
-                if dist < best_dist:
-                    best_dist = dist
-                    best_gt_idx = idx_gt
-            
-            if best_gt_idx != -1 and best_dist <= dynamic_threshold:
-                img_TP += 1
-                matched_gt_indices.add(best_gt_idx)
-        
-        img_FP = len(predictions) - img_TP
-        img_FN = len(gt_hands) - img_TP
+        img_TP, img_FP, img_FN = comparer_mains_sondage(gt_hands, predictions)
+        dist, head_h = tableaux_sondage(gt_hands, predictions)
+        courbe += balayer_rayons(dist, head_h, RATIOS_RAYON, REGLE)
         
         total_TP += img_TP
         total_FP += img_FP
@@ -155,15 +188,31 @@ def main():
         f"FN : {total_FN}\n"
         f"Precision : {prec:.4f}\n"
         f"Rappel    : {rec:.4f}\n"
-        f"F1-Score  : {f1:.4f}\n"
+        f"F1-Score  : {f1:.4f}\n\n"
+        f"--- RAYON DE TOLÉRANCE (x Hauteur_Tête, appariement {REGLE}) ---\n"
+        + "\n".join(ecrire_courbe_rayons(COURBE_FILE.replace(".csv", "_cascade.csv") if cascade else COURBE_FILE,
+                                          RATIOS_RAYON, courbe)) + "\n"
     )
+    taux_escalade = nb_escalades / max(1, nb_passes)
+    if cascade:
+        res_txt += f"Cascade ({cascade}) : {nb_escalades}/{nb_passes} passages escaladés ({taux_escalade:.1%})\n"
     
     print(res_txt)
     
-    with open(RESULT_FILE, "w") as f:
+    with open(result_file, "w") as f:
         f.write(res_txt)
 
-    print(f"Rapport sauvegardé dans {RESULT_FILE}")
+    print(f"Rapport sauvegardé dans {result_file}")
+    return {'precision': prec, 'rappel': rec, 'f1': f1, 'taux_escalade': taux_escalade}
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--cascade", nargs="?", const=CASCADE_MODEL, default=None,
+                        help="compare la cascade (modèle Pose léger puis x) au modèle x seul")
+    args = parser.parse_args()
+    if args.cascade:
+        from evaluer_vote import comparer_cascade
+        comparer_cascade(main(), main(cascade=args.cascade), args.cascade,
+                         os.path.join(RES_DIR, "comparaison_cascade_sondage.txt"))
+    else:
+        main()
\ No newline at end of file
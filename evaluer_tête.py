@@ -1,6 +1,14 @@
 import os
+import argparse
+from functools import partial
 import cv2
+import numpy as np
 from detection.comptage import CompteurAmphi
+from detection.tetes import CACHE_TETES, detecter_tetes, detecter_tetes_lot
+from detection.cache_inference import CacheInference
+from moteur_evaluation import executer_lots, lister_images, nb_workers_par_defaut
+from appariement import (BilanDetection, METHODES, matrice_iou, vrais_positifs_par_seuil, precision_moyenne,
+                          courbe_seuils, erreurs_comptage_par_seuil, SEUILS_IOU)
 
 # --- CONFIGURATION DES CHEMINS ---
 DATASET_PATH = "dataset"
@@ -21,6 +29,26 @@ os.makedirs(RES_DIR, exist_ok=True)
 # Fichier de résultat final
 RESULT_FILE = os.path.join(RES_DIR, "resultats_comptage.txt")
 
+# Cache des boîtes de têtes brutes (EVAL_CACHE=0 pour forcer le recalcul)
+CACHE_DIR = os.path.join(EVAL_ROOT, "cache_inference", "comptage")
+UTILISER_CACHE = os.environ.get("EVAL_CACHE", "1") != "0"
+HEAD_MODEL = 'yolo_head_test.pt'
+# Détection par tuiles (EVAL_TUILE=640 par ex., 0 = image entière)
+TAILLE_TUILE = int(os.environ.get("EVAL_TUILE", "0"))
+# Nombre d'images par passage du modèle de têtes
+TAILLE_LOT = int(os.environ.get("EVAL_LOT", "8"))
+# Appariement vérité / prédictions : 'glouton' (historique) ou 'optimal' (hongrois)
+METHODE = os.environ.get("EVAL_APPARIEMENT", "glouton")
+
+# --- CALIBRATION DU SEUIL (option --calibration) ---
+# Un seul passage du modèle à confiance minimale, puis tous les seuils sont évalués
+CONF_CALIBRATION = 0.01
+SEUILS_CALIBRATION = np.round(np.arange(0.05, 0.951, 0.01), 2)
+SEUIL_ACTUEL = 0.3   # seuil par défaut de CompteurAmphi.compter()
+CALIBRATION_CSV = os.path.join(RES_DIR, "calibration_comptage.csv")
+CALIBRATION_TXT = os.path.join(RES_DIR, "calibration_comptage.txt")
+CALIBRATION_PNG = os.path.join(RES_DIR, "calibration_comptage.png")
+
 
 # ----------------------------------------------------
 # Boîte englobante YOLO-format -> xyxy
@@ -32,169 +60,259 @@ def yolo_to_xyxy(xc, yc, w, h, img_w, img_h):
     y2 = (yc + h / 2) * img_h
     return x1, y1, x2, y2
 
-# ----------------------------------------------------
-# IoU (Intersection over Union)
-# ----------------------------------------------------
-def iou(boxA, boxB):
-    x1A, y1A, x2A, y2A = boxA
-    x1B, y1B, x2B, y2B = boxB
-
-    # 1) Inclusion totale
-    if (x1B >= x1A and y1B >= y1A and 
-        x2B <= x2A and y2B <= y2A):
-        return 1.0
-
-    # 2) Intersection classique
-    inter_x1 = max(x1A, x1B)
-    inter_y1 = max(y1A, y1B)
-    inter_x2 = min(x2A, x2B)
-    inter_y2 = min(y2A, y2B)
-
-    inter_w = max(0, inter_x2 - inter_x1)
-    inter_h = max(0, inter_y2 - inter_y1)
-    inter_area = inter_w * inter_h
-
-    if inter_area == 0: return 0.0
-
-    areaA = (x2A - x1A) * (y2A - y1A)
-    areaB = (x2B - x1B) * (y2B - y1B)
-    union = areaA + areaB - inter_area
-    
-    if union == 0: return 0.0
-
-    return inter_area / union
-
 # ----------------------------------------------------
 # Compare une image
 # ----------------------------------------------------
-def comparer_image(image_path, label_path, compteur):
+def creer_compteur(conf_min=None):
+    compteur = CompteurAmphi(model_path=HEAD_MODEL, taille_tuile=TAILLE_TUILE)
+    if conf_min is not None:
+        # Seuil de confiance du modèle lui-même (0.25 par défaut dans ultralytics)
+        compteur.params_tetes = {**compteur.params_tetes, 'conf': conf_min}
+    return compteur
+
+# Un cache par compteur ; la confiance minimale fait partie de la signature, donc du sous-dossier
+_caches = {}
+
+def _cache(compteur):
+    if id(compteur) not in _caches:
+        _caches[id(compteur)] = CacheInference(CACHE_DIR, [HEAD_MODEL], {'HEAD_CLASS_ID': compteur.CLASS_ID_HEAD,
+                                                                           **compteur.params_tetes})
+    return _caches[id(compteur)]
+
+def predire(compteur, img_name, img):
+    # Exécuté dans le processus de travail : seule l'inférence y est faite
+    h, w, _ = img.shape
+    if UTILISER_CACHE:
+        brut = _cache(compteur).obtenir(img_name, img, lambda im: {'shape': im.shape[:2],
+                                                         'tetes': detecter_tetes(compteur.model, im, **compteur.params_tetes)})
+        # La détection relue alimente le cache mémoire : compter() ne relance pas le modèle
+        CACHE_TETES.inserer(compteur.model, img, brut['tetes'], **compteur.params_tetes)
+    compteur.charger_image(img)
+    compteur.compter()
+    return h, w, compteur.predictions_yolo()
+
+def predire_lot(compteur, img_names, images):
+    # Version par lots de predire() : une seule passe du modèle pour les images absentes du cache
+    cache = _cache(compteur) if UTILISER_CACHE else None
+    bruts = [cache.lire(nom, img) for nom, img in zip(img_names, images)] if cache else [None] * len(images)
+    manquantes = [k for k, b in enumerate(bruts) if b is None]
+    if manquantes:
+        detections = detecter_tetes_lot(compteur.model, [images[k] for k in manquantes], cache=None,
+                                        taille_lot=TAILLE_LOT, **compteur.params_tetes)
+        for k, det in zip(manquantes, detections):
+            bruts[k] = {'shape': images[k].shape[:2], 'tetes': det}
+            if cache: cache.ecrire(img_names[k], images[k], bruts[k])
+
+    return [(img.shape[0], img.shape[1], CompteurAmphi.vers_yolo(b['tetes'], img.shape[:2], compteur.CLASS_ID_HEAD))
+            for img, b in zip(images, bruts)]
+
+def comparer_image(image_path, label_path, compteur, bilan=None):
     img = cv2.imread(image_path)
     if img is None:
         print(f"[ERROR] Impossible de charger l'image {image_path}.")
         return 0, 0, 0
-        
-    h, w, _ = img.shape
 
-    # --- 1. Charger les Labels (Ground Truth) ---
+    h, w, preds = predire(compteur, os.path.basename(image_path), img)
+    return comparer_predictions(image_path, label_path, h, w, preds, bilan)
+
+def lire_labels(label_path, w, h):
+    # Boîtes vérité terrain de la classe 2 (Têtes) en xyxy pixels
     gt_boxes = []
+    with open(label_path, "r") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) != 5: continue
+
+            cls, xc, yc, ww, hh = map(float, parts)
+            # FILTRE : On ne garde que la classe 2 (Têtes)
+            if int(cls) == 2:
+                gt_boxes.append(yolo_to_xyxy(xc, yc, ww, hh, w, h))
+    return gt_boxes
+
+def boites_predites(preds, w, h):
+    # (cls, xc, yc, w, h, conf) -> boîtes xyxy en pixels et confiances
+    return [yolo_to_xyxy(xc, yc, ww, hh, w, h) for _, xc, yc, ww, hh, _ in preds], [p[5] for p in preds]
+
+def comparer_predictions(image_path, label_path, h, w, preds, bilan=None):
+    # bilan : BilanDetection qui cumule les métriques du jeu de données (créé si absent)
+    bilan = bilan or BilanDetection(methode=METHODE)
+
+    # --- 1. Charger les Labels (Ground Truth) ---
     try:
-        with open(label_path, "r") as f:
-            for line in f:
-                parts = line.split()
-                if len(parts) != 5: continue
-                
-                cls, xc, yc, ww, hh = map(float, parts)
-                # FILTRE : On ne garde que la classe 2 (Têtes)
-                if int(cls) == 2: 
-                    gt_boxes.append(yolo_to_xyxy(xc, yc, ww, hh, w, h))
+        gt_boxes = lire_labels(label_path, w, h)
     except Exception as e:
         print(f"[ERROR] Lecture label {label_path}: {e}")
         return 0, 0, 0
 
-    # --- 2. Générer la prédiction ---
+    # --- 2. Exporter la prédiction (fichiers détaillés, non relus) ---
     base = os.path.splitext(os.path.basename(image_path))[0]
-    pred_file = os.path.join(OUT_DIR, base + ".txt")
-
-    compteur.charger_image(img)
-    compteur.compter()
-    
-    # Exportation dans le dossier predictions_comptage
-    compteur.exporter_predictions(pred_file) 
+    CompteurAmphi.ecrire_predictions(preds, os.path.join(OUT_DIR, base + ".txt"))
 
-    # --- 3. Relire la prédiction pour comparer ---
-    pred_boxes = []
-    if os.path.exists(pred_file):
-        try:
-            with open(pred_file, "r") as f:
-                for line in f:
-                    parts = line.split()
-                    if len(parts) != 5: continue
-                    cls, xc, yc, ww, hh = map(float, parts)
-                    pred_boxes.append(yolo_to_xyxy(xc, yc, ww, hh, w, h))
-        except Exception as e:
-            print(f"[ERROR] Lecture prédiction {pred_file}: {e}")
-
-    # --- 4. Calcul des métriques (TP, FP, FN) ---
-    TP = 0
-    used_pred = set()
-
-    for gt in gt_boxes:
-        best_iou = 0
-        best_idx = -1
-        
-        for i, pr in enumerate(pred_boxes):
-            if i in used_pred: continue
-            
-            score = iou(gt, pr)
-            if score > best_iou:
-                best_iou = score
-                best_idx = i
-
-        if best_iou >= 0.5:
-            TP += 1
-            used_pred.add(best_idx)
-
-    FP = len(pred_boxes) - len(used_pred)
-    FN = len(gt_boxes) - TP
-
-    return TP, FP, FN
+    # --- 3. Appariement en mémoire (matrice IoU) et métriques ---
+    pred_boxes, conf = boites_predites(preds, w, h)
+    return bilan.ajouter(gt_boxes, pred_boxes, conf)
     
 # ----------------------------------------------------
 # Programme global
 # ----------------------------------------------------
-def comparer_dataset():
-    compteur = CompteurAmphi(model_path='yolo_head_test.pt')
+def comparer_dataset(nb_workers=None, methode=METHODE):
+    if nb_workers is None: nb_workers = nb_workers_par_defaut()
+    if methode not in METHODES:
+        raise ValueError(f"EVAL_APPARIEMENT inconnu : {methode} ({', '.join(METHODES)})")
 
-    total_TP = 0
-    total_FP = 0
-    total_FN = 0
+    bilan = BilanDetection(methode=methode)
 
-    images = [f for f in os.listdir(IMG_DIR) if f.lower().endswith((".jpg", ".jpeg", ".png"))]
-    print(f"Début de l'analyse COMPTAGE sur {len(images)} images...")
+    images = lister_images(IMG_DIR)
+    print(f"Début de l'analyse COMPTAGE sur {len(images)} images (appariement {methode})...")
 
+    a_traiter = []
     for img_name in images:
         base = os.path.splitext(img_name)[0]
-        image_path = os.path.join(IMG_DIR, img_name)
         label_path = os.path.join(LBL_DIR, base + ".txt")
 
         if not os.path.exists(label_path):
             print(f"[WARN] Pas de label pour {img_name} -> ignoré")
             continue
+        a_traiter.append(img_name)
 
-        TP, FP, FN = comparer_image(image_path, label_path, compteur)
+    for img_name, sortie in executer_lots(IMG_DIR, a_traiter, creer_compteur, predire_lot, TAILLE_LOT, nb_workers):
+        base = os.path.splitext(img_name)[0]
+        image_path = os.path.join(IMG_DIR, img_name)
+        label_path = os.path.join(LBL_DIR, base + ".txt")
 
-        total_TP += TP
-        total_FP += FP
-        total_FN += FN
+        if sortie is None:
+            print(f"[ERROR] Impossible de charger l'image {image_path}.")
+            TP, FP, FN = 0, 0, 0
+        else:
+            h, w, preds = sortie
+            TP, FP, FN = comparer_predictions(image_path, label_path, h, w, preds, bilan)
 
         print(f"Comptage: {img_name:<20} | TP={TP:2} FP={FP:2} FN={FN:2}")
 
     # --- Calcul final ---
-    denom_prec = total_TP + total_FP
-    denom_rapp = total_TP + total_FN
-
-    precision = total_TP / denom_prec if denom_prec > 0 else 0
-    rappel = total_TP / denom_rapp if denom_rapp > 0 else 0
-    
-    f1 = 0
-    if (precision + rappel) > 0:
-        f1 = 2 * precision * rappel / (precision + rappel)
+    r = bilan.resume()
 
     # --- Sauvegarde ---
     with open(RESULT_FILE, "w") as f:
         f.write("=== Résultats COMPTAGE (Têtes/Classe 2) ===\n\n")
         f.write(f"Images traitées : {len(images)}\n")
-        f.write(f"TP (Vrais Positifs)  = {total_TP}\n")
-        f.write(f"FP (Faux Positifs)   = {total_FP}\n")
-        f.write(f"FN (Faux Négatifs)   = {total_FN}\n\n")
-        f.write(f"Precision = {precision:.4f}\n")
-        f.write(f"Rappel    = {rappel:.4f}\n")
-        f.write(f"F1-score  = {f1:.4f}\n")
+        f.write(f"Appariement     : {methode}\n")
+        f.write(f"TP (Vrais Positifs)  = {r['TP']}\n")
+        f.write(f"FP (Faux Positifs)   = {r['FP']}\n")
+        f.write(f"FN (Faux Négatifs)   = {r['FN']}\n\n")
+        f.write(f"Precision = {r['precision']:.4f}\n")
+        f.write(f"Rappel    = {r['rappel']:.4f}\n")
+        f.write(f"F1-score  = {r['f1']:.4f}\n\n")
+        f.write(f"AP@0.5       = {r.get('AP50', 0):.4f}\n")
+        f.write(f"AP@0.75      = {r.get('AP75', 0):.4f}\n")
+        f.write(f"mAP@0.5:0.95 = {r.get('mAP50_95', 0):.4f}\n\n")
+        f.write(f"Erreur de comptage moyenne = {r['erreur_comptage_moy']:.2f} têtes/image\n")
+        f.write(f"Biais de comptage          = {r['biais_comptage']:+.2f} têtes/image\n")
 
     print("\n" + "="*40)
     print(f"Terminé. Résultats sauvegardés dans : {RESULT_FILE}")
     print(f"Fichiers détaillés dans : {OUT_DIR}")
     print("="*40)
+    return r
+
+# ----------------------------------------------------
+# Calibration du seuil de confiance
+# ----------------------------------------------------
+def calibrer(nb_workers=None):
+    # Toutes les détections à partir de CONF_CALIBRATION sont appariées une seule fois ;
+    # chaque seuil candidat ne fait ensuite que filtrer par confiance.
+    if nb_workers is None: nb_workers = nb_workers_par_defaut()
+    a_traiter = [n for n in lister_images(IMG_DIR)
+                 if os.path.exists(os.path.join(LBL_DIR, os.path.splitext(n)[0] + ".txt"))]
+    print(f"Calibration du seuil sur {len(a_traiter)} images (un passage à conf >= {CONF_CALIBRATION})...")
+
+    tp, confs, confs_par_image, nb_gt_par_image = [], [], [], []
+    fabrique = partial(creer_compteur, CONF_CALIBRATION)
+    for img_name, sortie in executer_lots(IMG_DIR, a_traiter, fabrique, predire_lot, TAILLE_LOT, nb_workers):
+        if sortie is None: continue
+        h, w, preds = sortie
+        try:
+            gt_boxes = lire_labels(os.path.join(LBL_DIR, os.path.splitext(img_name)[0] + ".txt"), w, h)
+        except Exception as e:
+            print(f"[ERROR] Lecture label {img_name}: {e}")
+            continue
+        pred_boxes, conf = boites_predites(preds, w, h)
+        tp.append(vrais_positifs_par_seuil(matrice_iou(gt_boxes, pred_boxes), conf))
+        confs.append(np.asarray(conf, dtype=float))
+        confs_par_image.append(conf)
+        nb_gt_par_image.append(len(gt_boxes))
+
+    tp = np.concatenate(tp) if tp else np.zeros((0, len(SEUILS_IOU)), dtype=bool)
+    confs = np.concatenate(confs) if confs else np.zeros(0)
+    nb_gt = sum(nb_gt_par_image)
+
+    ap = precision_moyenne(tp, confs, nb_gt)
+    precision, rappel, f1 = courbe_seuils(tp[:, 0], confs, nb_gt, SEUILS_CALIBRATION)
+    erreurs = erreurs_comptage_par_seuil(confs_par_image, nb_gt_par_image, SEUILS_CALIBRATION)
+    erreur_moy = np.abs(erreurs).mean(axis=0) if len(erreurs) else np.zeros(len(SEUILS_CALIBRATION))
+    biais = erreurs.mean(axis=0) if len(erreurs) else np.zeros(len(SEUILS_CALIBRATION))
+
+    with open(CALIBRATION_CSV, "w", encoding="utf-8") as f:
+        f.write("seuil;precision;rappel;f1;erreur_comptage_moy;biais_comptage\n")
+        for k, seuil in enumerate(SEUILS_CALIBRATION):
+            f.write(f"{seuil:.2f};{precision[k]:.4f};{rappel[k]:.4f};{f1[k]:.4f};{erreur_moy[k]:.3f};{biais[k]:+.3f}\n")
+
+    k_f1, k_err = int(np.argmax(f1)), int(np.argmin(erreur_moy))
+    k_actuel = int(np.argmin(np.abs(SEUILS_CALIBRATION - SEUIL_ACTUEL)))
+    ligne = lambda nom, k: (f"{nom:<26} : seuil={SEUILS_CALIBRATION[k]:.2f} | P={precision[k]:.4f} R={rappel[k]:.4f} "
+                            f"F1={f1[k]:.4f} | erreur comptage={erreur_moy[k]:.2f} (biais {biais[k]:+.2f})\n")
+    res_txt = (
+        "=== CALIBRATION DU SEUIL DE COMPTAGE (Têtes/Classe 2) ===\n\n"
+        f"Images : {len(nb_gt_par_image)} | Têtes annotées : {nb_gt} | Détections (conf >= {CONF_CALIBRATION}) : {len(confs)}\n"
+        f"AP@0.5 = {ap[0]:.4f} | mAP@0.5:0.95 = {ap.mean():.4f}\n\n"
+        + ligne("Seuil actuel", k_actuel)
+        + ligne("Meilleur F1", k_f1)
+        + ligne("Meilleure erreur comptage", k_err)
+    )
+    print("\n" + res_txt)
+    with open(CALIBRATION_TXT, "w", encoding="utf-8") as f:
+        f.write(res_txt)
+
+    tracer_calibration(precision, rappel, erreur_moy, k_f1, k_err, ap[0])
+    print(f"Courbe complète : {CALIBRATION_CSV}")
+    return {'seuil_f1': float(SEUILS_CALIBRATION[k_f1]), 'seuil_comptage': float(SEUILS_CALIBRATION[k_err]),
+            'AP50': float(ap[0]), 'mAP50_95': float(ap.mean())}
+
+def tracer_calibration(precision, rappel, erreur_moy, k_f1, k_err, ap50):
+    try:
+        import matplotlib
+        matplotlib.use("Agg")
+        import matplotlib.pyplot as plt
+    except ImportError:
+        print("matplotlib absent : pas de graphique (le CSV reste disponible)")
+        return
+
+    fig, (ax_pr, ax_err) = plt.subplots(1, 2, figsize=(12, 5))
+    ax_pr.plot(rappel, precision)
+    ax_pr.scatter([rappel[k_f1]], [precision[k_f1]], color="red", zorder=3,
+                  label=f"meilleur F1 (seuil {SEUILS_CALIBRATION[k_f1]:.2f})")
+    ax_pr.set(xlabel="Rappel", ylabel="Précision", title=f"Précision / rappel (AP@0.5 = {ap50:.3f})",
+              xlim=(0, 1.01), ylim=(0, 1.01))
+    ax_pr.legend()
+
+    ax_err.plot(SEUILS_CALIBRATION, erreur_moy)
+    ax_err.axvline(SEUILS_CALIBRATION[k_err], color="red", linestyle="--",
+                   label=f"minimum (seuil {SEUILS_CALIBRATION[k_err]:.2f})")
+    ax_err.axvline(SEUIL_ACTUEL, color="gray", linestyle=":", label=f"seuil actuel ({SEUIL_ACTUEL})")
+    ax_err.set(xlabel="Seuil de confiance", ylabel="Erreur moyenne (têtes / image)", title="Erreur de comptage")
+    ax_err.legend()
+
+    fig.tight_layout()
+    fig.savefig(CALIBRATION_PNG, dpi=120)
+    plt.close(fig)
+    print(f"Graphique : {CALIBRATION_PNG}")
 
 if __name__ == "__main__":
-    comparer_dataset()
\ No newline at end of file
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--calibration", action="store_true",
+                        help="courbe précision / rappel et seuil optimal à partir d'un seul passage du modèle")
+    args = parser.parse_args()
+    if args.calibration:
+        calibrer()
+    else:
+        comparer_dataset()
@@ -2,6 +2,10 @@ import os
 import cv2
 import numpy as np
 import sys
+import argparse
+from functools import partial
+from moteur_evaluation import executer, lister_images, nb_workers_par_defaut
+from appariement import matrice_distances, apparier_mains, compter_tp_fp_fn, balayer_rayons, ecrire_courbe_rayons, RATIOS_RAYON
 
 # Ajout du chemin pour trouver les modules si lancé depuis la racine
 sys.path.append(os.path.abspath("detection"))
@@ -28,16 +32,27 @@ RES_DIR = os.path.join(EVAL_ROOT, "resultats")
 os.makedirs(OUT_DIR, exist_ok=True)
 os.makedirs(RES_DIR, exist_ok=True)
 
+# Cache des sorties brutes des réseaux (partagé avec evaluer_sondage)
+CACHE_DIR = os.path.join(EVAL_ROOT, "cache_inference", "pose")
+# EVAL_CACHE=0 pour forcer le recalcul complet
+UTILISER_CACHE = os.environ.get("EVAL_CACHE", "1") != "0"
+
 # Fichier de résultat final
 RESULT_FILE = os.path.join(RES_DIR, "resultats_vote.txt")
 
 # Fichiers modèles
 HEAD_MODEL = "yolo_head_test.pt"
 POSE_MODEL = "yolov8x-pose-p6.pt"
+# Modèle Pose léger de la cascade (option --cascade)
+CASCADE_MODEL = "yolov8n-pose.pt"
 
 # --- PARAMÈTRES D'ÉVALUATION ---
 # Rayon de tolérance pour valider une détection (proportionnel à la taille de la tête)
 MATCHING_RADIUS_RATIO = 1.0
+# EVAL_APPARIEMENT=optimal : affectation optimale au lieu de la règle gloutonne historique
+REGLE = 'optimal' if os.environ.get("EVAL_APPARIEMENT") == 'optimal' else 'par_verite'
+# Courbe précision / rappel en fonction du ratio de rayon (même passage)
+COURBE_FILE = os.path.join(RES_DIR, "courbe_rayon_vote.csv")
 
 def charger_labels_vote(label_path, w_img, h_img):
     """
@@ -65,15 +80,85 @@ def charger_labels_vote(label_path, w_img, h_img):
                 
     return gt_hands
 
-def main():
+def tableaux_vote(gt_hands, predictions):
+    # Positions et classes (0 = Gauche, 1 = Droite) en tableaux pour l'appariement
+    gt_xy = [(gt['x'], gt['y']) for gt in gt_hands]
+    pred_xy = [(p['x'], p['y']) for p in predictions]
+    gt_cls = np.array([gt['cls'] for gt in gt_hands], dtype=int)
+    pred_cls = np.array([0 if p['side'] == 'G' else 1 for p in predictions], dtype=int)
+    head_h = np.array([p['head_h'] for p in predictions], dtype=float)
+    return matrice_distances(gt_xy, pred_xy), gt_cls[:, None] == pred_cls[None, :], head_h, pred_cls
+
+def comparer_mains_vote(gt_hands, predictions, stats_gauche, stats_droite, ratio=MATCHING_RADIUS_RATIO, regle=REGLE):
+    # Appariement GT -> prédiction (distance < head_h * ratio ET même côté).
+    # Met à jour stats_gauche / stats_droite, retourne (TP, FP, FN) de l'image.
+    dist, compatibles, head_h, pred_cls = tableaux_vote(gt_hands, predictions)
+    associe = apparier_mains(dist, head_h * ratio, regle, compatibles)
+
+    for gt, idx_p in zip(gt_hands, associe):
+        stats = stats_gauche if gt['cls'] == 0 else stats_droite
+        if idx_p >= 0:
+            # MATCH VALIDE
+            gt['matched'] = True
+            stats['TP'] += 1
+        else:
+            # PAS DE MATCH (FN)
+            stats['FN'] += 1
+
+    # Attribution des FP aux classes (basé sur la prédiction)
+    non_appariees = np.ones(len(predictions), dtype=bool)
+    non_appariees[associe[associe >= 0]] = False
+    stats_gauche['FP'] += int((non_appariees & (pred_cls == 0)).sum())
+    stats_droite['FP'] += int((non_appariees & (pred_cls == 1)).sum())
+
+    return compter_tp_fp_fn(associe, len(predictions))
+
+def calculer_metriques(tp, fp, fn):
+    prec = tp / (tp + fp + 1e-9)
+    rec = tp / (tp + fn + 1e-9)
+    f1 = 2 * prec * rec / (prec + rec + 1e-9)
+    return prec, rec, f1
+
+def creer_detecteur(cascade=None):
+    return HandDetector(head_model_path=HEAD_MODEL, pose_model_path=POSE_MODEL, cascade_model_path=cascade)
+
+# Un cache par détecteur ; sur disque, chaque signature (x seul / cascade) a son sous-dossier
+_caches = {}
+
+def predire(detector, img_name, img):
+    # Exécuté dans le processus de travail : seule l'inférence y est faite
+    h_img, w_img = img.shape[:2]
+
+    # --- A. DÉTECTION ---
+    # Sorties brutes des réseaux relues du cache si l'image, les poids et la config
+    # d'inférence n'ont pas changé ; seul le post-traitement est alors rejoué.
+    if UTILISER_CACHE:
+        if id(detector) not in _caches: _caches[id(detector)] = detector.creer_cache(CACHE_DIR)
+        brut = _caches[id(detector)].obtenir(img_name, img, detector.inferer)
+    else:
+        brut = detector.inferer(img)
+
+    # detector.post_traiter retourne une liste de TÊTES.
+    heads_results = detector.post_traiter(brut)
+    
+    # APLATISSEMENT : On extrait toutes les mains de toutes les têtes
+    predictions = []
+    for head in heads_results:
+        # head['hands'] contient la liste des dictionnaires mains
+        predictions.extend(head['hands'])
+
+    escalade = brut.get('escalade', [])
+    return h_img, w_img, predictions, (sum(escalade), len(escalade))
+
+def main(nb_workers=None, cascade=None):
     # Instanciation du détecteur de VOTE
     print("Chargement des modèles pour le Vote...")
     if not os.path.exists(HEAD_MODEL) or not os.path.exists(POSE_MODEL):
         print(f"ATTENTION : Modèles introuvables ({HEAD_MODEL} ou {POSE_MODEL})")
 
-    detector = HandDetector(head_model_path=HEAD_MODEL, pose_model_path=POSE_MODEL)
+    if nb_workers is None: nb_workers = nb_workers_par_defaut()
     
-    image_files = [f for f in os.listdir(IMG_DIR) if f.lower().endswith(('.jpg', '.jpeg', '.png'))]
+    image_files = lister_images(IMG_DIR)
     
     # Compteurs globaux
     global_TP = 0
@@ -86,27 +171,25 @@ def main():
 
     print(f"Début de l'évaluation VOTE sur {len(image_files)} images...")
     
-    for img_name in image_files:
-        img_path = os.path.join(IMG_DIR, img_name)
-        lbl_path = os.path.join(LBL_DIR, os.path.splitext(img_name)[0] + ".txt")
-        
-        img = cv2.imread(img_path)
-        if img is None: continue
-        h_img, w_img = img.shape[:2]
+    nb_escalades, nb_passes = 0, 0
+    courbe = np.zeros((len(RATIOS_RAYON), 3), dtype=int)
+    result_file = RESULT_FILE.replace(".txt", "_cascade.txt") if cascade else RESULT_FILE
+    fabrique = partial(creer_detecteur, cascade) if cascade else creer_detecteur
+    # Exports séparés : la cascade n'écrase pas les prédictions du modèle x seul
+    out_dir = OUT_DIR + "_cascade" if cascade else OUT_DIR
+    os.makedirs(out_dir, exist_ok=True)
 
-        # --- A. DÉTECTION ---
-        # detector.detect retourne une liste de TÊTES.
-        heads_results = detector.detect(img)
+    for img_name, sortie in executer(IMG_DIR, image_files, fabrique, predire, nb_workers):
+        lbl_path = os.path.join(LBL_DIR, os.path.splitext(img_name)[0] + ".txt")
         
-        # APLATISSEMENT : On extrait toutes les mains de toutes les têtes
-        predictions = []
-        for head in heads_results:
-            # head['hands'] contient la liste des dictionnaires mains
-            predictions.extend(head['hands'])
+        if sortie is None: continue
+        h_img, w_img, predictions, (esc, passes) = sortie
+        nb_escalades += esc
+        nb_passes += passes
         
         # --- B. EXPORTATION (Format YOLO) ---
         txt_name = os.path.splitext(img_name)[0] + ".txt"
-        with open(os.path.join(OUT_DIR, txt_name), "w") as f:
+        with open(os.path.join(out_dir, txt_name), "w") as f:
             for p in predictions:
                 xn = p['x'] / w_img
                 yn = p['y'] / h_img
@@ -124,67 +207,20 @@ def main():
         # --- C. COMPARAISON ---
         gt_hands = charger_labels_vote(lbl_path, w_img, h_img)
         
-        img_TP = 0
-        matched_pred_indices = set()
-        
-        for gt in gt_hands:
-            best_dist = float('inf')
-            best_pred_idx = -1
-            
-            for idx_p, pred in enumerate(predictions):
-                if idx_p in matched_pred_indices: continue
-                
-                dist = np.hypot(gt['x'] - pred['x'], gt['y'] - pred['y'])
-                # Seuil dynamique basé sur la taille de la tête associée à la main prédite
-                threshold = pred['head_h'] * MATCHING_RADIUS_RATIO
-                
-                if dist < threshold and dist < best_dist:
-                    # Vérification de la CLASSE (Gauche vs Droite)
-                    pred_cls = 0 if pred['side'] == 'G' else 1
-                    
-                    if pred_cls == gt['cls']:
-                        best_dist = dist
-                        best_pred_idx = idx_p
-            
-            if best_pred_idx != -1:
-                # MATCH VALIDE
-                gt['matched'] = True
-                matched_pred_indices.add(best_pred_idx)
-                img_TP += 1
-                
-                if gt['cls'] == 0: stats_gauche['TP'] += 1
-                else: stats_droite['TP'] += 1
-            else:
-                # PAS DE MATCH (FN)
-                if gt['cls'] == 0: stats_gauche['FN'] += 1
-                else: stats_droite['FN'] += 1
-
-        img_FP = len(predictions) - len(matched_pred_indices)
-        img_FN = len(gt_hands) - img_TP
+        img_TP, img_FP, img_FN = comparer_mains_vote(gt_hands, predictions, stats_gauche, stats_droite)
+        dist, compatibles, head_h, _ = tableaux_vote(gt_hands, predictions)
+        courbe += balayer_rayons(dist, head_h, RATIOS_RAYON, REGLE, compatibles)
         
         global_TP += img_TP
         global_FP += img_FP
         global_FN += img_FN
-        
-        # Attribution des FP aux classes (basé sur la prédiction)
-        for idx_p, pred in enumerate(predictions):
-            if idx_p not in matched_pred_indices:
-                pred_cls = 0 if pred['side'] == 'G' else 1
-                if pred_cls == 0: stats_gauche['FP'] += 1
-                else: stats_droite['FP'] += 1
 
         print(f"{img_name:<20} | TP={img_TP} FP={img_FP} FN={img_FN} | Preds:{len(predictions)} GT:{len(gt_hands)}")
 
     # --- D. CALCUL DES MÉTRIQUES ---
-    def calc_metrics(tp, fp, fn):
-        prec = tp / (tp + fp + 1e-9)
-        rec = tp / (tp + fn + 1e-9)
-        f1 = 2 * prec * rec / (prec + rec + 1e-9)
-        return prec, rec, f1
-
-    g_prec, g_rec, g_f1 = calc_metrics(global_TP, global_FP, global_FN)
-    l_prec, l_rec, l_f1 = calc_metrics(stats_gauche['TP'], stats_gauche['FP'], stats_gauche['FN'])
-    r_prec, r_rec, r_f1 = calc_metrics(stats_droite['TP'], stats_droite['FP'], stats_droite['FN'])
+    g_prec, g_rec, g_f1 = calculer_metriques(global_TP, global_FP, global_FN)
+    l_prec, l_rec, l_f1 = calculer_metriques(stats_gauche['TP'], stats_gauche['FP'], stats_gauche['FN'])
+    r_prec, r_rec, r_f1 = calculer_metriques(stats_droite['TP'], stats_droite['FP'], stats_droite['FN'])
 
     res_txt = (
         "=== RÉSULTATS DÉTECTION VOTE (Gauche/Droite) ===\n\n"
@@ -201,16 +237,48 @@ def main():
         f"F1-Score  : {l_f1:.4f}\n\n"
         "--- DÉTAIL DROITE (Classe 1/Rouge) ---\n"
         f"TP: {stats_droite['TP']} | FP: {stats_droite['FP']} | FN: {stats_droite['FN']}\n"
-        f"F1-Score  : {r_f1:.4f}\n"
+        f"F1-Score  : {r_f1:.4f}\n\n"
+        f"--- RAYON DE TOLÉRANCE (x Hauteur_Tête, appariement {REGLE}) ---\n"
+        + "\n".join(ecrire_courbe_rayons(COURBE_FILE.replace(".csv", "_cascade.csv") if cascade else COURBE_FILE,
+                                          RATIOS_RAYON, courbe)) + "\n"
     )
+    taux_escalade = nb_escalades / max(1, nb_passes)
+    if cascade:
+        res_txt += (
+            f"\n--- CASCADE ({cascade} -> {POSE_MODEL}) ---\n"
+            f"Passages escaladés : {nb_escalades}/{nb_passes} ({taux_escalade:.1%})\n"
+        )
     
     print("\n" + res_txt)
     
-    with open(RESULT_FILE, "w") as f:
+    with open(result_file, "w") as f:
         f.write(res_txt)
 
-    print(f"Rapport sauvegardé dans {RESULT_FILE}")
-    print(f"Prédictions détaillées dans {OUT_DIR}")
+    print(f"Rapport sauvegardé dans {result_file}")
+    print(f"Prédictions détaillées dans {out_dir}")
+    return {'precision': g_prec, 'rappel': g_rec, 'f1': g_f1, 'taux_escalade': taux_escalade}
+
+def comparer_cascade(x_seul, cascade, modele_leger, fichier):
+    if not x_seul or not cascade: return
+    res_txt = (
+        f"=== CASCADE {modele_leger} -> {POSE_MODEL} vs {POSE_MODEL} seul ===\n\n"
+        f"{'':<12} | {'Precision':>9} | {'Rappel':>7} | {'F1':>7}\n"
+        f"{'x seul':<12} | {x_seul['precision']:9.4f} | {x_seul['rappel']:7.4f} | {x_seul['f1']:7.4f}\n"
+        f"{'cascade':<12} | {cascade['precision']:9.4f} | {cascade['rappel']:7.4f} | {cascade['f1']:7.4f}\n\n"
+        f"Écart F1 : {cascade['f1'] - x_seul['f1']:+.4f}\n"
+        f"Taux d'escalade : {cascade['taux_escalade']:.1%}\n"
+    )
+    print("\n" + res_txt)
+    with open(fichier, "w") as f:
+        f.write(res_txt)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--cascade", nargs="?", const=CASCADE_MODEL, default=None,
+                        help="compare la cascade (modèle Pose léger puis x) au modèle x seul")
+    args = parser.parse_args()
+    if args.cascade:
+        comparer_cascade(main(), main(cascade=args.cascade), args.cascade,
+                         os.path.join(RES_DIR, "comparaison_cascade_vote.txt"))
+    else:
+        main()
\ No newline at end of file
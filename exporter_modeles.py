@@ -0,0 +1,213 @@
+import os
+import json
+import time
+import argparse
+import cv2
+import numpy as np
+from ultralytics import YOLO
+
+from detection.modeles import charger_modele, fichier_meta, vider_registre
+from detection.vote import DEFAULT_CONFIG, letterbox
+from moteur_evaluation import lister_images
+
+# =============================================================================
+# EXPORT ONNX / OPENVINO DES MODÈLES + CONTRÔLE DE PARITÉ
+# =============================================================================
+# 1. Chaque modèle .pt est exporté avec une forme d'entrée fixe (imgsz, batch).
+#    La forme est notée dans un fichier <modele>_<format>.json lu par
+#    detection/modeles.py (backend='onnx' / 'openvino' / 'auto').
+# 2. Les sorties du graphe exporté sont comparées à celles de PyTorch sur
+#    quelques images du dataset : boîtes appariées, écart de confiance,
+#    écart des keypoints, et temps moyen par appel.
+# 3. --int8 : variante quantifiée du modèle Pose seul, calibrée sur des crops
+#    de têtes extraits de dataset/images.
+
+HEAD_MODEL = "yolo_head_test.pt"
+POSE_MODEL = "yolov8x-pose-p6.pt"
+IMG_DIR = os.path.join("dataset", "images")
+CALIB_DIR = os.path.join("evaluation", "calibration_pose")
+
+# Seuils de parité : au-delà, l'export est signalé comme divergent
+PARITE_IOU = 0.5
+PARITE_TAUX_MIN = 0.95
+
+
+def exporter(chemin, fmt, imgsz, batch, half=False):
+    modele = YOLO(chemin)
+    sortie = modele.export(format=fmt, imgsz=imgsz, batch=batch, dynamic=False, half=half)
+    with open(fichier_meta(chemin, fmt), "w", encoding="utf-8") as f:
+        json.dump({'task': modele.task, 'imgsz': imgsz, 'batch': batch, 'source': os.path.basename(chemin)}, f, indent=2)
+    print(f"{chemin} -> {sortie} (imgsz={imgsz}, batch={batch})")
+    return sortie
+
+
+def preparer_calibration(nb_crops, imgsz):
+    # Crops de têtes letterboxés, tels que les voit le modèle Pose dans HandDetector,
+    # écrits dans un mini-dataset YOLO utilisé pour calibrer la quantification INT8.
+    from detection.vote import HandDetector
+    from detection.tetes import detecter_tetes, params_tuiles
+
+    dossier = os.path.abspath(CALIB_DIR)
+    os.makedirs(os.path.join(dossier, "images"), exist_ok=True)
+    detecteur = HandDetector(head_model_path=HEAD_MODEL, pose_model_path=POSE_MODEL, backend='pt')
+    cfg = detecteur.cfg
+    params = params_tuiles(cfg['HEAD_TILE_SIZE'], cfg['HEAD_TILE_OVERLAP'], cfg['HEAD_TILE_NMS_IOU'], cfg['HEAD_TILE_BATCH'])
+
+    n = 0
+    for nom in lister_images(IMG_DIR):
+        img = cv2.imread(os.path.join(IMG_DIR, nom))
+        if img is None: continue
+        # Seul le modèle de têtes tourne : les rectangles sont ceux que planifie inferer()
+        _, passes = detecteur._planifier(img.shape[:2], detecter_tetes(detecteur.head_model, img, **params))
+        for k, ((X1, Y1, X2, Y2), _) in enumerate(passes):
+            crop = letterbox(img[Y1:Y2, X1:X2], imgsz)[0]
+            cv2.imwrite(os.path.join(dossier, "images", f"{os.path.splitext(nom)[0]}_{k}.jpg"), crop)
+            n += 1
+            if n >= nb_crops: break
+        if n >= nb_crops: break
+
+    yaml_path = os.path.join(dossier, "calibration.yaml")
+    with open(yaml_path, "w", encoding="utf-8") as f:
+        f.write(f"path: {dossier}\ntrain: images\nval: images\n"
+                "kpt_shape: [17, 3]\n"
+                "flip_idx: [0, 2, 1, 4, 3, 6, 5, 8, 7, 10, 9, 12, 11, 14, 13, 16, 15]\n"
+                "names:\n  0: person\n")
+    print(f"Calibration INT8 : {n} crops de têtes dans {dossier}")
+    return yaml_path
+
+
+def exporter_int8(chemin, imgsz, batch, nb_crops):
+    # Quantification post-entraînement (OpenVINO / NNCF) calibrée sur nos crops
+    data = preparer_calibration(nb_crops, imgsz)
+    modele = YOLO(chemin)
+    sortie = modele.export(format="openvino", int8=True, data=data, imgsz=imgsz, batch=batch, dynamic=False)
+    with open(fichier_meta(chemin, 'int8'), "w", encoding="utf-8") as f:
+        json.dump({'task': modele.task, 'imgsz': imgsz, 'batch': batch, 'source': os.path.basename(chemin)}, f, indent=2)
+    print(f"{chemin} -> {sortie} (INT8, imgsz={imgsz}, batch={batch})")
+    return sortie
+
+
+def _iou_matrice(a, b):
+    ix1 = np.maximum(a[:, None, 0], b[None, :, 0])
+    iy1 = np.maximum(a[:, None, 1], b[None, :, 1])
+    ix2 = np.minimum(a[:, None, 2], b[None, :, 2])
+    iy2 = np.minimum(a[:, None, 3], b[None, :, 3])
+    inter = np.clip(ix2 - ix1, 0, None) * np.clip(iy2 - iy1, 0, None)
+    aa = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    ab = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    return inter / (aa[:, None] + ab[None, :] - inter + 1e-9)
+
+
+def comparer_sorties(ref, test):
+    # Appariement glouton des boîtes PyTorch -> export, retourne les écarts cumulés
+    bref = ref.boxes.xyxy.cpu().numpy()
+    btest = test.boxes.xyxy.cpu().numpy()
+    stats = {'ref': len(bref), 'test': len(btest), 'apparies': 0, 'ecart_conf': [], 'ecart_kpts': []}
+    if len(bref) == 0 or len(btest) == 0:
+        return stats
+
+    ious = _iou_matrice(bref, btest)
+    cref, ctest = ref.boxes.conf.cpu().numpy(), test.boxes.conf.cpu().numpy()
+    kref = ref.keypoints.data.cpu().numpy() if getattr(ref, 'keypoints', None) is not None else None
+    ktest = test.keypoints.data.cpu().numpy() if getattr(test, 'keypoints', None) is not None else None
+    libres = set(range(len(btest)))
+    for i in np.argsort(-cref):
+        candidats = [j for j in libres if ious[i, j] >= PARITE_IOU]
+        if not candidats: continue
+        j = max(candidats, key=lambda j: ious[i, j])
+        libres.discard(j)
+        stats['apparies'] += 1
+        stats['ecart_conf'].append(abs(float(cref[i]) - float(ctest[j])))
+        if kref is not None and ktest is not None:
+            stats['ecart_kpts'].append(float(np.abs(kref[i, :, :2] - ktest[j, :, :2]).mean()))
+    return stats
+
+
+def verifier_parite(chemin, fmt, images, imgsz, conf):
+    vider_registre()
+    ref = charger_modele(chemin, backend='pt')
+    test = charger_modele(chemin, backend=fmt)
+
+    total = {'ref': 0, 'test': 0, 'apparies': 0, 'ecart_conf': [], 'ecart_kpts': []}
+    temps = {'pt': 0.0, fmt: 0.0}
+    for img in images:
+        t0 = time.perf_counter()
+        r = ref(img, imgsz=imgsz, conf=conf, verbose=False)[0]
+        t1 = time.perf_counter()
+        t = test(img, imgsz=imgsz, conf=conf, verbose=False)[0]
+        t2 = time.perf_counter()
+        temps['pt'] += t1 - t0
+        temps[fmt] += t2 - t1
+        s = comparer_sorties(r, t)
+        for k in ('ref', 'test', 'apparies'): total[k] += s[k]
+        total['ecart_conf'] += s['ecart_conf']
+        total['ecart_kpts'] += s['ecart_kpts']
+
+    taux = total['apparies'] / max(1, total['ref'])
+    n = max(1, len(images))
+    print(f"\n--- Parité {os.path.basename(chemin)} : pt vs {fmt} ({len(images)} images) ---")
+    print(f"Boîtes PyTorch : {total['ref']} | Boîtes {fmt} : {total['test']} | Appariées : {total['apparies']} ({taux:.1%})")
+    if total['ecart_conf']:
+        print(f"Écart de confiance : moyen {np.mean(total['ecart_conf']):.4f} | max {np.max(total['ecart_conf']):.4f}")
+    if total['ecart_kpts']:
+        print(f"Écart keypoints (px) : moyen {np.mean(total['ecart_kpts']):.2f} | max {np.max(total['ecart_kpts']):.2f}")
+    print(f"Temps moyen : pt {1000 * temps['pt'] / n:.1f} ms | {fmt} {1000 * temps[fmt] / n:.1f} ms")
+    ok = taux >= PARITE_TAUX_MIN
+    print("PARITÉ OK" if ok else "ATTENTION : sorties divergentes")
+    return ok
+
+
+def images_parite(nb, imgsz_pose):
+    noms = lister_images(IMG_DIR)[:nb]
+    images = [cv2.imread(os.path.join(IMG_DIR, n)) for n in noms]
+    images = [im for im in images if im is not None]
+    # Le modèle Pose voit des crops letterboxés : on reproduit ce cas sur un quart central
+    crops = []
+    for im in images:
+        h, w = im.shape[:2]
+        crops.append(letterbox(im[h // 4:3 * h // 4, w // 4:3 * w // 4], imgsz_pose)[0])
+    return images, crops
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export ONNX / OpenVINO des modèles têtes et pose.")
+    parser.add_argument("--format", choices=["onnx", "openvino"], default="openvino")
+    parser.add_argument("--imgsz-tete", type=int, default=640)
+    parser.add_argument("--batch-tete", type=int, default=1)
+    parser.add_argument("--imgsz-pose", type=int, default=DEFAULT_CONFIG['POSE_IMGSZ'])
+    parser.add_argument("--batch-pose", type=int, default=4,
+                        help="lot fixe du graphe Pose (les lots incomplets sont complétés)")
+    parser.add_argument("--parite", type=int, default=10, help="nombre d'images pour le contrôle (0 = aucun)")
+    parser.add_argument("--sans-export", action="store_true", help="contrôle de parité seul")
+    parser.add_argument("--int8", action="store_true",
+                        help="modèle Pose quantifié INT8 (OpenVINO), sélectionné avec pose_backend='int8'")
+    parser.add_argument("--calibration", type=int, default=300, help="nombre de crops de calibration INT8")
+    args = parser.parse_args()
+
+    if args.int8:
+        if not args.sans_export:
+            exporter_int8(POSE_MODEL, args.imgsz_pose, args.batch_pose, args.calibration)
+        if args.parite > 0:
+            _, crops = images_parite(args.parite, args.imgsz_pose)
+            if crops:
+                verifier_parite(POSE_MODEL, 'int8', crops, args.imgsz_pose, DEFAULT_CONFIG['POSE_MODEL_CONF'])
+        print("Impact sur les métriques : python rapport_quantification.py")
+        return
+
+    if not args.sans_export:
+        exporter(HEAD_MODEL, args.format, args.imgsz_tete, args.batch_tete)
+        exporter(POSE_MODEL, args.format, args.imgsz_pose, args.batch_pose)
+
+    if args.parite > 0:
+        images, crops = images_parite(args.parite, args.imgsz_pose)
+        if not images:
+            print(f"Aucune image dans {IMG_DIR} : contrôle de parité ignoré")
+            return
+        ok_tete = verifier_parite(HEAD_MODEL, args.format, images, args.imgsz_tete, 0.25)
+        ok_pose = verifier_parite(POSE_MODEL, args.format, crops, args.imgsz_pose, DEFAULT_CONFIG['POSE_MODEL_CONF'])
+        if not (ok_tete and ok_pose):
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
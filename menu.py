@@ -1,7 +1,8 @@
 import sys
 import os
+import queue
 import tkinter as tk
-from tkinter import messagebox
+from tkinter import messagebox, ttk
 import cv2
 
 def resource_path(relative_path):
@@ -14,16 +15,28 @@ def resource_path(relative_path):
 # --- IMPORTS ---
 sys.path.append(resource_path("detection"))
 try:
-    from detection.interface import choisir_source, obtenir_image
+    from detection.interface import choisir_source, obtenir_image, analyser_flux
     from detection.comptage import CompteurAmphi
     from detection.sondage import SondageDetector
     from detection.vote import HandDetector as VoteDetector
+    from detection.modeles import prechauffer
+    from detection.service import ServiceInference, AnalyseAnnulee
+    from detection.suivi import SuiviTetes
+    from detection.mouvement import DetecteurMouvement
+    from detection.historique import Historique, MODES, historique_application
+    from detection.tetes import empreinte_image
 except ImportError as e:
     try:
-        from interface import choisir_source, obtenir_image
+        from interface import choisir_source, obtenir_image, analyser_flux
         from comptage import CompteurAmphi
         from sondage import HandDetector as SondageDetector
         from vote import HandDetector as VoteDetector
+        from modeles import prechauffer
+        from service import ServiceInference, AnalyseAnnulee
+        from suivi import SuiviTetes
+        from mouvement import DetecteurMouvement
+        from historique import Historique, MODES, historique_application
+        from tetes import empreinte_image
     except ImportError as e2:
         print(f"Erreur critique : {e}")
         sys.exit(1)
@@ -33,43 +46,104 @@ except ImportError as e:
 # =============================================================================
 PATH_HEAD_MODEL = resource_path("yolo_head_test.pt")
 PATH_POSE_MODEL = resource_path("yolov8x-pose-p6.pt")
+# Moteur d'inférence : 'auto' prend les graphes OpenVINO/ONNX exportés s'ils sont présents
+BACKEND = os.environ.get("AMPHI_BACKEND", "auto")
 
-def lancer_analyse(nom_mode, callback_logique):
+# Service d'inférence : les analyses tournent dans un thread de travail, le menu
+# reste réactif et les détecteurs restent chargés d'une analyse à l'autre
+SERVICE = ServiceInference(taille_file=2)
+
+def compteur_partage():
+    return SERVICE.detecteur('comptage', lambda: CompteurAmphi(model_path=PATH_HEAD_MODEL, backend=BACKEND))
+
+def sondage_partage():
+    return SERVICE.detecteur('sondage', lambda: SondageDetector(
+        head_model_path=PATH_HEAD_MODEL, pose_model_path=PATH_POSE_MODEL, backend=BACKEND))
+
+def vote_partage():
+    return SERVICE.detecteur('vote', lambda: VoteDetector(
+        head_model_path=PATH_HEAD_MODEL, pose_model_path=PATH_POSE_MODEL, backend=BACKEND))
+
+def lancer_analyse(nom_mode, calcul, affichage, callback_flux=None):
+    # calcul(tache, img) tourne dans le service, affichage(resultat) sur le thread Tk
     root.withdraw()
     try:
-        source = choisir_source(root)
-        if source:
+        source = choisir_source(root, flux=callback_flux is not None)
+        if source == 'live':
+            print(f"--- Démarrage mode continu : {nom_mode} ---")
+            callback_flux()
+        elif source:
             img = obtenir_image(source, root)
             if img is not None:
                 print(f"--- Démarrage mode : {nom_mode} ---")
-                callback_logique(img)
+                suivre_tache(SERVICE.soumettre(nom_mode, calcul, img), affichage)
+    except queue.Full:
+        messagebox.showwarning("Occupé", "Des analyses sont déjà en attente, réessayez plus tard.")
     except Exception as e:
         print(f"Erreur : {e}")
         messagebox.showerror("Erreur", str(e))
     finally:
         root.deiconify()
 
-def run_comptage(img):
-    compteur = CompteurAmphi(model_path=PATH_HEAD_MODEL)
+def suivre_tache(tache, affichage):
+    # Fenêtre de progression interrogée par la boucle Tk (aucun appel bloquant)
+    fen = tk.Toplevel(root)
+    fen.title(f"Analyse : {tache.nom}")
+    fen.geometry("320x130")
+    texte = tk.StringVar(value=tache.progression)
+    tk.Label(fen, textvariable=texte, font=("Arial", 11)).pack(pady=10)
+    barre = ttk.Progressbar(fen, length=260, mode="indeterminate")
+    barre.pack(pady=5)
+    barre.start(15)
+    tk.Button(fen, text="Annuler", command=tache.annuler, bg="#c0392b", fg="white").pack(pady=5)
+    fen.protocol("WM_DELETE_WINDOW", tache.annuler)
+
+    def verifier():
+        if not tache.terminee():
+            texte.set(tache.progression)
+            if tache.fraction is not None and str(barre['mode']) != "determinate":
+                barre.stop()
+                barre.config(mode="determinate")
+            if tache.fraction is not None:
+                barre['value'] = 100 * tache.fraction
+            fen.after(100, verifier)
+            return
+
+        fen.destroy()
+        if tache.future.cancelled() or isinstance(tache.future.exception(), AnalyseAnnulee):
+            print(f"--- Analyse annulée : {tache.nom} ---")
+            return
+        erreur = tache.future.exception()
+        try:
+            if erreur is not None: raise erreur
+            affichage(tache.future.result())
+        except Exception as e:
+            print(f"Erreur : {e}")
+            messagebox.showerror("Erreur", str(e))
+
+    fen.after(100, verifier)
+
+def calcul_comptage(tache, img):
+    compteur = compteur_partage()
+    tache.signaler("Détection des têtes")
     compteur.charger_image(img)
     compteur.compter()
     compteur.annoter()
-    if compteur.image_annotee is not None:
-        cv2.imshow("Resultat Comptage", compteur.image_annotee)
+    # Tout ce que l'historique enregistre est capturé ici : le compteur partagé
+    # peut déjà traiter l'image suivante quand run_comptage s'exécute
+    return compteur.image_annotee, compteur.count, empreinte_image(img)
+
+def run_comptage(resultat):
+    image_annotee, count, empreinte = resultat
+    if image_annotee is not None:
+        cv2.imshow("Resultat Comptage", image_annotee)
         cv2.waitKey(0)
         cv2.destroyAllWindows()
-    compteur.sauvegarder_nombre_etudiants()
-
-def run_sondage(img):
-
-    if SondageDetector is None:
-        raise ImportError("Module sondage manquant.")
-
-    print("Chargement du modèle de Sondage...")
-    detector = SondageDetector(head_model_path=PATH_HEAD_MODEL, pose_model_path=PATH_POSE_MODEL)
-
-    results = detector.detect_sondage(img)
+    # Valeurs de cette analyse, sans toucher à l'état du compteur partagé
+    compteur_partage().sauvegarder_nombre_etudiants(nombre=count, empreinte=empreinte)
 
+def annoter_sondage(img, results):
+    # Dessine les têtes POUR/CONTRE et le bandeau, retourne (pour, contre)
     count_pour = 0
     count_contre = 0
 
@@ -109,6 +183,33 @@ def run_sondage(img):
     cv2.putText(img, f"CONTRE: {perc_contre:.1f}% ({count_contre})", (20, 70),
                 cv2.FONT_HERSHEY_SIMPLEX, 0.8, COLOR_CONTRE, 2)
 
+    return count_pour, count_contre
+
+def calcul_sondage(tache, img):
+
+    if SondageDetector is None:
+        raise ImportError("Module sondage manquant.")
+
+    tache.signaler("Chargement du modèle de Sondage...")
+    detector = sondage_partage()
+
+    detector.progression = tache.signaler
+    try:
+        results = detector.detect_sondage(img)
+    finally:
+        detector.progression = None
+
+    # Empreinte de l'image brute, avant annotation, pour l'historique
+    empreinte = empreinte_image(img)
+    count_pour, count_contre = annoter_sondage(img, results)
+    return img, count_pour, count_contre, empreinte
+
+def run_sondage(resultat):
+    img, count_pour, count_contre, empreinte = resultat
+    total = count_pour + count_contre
+    perc_pour = (count_pour / total) * 100 if total > 0 else 0
+    perc_contre = (count_contre / total) * 100 if total > 0 else 0
+
     print("---- SONDAGE ----")
     print(f"Participants actifs : {total}")
     print(f"POUR = {count_pour} ({perc_pour:.1f}%)")
@@ -118,18 +219,11 @@ def run_sondage(img):
     cv2.waitKey(0)
     cv2.destroyAllWindows()
 
-    SondageDetector.sauvegarder_resultats_sondage(count_pour, count_contre)
-
+    SondageDetector.sauvegarder_resultats_sondage(count_pour, count_contre, empreinte=empreinte)
 
-def run_vote(img):
-    if VoteDetector is None: raise ImportError("Module vote manquant.")
 
-    print("Chargement du modèle de Vote...")
-    detector = VoteDetector(head_model_path=PATH_HEAD_MODEL, pose_model_path=PATH_POSE_MODEL)
-    
-    # Récupère la liste des résultats PAR TÊTE
-    results = detector.detect(img)
-    
+def annoter_vote(img, results):
+    # Dessine les têtes G/D/Abstention et le bandeau, retourne (gauche, droite, abstention)
     count_gauche = 0
     count_droite = 0
     count_abst = 0
@@ -182,6 +276,32 @@ def run_vote(img):
     cv2.putText(img, f"Abstention: {perc_abst:.1f}% ({count_abst})", (20, 110),
                 cv2.FONT_HERSHEY_SIMPLEX, 0.8, (200, 200, 200), 2)
 
+    return count_gauche, count_droite, count_abst
+
+def calcul_vote(tache, img):
+    if VoteDetector is None: raise ImportError("Module vote manquant.")
+
+    tache.signaler("Chargement du modèle de Vote...")
+    detector = vote_partage()
+    
+    # Récupère la liste des résultats PAR TÊTE
+    detector.progression = tache.signaler
+    try:
+        results = detector.detect(img)
+    finally:
+        detector.progression = None
+    
+    empreinte = empreinte_image(img)
+    annoter_vote(img, results)
+    return img, results, empreinte
+
+def run_vote(resultat):
+    img, results, empreinte = resultat
+    count_gauche = sum(1 for r in results if r['vote'] == 'G')
+    count_droite = sum(1 for r in results if r['vote'] == 'D')
+    count_abst = len(results) - count_gauche - count_droite
+    total_heads = len(results)
+
     # Affichage final console
     print(f"Têtes YOLO détectées: {total_heads}")
     print(f"Mains Gauche: {count_gauche}")
@@ -191,7 +311,50 @@ def run_vote(img):
     cv2.imshow("Resultat Vote", img)
     cv2.waitKey(0)
     cv2.destroyAllWindows()
-    VoteDetector.sauvegarder_vote_txt(results)
+    VoteDetector.sauvegarder_vote_txt(results, empreinte=empreinte)
+
+# =============================================================================
+# MODE CONTINU (WEBCAM)
+# =============================================================================
+def run_flux_comptage():
+    compteur = CompteurAmphi(model_path=PATH_HEAD_MODEL, backend=BACKEND)
+
+    def analyser(frame):
+        compteur.charger_image(frame)
+        compteur.compter()
+        det = compteur.resultats
+        return [tuple(map(int, det.xyxy[i])) for i in det.indices_classe(compteur.CLASS_ID_HEAD, 0.3)]
+
+    def dessiner(img, boites):
+        for (x1, y1, x2, y2) in boites:
+            cv2.rectangle(img, (x1, y1), (x2, y2), (0, 255, 0), 2)
+        cv2.putText(img, f"Nombre total d'etudiants : {len(boites)}", (10, 40),
+                    cv2.FONT_HERSHEY_SIMPLEX, 1.0, (255, 0, 0), 2)
+
+    _, boites = analyser_flux(analyser, dessiner, "Comptage en direct", DetecteurMouvement())
+    if boites is not None:
+        compteur.count = len(boites)
+        compteur.sauvegarder_nombre_etudiants()
+
+def run_flux_sondage():
+    detector = SondageDetector(head_model_path=PATH_HEAD_MODEL, pose_model_path=PATH_POSE_MODEL, backend=BACKEND)
+    # Têtes suivies d'une image à l'autre : la pose n'est recalculée que pour ceux qui bougent
+    suivi = SuiviTetes()
+    image, results = analyser_flux(lambda frame: detector.etiqueter_sondage(detector.detect_suivi(frame, suivi)),
+                                   annoter_sondage, "Sondage en direct", DetecteurMouvement())
+    if results is not None:
+        count_pour = sum(1 for r in results if r['sondage'] == "POUR")
+        SondageDetector.sauvegarder_resultats_sondage(count_pour, len(results) - count_pour,
+                                                      empreinte=empreinte_image(image))
+
+def run_flux_vote():
+    detector = VoteDetector(head_model_path=PATH_HEAD_MODEL, pose_model_path=PATH_POSE_MODEL, backend=BACKEND)
+    suivi = SuiviTetes()
+    image, results = analyser_flux(lambda frame: detector.detect_suivi(frame, suivi), annoter_vote, "Vote en direct",
+                                   DetecteurMouvement())
+    if results is not None:
+        VoteDetector.sauvegarder_vote_txt(results, empreinte=empreinte_image(image))
+
 # =============================================================================
 # INTERFACE & HISTORIQUE
 # =============================================================================
@@ -207,6 +370,11 @@ def afficher_historique():
     hist_window.protocol("WM_DELETE_WINDOW", fermer)
 
     tk.Label(hist_window, text="Historique des relevés", font=("Helvetica", 16, "bold")).pack(pady=15)
+
+    # Filtre par mode : la requête n'utilise que l'index (mode, date)
+    choix_mode = ttk.Combobox(hist_window, state="readonly", values=["Tous"] + list(MODES.values()))
+    choix_mode.current(0)
+    choix_mode.pack()
     
     frame_list = tk.Frame(hist_window)
     frame_list.pack(fill="both", expand=True, padx=20, pady=5)
@@ -218,22 +386,26 @@ def afficher_historique():
     listbox.pack(side="left", fill="both", expand=True)
     scrollbar.config(command=listbox.yview)
 
-    if getattr(sys, 'frozen', False): app_path = os.path.dirname(sys.executable)
-    else: app_path = os.path.dirname(os.path.abspath(__file__))
-    fichier = os.path.join(app_path, "historique.txt")
-    
-    if os.path.exists(fichier):
-        with open(fichier, "r", encoding="utf-8") as f:
-            for line in f.readlines()[::-1]:
-                if line.strip(): listbox.insert("end", "  " + line.strip())
-    else:
-        listbox.insert("end", "Aucun historique.")
+    # Même base que les sauvegardes (dossier de l'application) ; l'ancien historique.txt est importé à sa création
+    historique = historique_application()
+
+    def charger(_event=None):
+        listbox.delete(0, "end")
+        mode = {nom: m for m, nom in MODES.items()}.get(choix_mode.get())
+        releves = historique.derniers(limite=500, mode=mode)
+        for r in releves:
+            listbox.insert("end", "  " + Historique.ligne_texte(r))
+        if not releves:
+            listbox.insert("end", "Aucun historique.")
+
+    choix_mode.bind("<<ComboboxSelected>>", charger)
+    charger()
 
     tk.Button(hist_window, text="Retour", command=fermer, bg="#c0392b", fg="white").pack(pady=15)
 
-def btn_cmd_comptage(): lancer_analyse("Comptage", run_comptage)
-def btn_cmd_sondage(): lancer_analyse("Sondage", run_sondage)
-def btn_cmd_vote(): lancer_analyse("Vote", run_vote)
+def btn_cmd_comptage(): lancer_analyse("Comptage", calcul_comptage, run_comptage, run_flux_comptage)
+def btn_cmd_sondage(): lancer_analyse("Sondage", calcul_sondage, run_sondage, run_flux_sondage)
+def btn_cmd_vote(): lancer_analyse("Vote", calcul_vote, run_vote, run_flux_vote)
 
 root = tk.Tk()
 root.title("Compteur d'Amphi")
@@ -250,4 +422,6 @@ tk.Button(root, text="Historique", command=afficher_historique, **btn_style).pac
 tk.Button(root, text="Quitter", command=root.quit, width=15, bg="#c0392b", fg="white").pack(pady=20)
 
 if __name__ == "__main__":
+    # Les poids sont chargés pendant que le menu est déjà affiché
+    prechauffer([PATH_HEAD_MODEL, PATH_POSE_MODEL], backend=BACKEND)
     root.mainloop()
\ No newline at end of file
@@ -0,0 +1,138 @@
+import os
+import queue
+import threading
+from concurrent.futures import ProcessPoolExecutor
+import cv2
+
+# =============================================================================
+# MOTEUR D'ÉVALUATION COMMUN (evaluer_tête / evaluer_sondage / evaluer_vote)
+# =============================================================================
+# - Mode séquentiel : un thread précharge les images pendant que le modèle calcule.
+# - Mode parallèle : un pool de processus, chaque processus charge les modèles une
+#   seule fois (initializer) puis traite les images qu'on lui envoie.
+# Dans les deux cas les résultats sont rendus DANS L'ORDRE de la liste d'entrée :
+# les cumuls TP/FP/FN et les fichiers exportés sont identiques à un passage séquentiel.
+
+EXTENSIONS_IMAGES = (".jpg", ".jpeg", ".png")
+
+
+def lister_images(img_dir):
+    return [f for f in os.listdir(img_dir) if f.lower().endswith(EXTENSIONS_IMAGES)]
+
+
+def nb_workers_par_defaut():
+    # Surchargeable par la variable d'environnement EVAL_WORKERS (1 = séquentiel)
+    if os.environ.get("EVAL_WORKERS"):
+        return max(1, int(os.environ["EVAL_WORKERS"]))
+    return max(1, min(4, (os.cpu_count() or 2) // 2))
+
+
+class ChargeurImages:
+    # Itère sur (nom, image) en lisant les images à l'avance dans un thread.
+    def __init__(self, img_dir, noms, prefetch=4):
+        self.img_dir = img_dir
+        self.noms = noms
+        self._file = queue.Queue(maxsize=max(1, prefetch))
+        self._thread = threading.Thread(target=self._lire, daemon=True)
+        self._thread.start()
+
+    def _lire(self):
+        for nom in self.noms:
+            self._file.put((nom, cv2.imread(os.path.join(self.img_dir, nom))))
+        self._file.put(None)
+
+    def __iter__(self):
+        while True:
+            element = self._file.get()
+            if element is None:
+                return
+            yield element
+
+
+# --- Côté processus de travail ---
+_detecteur = None
+_traiter = None
+
+
+def _init_worker(fabrique, traiter, nb_threads):
+    global _detecteur, _traiter
+    try:
+        import torch
+        torch.set_num_threads(nb_threads)
+    except ImportError:
+        pass
+    _detecteur = fabrique()
+    _traiter = traiter
+
+
+def _traiter_image(chemin):
+    img = cv2.imread(chemin)
+    if img is None:
+        return None
+    return _traiter(_detecteur, os.path.basename(chemin), img)
+
+
+def _traiter_lot(chemins):
+    # Les images illisibles restent à None, à leur place
+    images = [cv2.imread(c) for c in chemins]
+    valides = [k for k, img in enumerate(images) if img is not None]
+    sorties = [None] * len(chemins)
+    if valides:
+        resultats = _traiter(_detecteur, [os.path.basename(chemins[k]) for k in valides], [images[k] for k in valides])
+        for k, r in zip(valides, resultats):
+            sorties[k] = r
+    return sorties
+
+
+def executer_lots(img_dir, noms, fabrique, traiter_lot, taille_lot=8, nb_workers=1, prefetch=8):
+    """
+    Comme executer(), mais traiter_lot(detecteur, noms, images) reçoit jusqu'à
+    `taille_lot` images à la fois et retourne une liste de résultats (même ordre).
+    """
+    paquets = [noms[k:k + taille_lot] for k in range(0, len(noms), taille_lot)]
+
+    if nb_workers <= 1:
+        detecteur = fabrique()
+        lot = []
+
+        def vider(lot):
+            valides = [(n, img) for n, img in lot if img is not None]
+            resultats = iter(traiter_lot(detecteur, [n for n, _ in valides], [img for _, img in valides]) if valides else [])
+            return [(n, next(resultats) if img is not None else None) for n, img in lot]
+
+        for nom, img in ChargeurImages(img_dir, noms, prefetch):
+            lot.append((nom, img))
+            if len(lot) == taille_lot:
+                yield from vider(lot)
+                lot = []
+        if lot:
+            yield from vider(lot)
+        return
+
+    nb_threads = max(1, (os.cpu_count() or nb_workers) // nb_workers)
+    with ProcessPoolExecutor(max_workers=nb_workers, initializer=_init_worker,
+                             initargs=(fabrique, traiter_lot, nb_threads)) as pool:
+        chemins = [[os.path.join(img_dir, nom) for nom in paquet] for paquet in paquets]
+        for paquet, resultats in zip(paquets, pool.map(_traiter_lot, chemins)):
+            yield from zip(paquet, resultats)
+
+
+def executer(img_dir, noms, fabrique, traiter, nb_workers=1, prefetch=4):
+    """
+    fabrique() -> détecteur (appelé une fois par processus)
+    traiter(detecteur, nom, img) -> résultat sérialisable (pickle)
+    Génère (nom, résultat) dans l'ordre de `noms` ; résultat = None si l'image est illisible.
+    """
+    if nb_workers <= 1:
+        detecteur = fabrique()
+        for nom, img in ChargeurImages(img_dir, noms, prefetch):
+            yield nom, (traiter(detecteur, nom, img) if img is not None else None)
+        return
+
+    nb_threads = max(1, (os.cpu_count() or nb_workers) // nb_workers)
+    chemins = [os.path.join(img_dir, nom) for nom in noms]
+    with ProcessPoolExecutor(max_workers=nb_workers, initializer=_init_worker,
+                             initargs=(fabrique, traiter, nb_threads)) as pool:
+        # map() conserve l'ordre d'entrée : fusion déterministe des métriques
+        for nom, resultat in zip(noms, pool.map(_traiter_image, chemins)):
+            yield nom, resultat
@@ -0,0 +1,105 @@
+import os
+import time
+import argparse
+import cv2
+
+from detection.sondage import SondageDetector
+from moteur_evaluation import lister_images
+import evaluer_vote as ev
+import evaluer_sondage as es
+
+# =============================================================================
+# RAPPORT LATENCE / F1 DES VARIANTES DU MODÈLE POSE
+# =============================================================================
+# Chaque variante (FP32 PyTorch, OpenVINO, INT8...) passe sur tout le dataset
+# avec le même modèle de têtes. On mesure le temps du modèle Pose et on calcule
+# les métriques de evaluer_vote.py et evaluer_sondage.py. Une variante est
+# retenue si son rappel ne baisse pas de plus de --tolerance par rapport à la
+# référence (la première de la liste).
+
+RESULT_FILE = os.path.join(ev.RES_DIR, "quantification_pose.txt")
+
+
+def evaluer_variante(pose_backend, image_files):
+    detecteur = SondageDetector(head_model_path=ev.HEAD_MODEL, pose_model_path=ev.POSE_MODEL,
+                                backend='pt', pose_backend=pose_backend)
+    vote = [0, 0, 0]
+    sondage = [0, 0, 0]
+    stats_g = {'TP': 0, 'FP': 0, 'FN': 0}
+    stats_d = {'TP': 0, 'FP': 0, 'FN': 0}
+    temps_pose, temps_total, passes = 0.0, 0.0, 0
+
+    for img_name in image_files:
+        img = cv2.imread(os.path.join(ev.IMG_DIR, img_name))
+        if img is None: continue
+        h_img, w_img = img.shape[:2]
+
+        debut = time.perf_counter()
+        brut = detecteur.inferer(img)
+        temps_total += time.perf_counter() - debut
+        temps_pose += detecteur.stats['temps_pose_ms'] / 1000
+        passes += detecteur.stats['passes_pose']
+
+        heads = detecteur.etiqueter_sondage(detecteur.post_traiter(brut))
+        predictions = [m for h in heads for m in h['hands']]
+        base = os.path.splitext(img_name)[0] + ".txt"
+
+        gt_vote = ev.charger_labels_vote(os.path.join(ev.LBL_DIR, base), w_img, h_img)
+        for k, v in enumerate(ev.comparer_mains_vote(gt_vote, predictions, stats_g, stats_d)): vote[k] += v
+        gt_sondage = es.charger_labels_gt(os.path.join(es.LBL_DIR, base), w_img, h_img)
+        for k, v in enumerate(es.comparer_mains_sondage(gt_sondage, predictions)): sondage[k] += v
+
+    n = max(1, len(image_files))
+    return {
+        'variante': pose_backend,
+        'ms_image': 1000 * temps_total / n,
+        'ms_pose': 1000 * temps_pose / n,
+        'ms_passe': 1000 * temps_pose / max(1, passes),
+        'vote': ev.calculer_metriques(*vote),
+        'sondage': ev.calculer_metriques(*sondage),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare latence et F1 des variantes du modèle Pose.")
+    parser.add_argument("--variantes", nargs="+", default=["pt", "int8"],
+                        help="backends du modèle Pose, le premier sert de référence")
+    parser.add_argument("--tolerance", type=float, default=0.01, help="baisse de rappel acceptée")
+    parser.add_argument("--max-images", type=int, default=0)
+    args = parser.parse_args()
+
+    image_files = lister_images(ev.IMG_DIR)
+    if args.max_images: image_files = image_files[:args.max_images]
+
+    resultats = []
+    for variante in args.variantes:
+        print(f"--- Variante Pose : {variante} ({len(image_files)} images) ---")
+        try:
+            resultats.append(evaluer_variante(variante, image_files))
+        except FileNotFoundError as e:
+            print(f"Variante ignorée : {e}")
+    if not resultats: return
+
+    ref = resultats[0]
+    entete = (f"{'Variante':<10} | {'ms/img':>7} | {'ms Pose':>7} | {'ms/passe':>8} | "
+              f"{'Vote P/R/F1':^20} | {'Sondage P/R/F1':^20} | {'dRappel':>7} | Verdict")
+    lignes = ["=== LATENCE vs F1 (modèle Pose) ===", "",
+              f"Images : {len(image_files)} | Référence : {ref['variante']} | Tolérance rappel : {args.tolerance:.3f}", "",
+              entete, "-" * len(entete)]
+    for r in resultats:
+        d_rappel = min(r['vote'][1] - ref['vote'][1], r['sondage'][1] - ref['sondage'][1])
+        verdict = "référence" if r is ref else ("OK" if d_rappel >= -args.tolerance else "REFUSÉ")
+        vote = "/".join(f"{v:.3f}" for v in r['vote'])
+        sondage = "/".join(f"{v:.3f}" for v in r['sondage'])
+        lignes.append(f"{r['variante']:<10} | {r['ms_image']:7.1f} | {r['ms_pose']:7.1f} | {r['ms_passe']:8.1f} | "
+                      f"{vote:^20} | {sondage:^20} | {d_rappel:+7.3f} | {verdict}")
+    texte = "\n".join(lignes) + "\n"
+
+    print("\n" + texte)
+    with open(RESULT_FILE, "w") as f:
+        f.write(texte)
+    print(f"Rapport sauvegardé dans {RESULT_FILE}")
+
+
+if __name__ == "__main__":
+    main()
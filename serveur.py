@@ -0,0 +1,168 @@
+import os
+import sys
+import json
+import argparse
+import urllib.request
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import cv2
+import numpy as np
+
+from detection.comptage import CompteurAmphi
+from detection.sondage import SondageDetector
+from detection.tetes import detecter_tetes_lot
+from detection.service import MicroLot
+
+# =============================================================================
+# SERVEUR LOCAL D'INFÉRENCE (plusieurs caméras -> une seule machine)
+# =============================================================================
+# POST /comptage, /sondage, /vote : corps = image encodée (JPEG/PNG)
+# GET  /sante : état du serveur et statistiques des lots
+# Les requêtes reçues dans une fenêtre de quelques ms sont regroupées : un seul
+# passage du modèle de têtes pour toutes les images du lot, puis un lot Pose
+# commun aux images Sondage / Vote. Les modèles sont chargés une fois.
+
+HEAD_MODEL = "yolo_head_test.pt"
+POSE_MODEL = "yolov8x-pose-p6.pt"
+MODES = ('comptage', 'sondage', 'vote')
+SEUIL_COMPTAGE = 0.3
+
+
+class MoteurServeur:
+    def __init__(self, backend='pt', fenetre_ms=20, taille_lot=8):
+        self.compteur = CompteurAmphi(model_path=HEAD_MODEL, backend=backend)
+        # SondageDetector hérite de HandDetector : sert aussi pour le Vote
+        self.detecteur = SondageDetector(head_model_path=HEAD_MODEL, pose_model_path=POSE_MODEL, backend=backend)
+        self.lots = MicroLot(self.traiter_lot, fenetre_ms, taille_lot)
+
+    def analyser(self, mode, img, timeout=120):
+        return self.lots.soumettre((mode, img)).result(timeout=timeout)
+
+    def traiter_lot(self, demandes):
+        images = [img for _, img in demandes]
+        tetes = detecter_tetes_lot(self.compteur.model, images, **self.compteur.params_tetes)
+
+        reponses = [None] * len(demandes)
+        pose = [k for k, (mode, _) in enumerate(demandes) if mode != 'comptage']
+        if pose:
+            # Mêmes paramètres de têtes que le Comptage : on réutilise les détections
+            reutiliser = self.compteur.params_tetes == {} and self.detecteur.cfg['HEAD_TILE_SIZE'] == 0
+            resultats = self.detecteur.detect_lot([images[k] for k in pose],
+                                                  [tetes[k] for k in pose] if reutiliser else None)
+            for k, res in zip(pose, resultats):
+                mode = demandes[k][0]
+                reponses[k] = reponse_sondage(self.detecteur.etiqueter_sondage(res)) if mode == 'sondage' else reponse_vote(res)
+
+        for k, (mode, img) in enumerate(demandes):
+            if mode == 'comptage':
+                reponses[k] = reponse_comptage(tetes[k], self.compteur.CLASS_ID_HEAD)
+        return reponses
+
+
+# --- FORMAT DES RÉPONSES JSON ---
+def _boite(b):
+    return [int(v) for v in b]
+
+def reponse_comptage(det, class_id, seuil=SEUIL_COMPTAGE):
+    idx = det.indices_classe(class_id, seuil)
+    return {
+        'nombre': int(len(idx)),
+        'tetes': [{'box': _boite(det.xyxy[i]), 'conf': round(float(det.conf[i]), 4)} for i in idx]
+    }
+
+def _mains(tete):
+    return [{'x': m['x'], 'y': m['y'], 'cote': m['side'], 'conf': round(m['conf'], 4), 'raison': m['reason']}
+            for m in tete['hands']]
+
+def reponse_vote(resultats):
+    tetes = [{'head_id': r['head_id'], 'box': _boite(r['head_box']), 'vote': r['vote'], 'mains': _mains(r)}
+             for r in resultats]
+    resume = {v: sum(1 for r in resultats if r['vote'] == v) for v in ('G', 'D', 'N')}
+    return {'nombre': len(tetes), 'resume': resume, 'tetes': tetes}
+
+def reponse_sondage(resultats):
+    tetes = [{'head_id': r['head_id'], 'box': _boite(r['head_box']), 'sondage': r['sondage'], 'mains': _mains(r)}
+             for r in resultats]
+    resume = {v: sum(1 for r in resultats if r['sondage'] == v) for v in ('POUR', 'CONTRE')}
+    return {'nombre': len(tetes), 'resume': resume, 'tetes': tetes}
+
+
+# --- HTTP ---
+def creer_gestionnaire(moteur):
+    class Gestionnaire(BaseHTTPRequestHandler):
+        def _json(self, code, donnees):
+            corps = json.dumps(donnees, ensure_ascii=False).encode("utf-8")
+            self.send_response(code)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(corps)))
+            self.end_headers()
+            self.wfile.write(corps)
+
+        def do_GET(self):
+            if self.path != "/sante":
+                return self._json(404, {'erreur': f"Chemin inconnu : {self.path}"})
+            self._json(200, {'etat': 'ok', 'lots': moteur.lots.lots_traites,
+                             'images': moteur.lots.elements_traites})
+
+        def do_POST(self):
+            mode = self.path.strip("/")
+            taille = int(self.headers.get("Content-Length", 0))
+            corps = self.rfile.read(taille)
+            if mode not in MODES:
+                return self._json(404, {'erreur': f"Mode inconnu : {mode} ({', '.join(MODES)})"})
+            img = cv2.imdecode(np.frombuffer(corps, np.uint8), cv2.IMREAD_COLOR) if corps else None
+            if img is None:
+                return self._json(400, {'erreur': "Image illisible (JPEG/PNG attendu)"})
+            try:
+                self._json(200, moteur.analyser(mode, img))
+            except Exception as e:
+                self._json(500, {'erreur': str(e)})
+
+        def log_message(self, format, *args):
+            print(f"[serveur] {self.address_string()} {format % args}")
+
+    return Gestionnaire
+
+
+def servir(hote="127.0.0.1", port=8765, backend='pt', fenetre_ms=20, taille_lot=8):
+    moteur = MoteurServeur(backend, fenetre_ms, taille_lot)
+    serveur = ThreadingHTTPServer((hote, port), creer_gestionnaire(moteur))
+    print(f"Serveur d'inférence sur http://{hote}:{port} ({', '.join('/' + m for m in MODES)})")
+    try:
+        serveur.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        serveur.server_close()
+        moteur.lots.arreter()
+
+
+# --- CLIENT LOCAL ---
+def envoyer(chemin_image, mode="comptage", url="http://127.0.0.1:8765", timeout=120):
+    with open(chemin_image, "rb") as f:
+        corps = f.read()
+    requete = urllib.request.Request(f"{url}/{mode}", data=corps, method="POST",
+                                     headers={"Content-Type": "application/octet-stream"})
+    with urllib.request.urlopen(requete, timeout=timeout) as rep:
+        return json.loads(rep.read().decode("utf-8"))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serveur local Comptage / Sondage / Vote.")
+    parser.add_argument("--hote", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--backend", default=os.environ.get("AMPHI_BACKEND", "auto"))
+    parser.add_argument("--fenetre-ms", type=int, default=20, help="attente max pour grouper les requêtes")
+    parser.add_argument("--lot", type=int, default=8, help="taille max d'un lot")
+    parser.add_argument("--client", nargs=2, metavar=("MODE", "IMAGE"),
+                        help="envoie une image à un serveur déjà lancé et affiche la réponse")
+    args = parser.parse_args()
+
+    if args.client:
+        mode, image = args.client
+        print(json.dumps(envoyer(image, mode, f"http://{args.hote}:{args.port}"), indent=2, ensure_ascii=False))
+        return
+    servir(args.hote, args.port, args.backend, args.fenetre_ms, args.lot)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,105 @@
+import sys
+import argparse
+import numpy as np
+
+from detection.dedup import dedupliquer
+from detection.vote import (DEFAULT_CONFIG, KEYPOINT_IDX, HandDetector, coordonnees_keypoints,
+                            get_keypoint_coords, valider_mains)
+
+# =============================================================================
+# ÉQUIVALENCE DES VERSIONS VECTORISÉES ET DES RÉFÉRENCES SCALAIRES
+# =============================================================================
+# Les règles scalaires de HandDetector sont conservées comme référence :
+# ce script, à graine fixe, vérifie que les versions NumPy (validation des mains,
+# déduplication par grille) donnent exactement les mêmes résultats.
+# À relancer après toute modification des seuils ou des règles.
+#   python verifier_equivalences.py [--essais 300] [--graine 0]
+
+
+def detecteur_reference(cfg=DEFAULT_CONFIG):
+    # Seules les règles sont utilisées : aucun modèle n'est chargé
+    hd = HandDetector.__new__(HandDetector)
+    hd.cfg = dict(cfg)
+    return hd
+
+
+def squelettes_aleatoires(rng, n, cas):
+    k = rng.uniform(0, 300, (n, 17, 3)).astype(np.float32)
+    k[..., 2] = rng.uniform(0, 1, (n, 17))
+    if cas == 1:
+        # Poignet confondu avec le coude (règle LEN)
+        k[:, KEYPOINT_IDX['LEFT_WRIST'], :2] = k[:, KEYPOINT_IDX['LEFT_ELBOW'], :2]
+    elif cas == 2:
+        # Bras levés plausibles : exerce ANG, OK, RATT et FAIL
+        k[:, [9, 10], 1] = rng.uniform(0, 40, (n, 2))
+        k[:, [7, 8], 1] = rng.uniform(80, 150, (n, 2))
+        k[:, [5, 6], 1] = rng.uniform(150, 200, (n, 2))
+        k[:, [9, 10, 7, 8], 0] = 100 + rng.uniform(0, 40, (n, 4))
+        k[..., 2] = rng.uniform(0.4, 1, (n, 17))
+    return k
+
+
+def verifier_mains(rng, essais, cfg=DEFAULT_CONFIG):
+    # valider_mains (N, M, 2) contre check_hand_smart, squelette par squelette
+    hd = detecteur_reference(cfg)
+    comparaisons, ecarts = 0, 0
+    for t in range(essais):
+        n = int(rng.integers(1, 30))
+        k = squelettes_aleatoires(rng, n, t % 3)
+        X1, Y1 = int(rng.integers(0, 50)), int(rng.integers(0, 50))
+        angles, mins = rng.uniform(50, 90, 3), rng.uniform(5, 60, 3)
+
+        xy, conf = coordonnees_keypoints(k, X1, Y1)
+        valide, raison = valider_mains(xy, conf, angles, mins, hd.cfg)
+        for i in range(n):
+            for c, cote in enumerate(('LEFT', 'RIGHT')):
+                poignet = get_keypoint_coords(k[i], KEYPOINT_IDX[f'{cote}_WRIST'], X1, Y1)
+                coude = get_keypoint_coords(k[i], KEYPOINT_IDX[f'{cote}_ELBOW'], X1, Y1)
+                epaule = get_keypoint_coords(k[i], KEYPOINT_IDX[f'{cote}_SHOULDER'], X1, Y1)
+                for m in range(len(angles)):
+                    ok, code = hd.check_hand_smart(poignet, coude, epaule, angles[m], mins[m])
+                    comparaisons += 1
+                    ecarts += ok != valide[i, m, c] or code != raison[i, m, c]
+    return comparaisons, ecarts
+
+
+def verifier_dedup(rng, essais, cfg=DEFAULT_CONFIG):
+    # dedupliquer (GrilleDedup) contre _is_anatomical_duplicate_strict : même ensemble
+    # de mains gardées, dans le même ordre
+    hd = detecteur_reference(cfg)
+    ecarts = 0
+    for _ in range(essais):
+        candidats = []
+        for _ in range(int(rng.integers(0, 300))):
+            x, y = rng.integers(0, 600, 2)
+            candidats.append({'x': int(x), 'y': int(y),
+                              'sx': int(x + rng.integers(-30, 30)), 'sy': int(y + rng.integers(20, 80)),
+                              'dedup_dist': int(rng.integers(20, 80)), 'conf': float(rng.random())})
+        candidats.sort(key=lambda c: c['conf'], reverse=True)
+
+        reference = []
+        for cand in candidats:
+            if not hd._is_anatomical_duplicate_strict(cand, reference):
+                reference.append(cand)
+        gardees = dedupliquer(candidats, hd.cfg)
+        ecarts += [id(m) for m in reference] != [id(m) for m in gardees]
+    return essais, ecarts
+
+
+def main(essais=300, graine=0):
+    rng = np.random.default_rng(graine)
+    echec = False
+    for nom, verifier in (("valider_mains / check_hand_smart", verifier_mains),
+                          ("dedupliquer / _is_anatomical_duplicate_strict", verifier_dedup)):
+        comparaisons, ecarts = verifier(rng, essais)
+        print(f"{nom:<50} : {ecarts} écart(s) sur {comparaisons} comparaisons")
+        echec |= ecarts > 0
+    return 1 if echec else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare les versions vectorisées aux références scalaires")
+    parser.add_argument("--essais", type=int, default=300)
+    parser.add_argument("--graine", type=int, default=0)
+    args = parser.parse_args()
+    sys.exit(main(args.essais, args.graine))